@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apis'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .utils.metrics import record_query
+
+        # every database connection times its queries for the request metrics, the wrapper is installed on the connections of every thread including the ones the async views run their queries on
+        def install_query_metrics(sender, connection, **kwargs):
+            if record_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(record_query)
+
+        connection_created.connect(install_query_metrics, weak=False)
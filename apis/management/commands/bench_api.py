@@ -0,0 +1,427 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from django.utils import timezone
+from users.models import User
+from notes.models import Notes, NoteCollaborator
+from auth_sessions.models import Session
+from auth_sessions.utils import initializeToken, token_cache
+from apis.utils.media_storage import get_media_storage
+from apis.utils.note_changes import record_note_changes
+from apis.utils.note_search import index_notes
+from apis.utils.passwords import hash_password
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+# the words the seeded notes are written with, the search scenario looks one of them up
+NOTE_WORDS = (
+    "groceries meeting draft review invoice travel birthday recipe workout "
+    "budget reminder project garden books movie call dentist laundry"
+).split()
+
+# a tiny valid png used for the uploads, the storage is stubbed with the in memory backend so nothing leaves the process
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+# a self contained load test of the api, it seeds a throwaway database, drives the real url routes with concurrent clients and reports the throughput and the latency percentiles of every endpoint as json so runs can be compared across commits
+class Command(BaseCommand):
+    help = "Seed a throwaway database and load test the API endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--notes-per-user", type=int, default=200)
+        parser.add_argument("--collaborators-per-note", type=int, default=2)
+        parser.add_argument("--sessions-per-user", type=int, default=5)
+        parser.add_argument("--clients", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per endpoint."
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+", choices=self.scenario_names(), default=None
+        )
+        parser.add_argument(
+            "--password-rounds",
+            type=int,
+            default=settings.PASSWORD_HASH_ROUNDS,
+            help="bcrypt work factor of the seeded users.",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write the json results, bench-results/<time>-<commit>.json by default.",
+        )
+        parser.add_argument(
+            "--compare", default=None, help="A previous results file to compare with."
+        )
+
+    def handle(self, *args, **options):
+        # the benchmark runs on its own sqlite file so the seeded data never touches the real database
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "bench.sqlite3"
+            )
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+
+            try:
+                with override_settings(
+                    MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage",
+                    PASSWORD_HASH_ROUNDS=options["password_rounds"],
+                ):
+                    get_media_storage.cache_clear()
+                    results = self.run_benchmark(options)
+            finally:
+                get_media_storage.cache_clear()
+                token_cache.clear()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.write_results(results, options)
+
+    def run_benchmark(self, options):
+        started_at = time.perf_counter()
+        dataset = self.seed(options)
+        seed_seconds = time.perf_counter() - started_at
+
+        scenarios = self.scenarios(dataset)
+        names = options["endpoints"] or list(scenarios)
+
+        endpoint_results = {}
+        for name in names:
+            endpoint_results[name] = self.drive(scenarios[name], options)
+            self.stdout.write(self.format_result(name, endpoint_results[name]))
+
+        return {
+            "meta": {
+                "commit": git_commit(),
+                "createdAt": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "seedSeconds": round(seed_seconds, 3),
+                "options": {
+                    key: options[key]
+                    for key in (
+                        "users",
+                        "notes_per_user",
+                        "collaborators_per_note",
+                        "sessions_per_user",
+                        "clients",
+                        "requests",
+                        "password_rounds",
+                    )
+                },
+            },
+            "endpoints": endpoint_results,
+        }
+
+    # the dataset is built the same way on every run so the results of two runs are comparable
+    def seed(self, options):
+        hashed_password = hash_password(BENCHMARK_PASSWORD)
+
+        users = User.objects.bulk_create(
+            User(
+                name=f"user {index}",
+                email=f"user{index}@example.com",
+                password=hashed_password,
+            )
+            for index in range(options["users"])
+        )
+
+        notes = Notes.objects.bulk_create(
+            Notes(
+                user=user,
+                title=f"{NOTE_WORDS[index % len(NOTE_WORDS)]} {index}",
+                note=" ".join(
+                    NOTE_WORDS[(index + offset) % len(NOTE_WORDS)]
+                    for offset in range(12)
+                ),
+            )
+            for user in users
+            for index in range(options["notes_per_user"])
+        )
+
+        # the collaborators of a note are the next users in the list
+        collaborators_per_note = min(options["collaborators_per_note"], len(users) - 1)
+        user_positions = {user.id: position for position, user in enumerate(users)}
+        NoteCollaborator.objects.bulk_create(
+            NoteCollaborator(
+                notes=note,
+                user=users[(user_positions[note.user_id] + offset) % len(users)],
+            )
+            for note in notes
+            for offset in range(1, collaborators_per_note + 1)
+        )
+
+        # up to ten of the users after those are not collaborators of the notes of a user yet, the collaborators scenario adds and removes them
+        new_collaborators_by_user = {
+            user.id: [
+                str(users[(position + offset) % len(users)].id)
+                for offset in range(
+                    collaborators_per_note + 1,
+                    min(collaborators_per_note + 11, len(users)),
+                )
+            ]
+            for position, user in enumerate(users)
+        }
+
+        index_notes(notes)
+        record_note_changes([note.id for note in notes])
+
+        # the older sessions of every user make the sessions table as large as in a long running deployment
+        Session.objects.bulk_create(
+            Session(user=user)
+            for user in users
+            for _ in range(max(options["sessions_per_user"] - 1, 0))
+        )
+        tokens = [initializeToken(user) for user in users]
+
+        notes_by_user = {}
+        for note in notes:
+            notes_by_user.setdefault(note.user_id, []).append(note)
+
+        return {
+            "users": users,
+            "tokens": tokens,
+            "notes_by_user": notes_by_user,
+            "new_collaborators_by_user": new_collaborators_by_user,
+        }
+
+    @staticmethod
+    def scenario_names():
+        return [
+            "login",
+            "get_notes",
+            "get_notes_expanded",
+            "search_notes",
+            "note_changes",
+            "create_note",
+            "update_note",
+            "add_collaborators",
+            "bulk_notes",
+        ]
+
+    # every scenario gets the client of its worker and the index of the request, the index picks the user so the same requests are sent on every run
+    def scenarios(self, dataset):
+        users = dataset["users"]
+        tokens = dataset["tokens"]
+        notes_by_user = dataset["notes_by_user"]
+        new_collaborators_by_user = dataset["new_collaborators_by_user"]
+
+        def as_user(client, index):
+            client.cookies["token"] = tokens[index % len(users)]
+            return users[index % len(users)]
+
+        def own_note(user, index):
+            user_notes = notes_by_user[user.id]
+            return user_notes[index % len(user_notes)]
+
+        def login(client, index):
+            return client.post(
+                "/api/v1/users/login/",
+                {
+                    "email": users[index % len(users)].email,
+                    "password": BENCHMARK_PASSWORD,
+                },
+                content_type="application/json",
+            )
+
+        def get_notes(client, index):
+            as_user(client, index)
+            return client.get("/api/v1/notes/getnotes/")
+
+        def get_notes_expanded(client, index):
+            as_user(client, index)
+            return client.get("/api/v1/notes/getnotes/?expand=collaborators")
+
+        def search_notes(client, index):
+            as_user(client, index)
+            word = NOTE_WORDS[index % len(NOTE_WORDS)]
+            return client.get(f"/api/v1/notes/search/?q={word}")
+
+        def note_changes(client, index):
+            as_user(client, index)
+            return client.get("/api/v1/notes/changes/?since=0")
+
+        def create_note(client, index):
+            as_user(client, index)
+            return client.post(
+                "/api/v1/notes/",
+                {
+                    "title": f"created {index}",
+                    "note": "created by the benchmark",
+                    "files": [
+                        SimpleUploadedFile(
+                            f"{index}.png", PNG_BYTES, content_type="image/png"
+                        )
+                    ],
+                },
+            )
+
+        def update_note(client, index):
+            user = as_user(client, index)
+            note = own_note(user, index)
+            return client.put(
+                f"/api/v1/notes/{note.id}/",
+                encode_multipart(
+                    BOUNDARY, {"title": f"updated {index}", "note": note.note}
+                ),
+                content_type=MULTIPART_CONTENT,
+            )
+
+        # a note only comes back once every note was changed, then the requests alternate between adding the new collaborators and removing them again so every request changes the note instead of being refused as a conflict
+        def add_collaborators(client, index):
+            user = as_user(client, index)
+            note = own_note(user, index // len(users))
+            rounds = index // (len(users) * len(notes_by_user[user.id]))
+            return getattr(client, "delete" if rounds % 2 else "post")(
+                f"/api/v1/notes/collaborators/{note.id}/",
+                {"collaborator_ids": new_collaborators_by_user[user.id]},
+                content_type="application/json",
+            )
+
+        def bulk_notes(client, index):
+            user = as_user(client, index)
+            operations = [
+                {"op": "create", "title": f"bulk {index} {offset}", "note": "bulk"}
+                for offset in range(5)
+            ] + [
+                {
+                    "op": "update",
+                    "note_id": str(own_note(user, index + offset).id),
+                    "title": f"bulk updated {index}",
+                    "note": "bulk",
+                    "files_urls": [],
+                }
+                for offset in range(5)
+            ]
+            return client.post(
+                "/api/v1/notes/bulk/",
+                {"operations": operations},
+                content_type="application/json",
+            )
+
+        scenario_functions = locals()
+        return {name: scenario_functions[name] for name in self.scenario_names()}
+
+    # send the requests of one endpoint from concurrent clients, every worker thread has its own client and database connection
+    def drive(self, scenario, options):
+        clients = threading.local()
+
+        def send(index):
+            if not hasattr(clients, "client"):
+                clients.client = Client(SERVER_NAME="localhost")
+
+            started_at = time.perf_counter()
+            response = scenario(clients.client, index)
+            return time.perf_counter() - started_at, response.status_code
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["clients"]) as workers:
+            samples = list(workers.map(send, range(options["requests"])))
+        elapsed = time.perf_counter() - started_at
+
+        latencies = sorted(latency for latency, _ in samples)
+        status_codes = {}
+        for _, status_code in samples:
+            status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+
+        return {
+            "requests": len(samples),
+            "errors": sum(status_code >= 400 for _, status_code in samples),
+            "statusCodes": status_codes,
+            "throughput": round(len(samples) / elapsed, 2),
+            "latencyMs": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": round(latencies[-1] * 1000, 3),
+            },
+        }
+
+    def format_result(self, name, result):
+        latency = result["latencyMs"]
+        return (
+            f"{name}: {result['throughput']:.1f} req/s, p50 {latency['p50']:.1f} ms, "
+            f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, "
+            f"{result['errors']} errors"
+        )
+
+    def write_results(self, results, options):
+        output = options["output"]
+        if output is None:
+            stamp = timezone.now().strftime("%Y%m%dT%H%M%S")
+            output = (
+                Path(settings.BASE_DIR)
+                / "bench-results"
+                / f"{stamp}-{(results['meta']['commit'] or 'unknown')[:10]}.json"
+            )
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2) + "\n")
+        self.stdout.write(f"Results written to {output}")
+
+        if options["compare"]:
+            self.compare(results, json.loads(Path(options["compare"]).read_text()))
+
+    # print the change of the throughput and the latency percentiles against an earlier run
+    def compare(self, results, previous):
+        self.stdout.write(f"Compared with {previous['meta'].get('commit')}:")
+
+        for name, result in results["endpoints"].items():
+            before = previous["endpoints"].get(name)
+            if before is None:
+                continue
+
+            changes = [
+                f"throughput {change(before['throughput'], result['throughput'])}"
+            ] + [
+                f"{key} {change(before['latencyMs'][key], result['latencyMs'][key])}"
+                for key in ("p50", "p95", "p99")
+            ]
+            self.stdout.write(f"{name}: {', '.join(changes)}")
+
+
+# the nearest rank percentile of sorted latencies in milliseconds
+def percentile(latencies, rank):
+    index = max(0, min(len(latencies) - 1, round(rank / 100 * len(latencies)) - 1))
+    return round(latencies[index] * 1000, 3)
+
+
+def change(before, after):
+    if not before:
+        return "n/a"
+
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+# the commit the benchmark ran on, None outside of a git checkout
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,180 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from users.models import User
+from notes.models import Notes
+from auth_sessions.utils import initializeToken
+
+# the environment of every database profile, each one runs in its own process since the database settings are read once at startup
+PROFILES = {
+    "sqlite-default": {
+        "DB_ENGINE": "sqlite",
+        "DB_CONN_MAX_AGE": "0",
+        "SQLITE_WAL": "false",
+    },
+    "sqlite-persistent": {
+        "DB_ENGINE": "sqlite",
+        "DB_CONN_MAX_AGE": "600",
+        "SQLITE_WAL": "false",
+    },
+    "sqlite-wal": {
+        "DB_ENGINE": "sqlite",
+        "DB_CONN_MAX_AGE": "600",
+        "SQLITE_WAL": "true",
+    },
+    "postgresql-default": {
+        "DB_ENGINE": "postgresql",
+        "DB_CONN_MAX_AGE": "0",
+        "DB_POOL": "false",
+    },
+    "postgresql-persistent": {
+        "DB_ENGINE": "postgresql",
+        "DB_CONN_MAX_AGE": "600",
+        "DB_POOL": "false",
+    },
+    "postgresql-pool": {
+        "DB_ENGINE": "postgresql",
+        "DB_POOL": "true",
+    },
+}
+
+
+# measures the requests per second of get_notes and create_note served by concurrent worker threads under every database profile
+class Command(BaseCommand):
+    help = (
+        "Load benchmark of the notes endpoints under the database connection profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            nargs="+",
+            choices=PROFILES,
+            default=["sqlite-default", "sqlite-persistent", "sqlite-wal"],
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--notes", type=int, default=100, help="Notes seeded before the run."
+        )
+        parser.add_argument(
+            "--run-profile",
+            action="store_true",
+            help="Run the load against the database configured in this process.",
+        )
+
+    def handle(self, *args, **options):
+        if options["run_profile"]:
+            self.stdout.write(json.dumps(self.run_load(options)))
+            return
+
+        for profile in options["profiles"]:
+            result = self.run_profile(profile, options)
+            if result is None:
+                continue
+
+            self.stdout.write(
+                f"{profile}: get_notes {result['get_notes']['rps']:.0f} req/s, "
+                f"create_note {result['create_note']['rps']:.0f} req/s, "
+                f"{result['get_notes']['errors'] + result['create_note']['errors']} errors "
+                f"({options['workers']} workers)"
+            )
+
+    # run the load in a child process started with the environment of the profile, every sqlite profile gets a fresh database file since the journal mode is stored in the file
+    def run_profile(self, profile, options):
+        env = {**os.environ, **PROFILES[profile]}
+
+        with tempfile.TemporaryDirectory() as directory:
+            if env["DB_ENGINE"] == "sqlite":
+                env["DB_NAME"] = os.path.join(directory, "bench.sqlite3")
+
+            completed = subprocess.run(
+                [
+                    sys.executable,
+                    sys.argv[0],
+                    "bench_db_profiles",
+                    "--run-profile",
+                    f"--workers={options['workers']}",
+                    f"--requests={options['requests']}",
+                    f"--notes={options['notes']}",
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+
+        if completed.returncode != 0:
+            self.stderr.write(f"{profile} failed:\n{completed.stderr}")
+            return None
+
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def run_load(self, options):
+        if settings.DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+            call_command("migrate", verbosity=0)
+
+        user = User.objects.create(
+            name="benchmark",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="x",
+        )
+        Notes.objects.bulk_create(
+            Notes(user=user, title=f"Note {index}", note="body")
+            for index in range(options["notes"])
+        )
+        token = initializeToken(user)
+
+        # every worker thread has its own client and so its own database connection
+        clients = threading.local()
+
+        def get_client():
+            if not hasattr(clients, "client"):
+                clients.client = Client(SERVER_NAME="localhost")
+                clients.client.cookies["token"] = token
+            return clients.client
+
+        endpoints = {
+            "get_notes": lambda index: get_client().get("/api/v1/notes/getnotes/"),
+            "create_note": lambda index: get_client().post(
+                "/api/v1/notes/", {"title": f"Load {index}", "note": "body"}
+            ),
+        }
+
+        results = {}
+        try:
+            # the listing cache is turned off so every request reads the database
+            with override_settings(NOTES_LISTING_CACHE_TIMEOUT=0):
+                for name, request in endpoints.items():
+                    results[name] = self.measure(request, options)
+        finally:
+            connections.close_all()
+            User.objects.filter(id=user.id).delete()
+
+        return results
+
+    def measure(self, request, options):
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as workers:
+            status_codes = list(
+                workers.map(
+                    lambda index: request(index).status_code, range(options["requests"])
+                )
+            )
+        elapsed = time.perf_counter() - started_at
+
+        return {
+            "rps": options["requests"] / elapsed,
+            "errors": sum(status_code >= 400 for status_code in status_codes),
+        }
@@ -0,0 +1,86 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from apis.utils import renderers
+from apis.utils.api_response import build_response_body
+
+
+# compares how fast the rest framework's json renderer and the orjson renderer turn a large notes listing into bytes
+class Command(BaseCommand):
+    help = "Benchmark the JSON renderers on a notes listing payload."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def build_payload(self, count):
+        owner_id = str(uuid.uuid4())
+        collaborator_ids = [str(uuid.uuid4()) for _ in range(3)]
+        now = timezone.now().isoformat()
+
+        # the notes are shaped like the output of the notes serializer
+        notes = [
+            {
+                "id": str(uuid.uuid4()),
+                "title": f"Note {index}",
+                "note": "Remember to pick up groceries, call back and review the draft. "
+                * 4,
+                "files": [
+                    f"https://res.cloudinary.com/demo/image/upload/v1/notes/{index}.jpg"
+                ],
+                "created_at": now,
+                "updated_at": now,
+                "change_seq": index,
+                "user": owner_id,
+                "collaborators": collaborator_ids[: index % 4],
+            }
+            for index in range(count)
+        ]
+
+        return build_response_body(
+            True, 200, "Notes have been fetched.", data=notes, meta={"pageSize": count}
+        )
+
+    def measure(self, renderer, payload, repeat):
+        # one untimed render warms up the caches
+        body = renderer.render(payload)
+
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            renderer.render(payload)
+        elapsed = (time.perf_counter() - started_at) / repeat
+
+        return elapsed, len(body)
+
+    def handle(self, *args, **options):
+        payload = self.build_payload(options["notes"])
+
+        results = [
+            (
+                "rest_framework",
+                *self.measure(JSONRenderer(), payload, options["repeat"]),
+            )
+        ]
+        if renderers.orjson is not None:
+            results.append(
+                (
+                    "orjson",
+                    *self.measure(
+                        renderers.FastJSONRenderer(), payload, options["repeat"]
+                    ),
+                )
+            )
+        else:
+            self.stderr.write(
+                "orjson is not installed, only the fallback renderer is measured."
+            )
+
+        baseline = results[0][1]
+        for name, elapsed, size in results:
+            self.stdout.write(
+                f"{name}: {elapsed * 1000:.1f} ms per render, "
+                f"{size / elapsed / 1024 / 1024:.1f} MB/s, "
+                f"{baseline / elapsed:.1f}x ({options['notes']} notes, {size / 1024:.0f} KB)"
+            )
@@ -0,0 +1,102 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users.models import User
+from notes.models import Notes, NoteCollaborator, Attachment
+from apis.serializers.note_serializers import (
+    NotesSerializer,
+    NotesExpandedSerializer,
+    NoteRowsSerializer,
+    collaborators_prefetch,
+    attachments_prefetch,
+)
+
+
+# compares the model serializers with the compiled .values() read serializer on a large notes listing, the benchmark data is written in a transaction that is rolled back
+class Command(BaseCommand):
+    help = "Benchmark the model serializers against the values() read serializer on a notes listing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def seed(self, count):
+        suffix = uuid.uuid4().hex[:8]
+        owner = User.objects.create(
+            name="benchmark", email=f"bench-{suffix}@example.com", password="x"
+        )
+        collaborators = User.objects.bulk_create(
+            User(
+                name=f"collaborator {index}",
+                email=f"bench-{suffix}-{index}@example.com",
+                password="x",
+            )
+            for index in range(3)
+        )
+
+        notes = Notes.objects.bulk_create(
+            Notes(
+                user=owner,
+                title=f"Note {index}",
+                note="Remember to pick up groceries, call back and review the draft.",
+            )
+            for index in range(count)
+        )
+        Attachment.objects.bulk_create(
+            Attachment(
+                note=note,
+                url=f"https://example.com/notes/{index}.jpg",
+                content_type="image/jpeg",
+            )
+            for index, note in enumerate(notes)
+        )
+        NoteCollaborator.objects.bulk_create(
+            NoteCollaborator(notes=note, user=collaborator)
+            for index, note in enumerate(notes)
+            for collaborator in collaborators[: index % 4]
+        )
+
+        return Notes.objects.filter(user=owner).order_by("-updated_at", "-id")
+
+    def measure(self, serialize, repeat):
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            serialize()
+
+        return (time.perf_counter() - started_at) / repeat
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            notes = self.seed(options["notes"])
+
+            for expand, serializer_class in (
+                (False, NotesSerializer),
+                (True, NotesExpandedSerializer),
+            ):
+                note_rows_serializer = NoteRowsSerializer(expand)
+
+                # both sides include loading the notes, their collaborators and their files from the database
+                model_elapsed = self.measure(
+                    lambda: serializer_class(
+                        notes.prefetch_related(
+                            collaborators_prefetch(expand), attachments_prefetch()
+                        ),
+                        many=True,
+                    ).data,
+                    options["repeat"],
+                )
+                rows_elapsed = self.measure(
+                    lambda: note_rows_serializer.serialize(
+                        list(note_rows_serializer.values(notes))
+                    ),
+                    options["repeat"],
+                )
+
+                self.stdout.write(
+                    f"{serializer_class.__name__}: {model_elapsed * 1000:.0f} ms, "
+                    f"NoteRowsSerializer(expand={expand}): {rows_elapsed * 1000:.0f} ms, "
+                    f"{model_elapsed / rows_elapsed:.1f}x faster ({options['notes']} notes)"
+                )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,62 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from apis.utils import passwords
+
+
+# measures how many password checks (the cpu bound part of a login) the password pool does per second and per core
+class Command(BaseCommand):
+    help = "Benchmark bcrypt password checks run through the password hashing pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Number of simulated request threads checking passwords at the same time.",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=settings.PASSWORD_HASH_ROUNDS,
+            help="bcrypt work factor to benchmark.",
+        )
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        rounds = options["rounds"]
+
+        with override_settings(PASSWORD_HASH_ROUNDS=rounds):
+            hashed_password = passwords.hash_password("benchmark-password")
+
+        # the request threads only wait on the password pool, like the login view does
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as request_threads:
+            results = list(
+                request_threads.map(
+                    lambda _: passwords.check_password(
+                        "benchmark-password", hashed_password
+                    ),
+                    range(logins),
+                )
+            )
+        elapsed = time.perf_counter() - started_at
+
+        if not all(results):
+            self.stderr.write("Some password checks failed.")
+
+        cores = min(settings.PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+        logins_per_second = logins / elapsed
+
+        self.stdout.write(
+            f"rounds={rounds} executor={settings.PASSWORD_HASH_EXECUTOR} "
+            f"workers={settings.PASSWORD_HASH_WORKERS} cores={cores}"
+        )
+        self.stdout.write(
+            f"{logins} logins in {elapsed:.2f}s: {logins_per_second:.1f} logins/s, "
+            f"{logins_per_second / cores:.1f} logins/s per core"
+        )
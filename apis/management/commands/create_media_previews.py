@@ -0,0 +1,53 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notes.models import Attachment
+from apis.utils.media_previews import create_previews
+
+
+# makes the previews of the attachments that are still pending, the attachments copied from the files lists of the notes by the 0007 migration start out pending and no request ever hands them to the preview workers, neither do the ones whose worker died with the process
+class Command(BaseCommand):
+    help = "Make the previews of the pending note attachments in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=10,
+            help="Minutes an attachment has to be pending for, the newer ones are still queued on the preview workers of a running server.",
+        )
+
+    def handle(self, *args, **options):
+        pending = Attachment.objects.filter(
+            preview_status=Attachment.PREVIEW_PENDING,
+            created_at__lte=timezone.now() - timedelta(minutes=options["min_age"]),
+        ).order_by("id")
+
+        # the batches are walked by id so an attachment whose previews could not be saved is not picked up again in the same run
+        last_id = None
+        made = 0
+        while True:
+            batch = pending if last_id is None else pending.filter(id__gt=last_id)
+            attachment_ids = list(
+                batch.values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not attachment_ids:
+                break
+
+            create_previews(attachment_ids)
+            made += len(attachment_ids)
+            last_id = attachment_ids[-1]
+            self.stdout.write(f"Processed {made} attachments, last id {last_id}")
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(f"Made the previews of {made} pending attachments.")
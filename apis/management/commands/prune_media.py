@@ -0,0 +1,130 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from notes.models import Attachment, NoteUpload
+from users.models import User
+from apis.utils.media_storage import get_media_storage
+
+
+# the urls of the page that a note attachment, its previews, a finished upload or a profile picture still refers to, found with one query per table
+def referenced_urls(urls):
+    referenced = set()
+
+    for row in Attachment.objects.filter(
+        Q(url__in=urls) | Q(thumbnail_url__in=urls) | Q(poster_url__in=urls)
+    ).values_list("url", "thumbnail_url", "poster_url"):
+        referenced.update(row)
+
+    referenced.update(
+        NoteUpload.objects.filter(url__in=urls).values_list("url", flat=True)
+    )
+    referenced.update(
+        User.objects.filter(profile_picture_url__in=urls).values_list(
+            "profile_picture_url", flat=True
+        )
+    )
+
+    return referenced
+
+
+# deletes the stored media files nothing refers to anymore, the files are shared between notes with the same content so they are only removed here, meant to be run periodically from cron or a scheduler
+class Command(BaseCommand):
+    help = "Delete media files no note or user refers to in batches and report the reclaimed bytes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Hours a file has to be stored for before it can be deleted, files of requests still in flight are not referenced yet.",
+        )
+        parser.add_argument(
+            "--cursor",
+            help="Resume the listing of the media storage from the cursor printed by an earlier run.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the orphaned files without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_media_storage()
+        now = timezone.now()
+        stored_before = now - timedelta(hours=options["min_age"])
+        dry_run = options["dry_run"]
+
+        aborted = 0
+        if not options["cursor"]:
+            aborted = self.prune_expired_uploads(storage, now, options)
+
+        cursor = options["cursor"]
+        scanned = deleted = reclaimed = 0
+
+        while True:
+            files, cursor = storage.list_files(cursor, options["batch_size"])
+            scanned += len(files)
+
+            # the files stored before the grace period with no reference left, a file whose time is not known could still be in flight so it is kept
+            referenced = referenced_urls([url for url, _, _ in files])
+            orphans = [
+                (url, size)
+                for url, size, modified_at in files
+                if url not in referenced
+                and modified_at is not None
+                and modified_at <= stored_before
+            ]
+
+            for url, size in orphans:
+                if not dry_run:
+                    storage.delete(url)
+                deleted += 1
+                reclaimed += size
+
+            if cursor is None:
+                break
+
+            # the cursor of every batch is printed so an interrupted run can be resumed
+            self.stdout.write(f"Scanned {scanned} files, resume with --cursor {cursor}")
+
+            if options["sleep"] and orphans:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            f"{'Found' if dry_run else 'Deleted'} {deleted} orphaned files of {scanned} scanned "
+            f"and {aborted} expired uploads, reclaimed {reclaimed} bytes."
+        )
+
+    # drop the partial files and the rows of the uploads that expired before being finished, a finished one leaves its stored file to the scan
+    def prune_expired_uploads(self, storage, now, options):
+        expired = NoteUpload.objects.filter(expires_at__lte=now)
+        if options["dry_run"]:
+            return expired.count()
+
+        pruned = 0
+        while True:
+            uploads = list(
+                expired.values_list("id", "storage_key")[: options["batch_size"]]
+            )
+            if not uploads:
+                break
+
+            for _, storage_key in uploads:
+                storage.abort_upload(storage_key)
+
+            NoteUpload.objects.filter(id__in=[id for id, _ in uploads]).delete()
+            pruned += len(uploads)
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        return pruned
@@ -0,0 +1,63 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .utils.metrics import current_request_phases, observe_request
+
+
+# middleware that measures every request, the latency and the time of its phases go to the prometheus metrics and optionally to the server timing response header, it supports both the sync and the async views
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        phases_token, started_at = self.start()
+        try:
+            response = self.get_response(request)
+            self.finish(request, response, started_at)
+        finally:
+            current_request_phases.reset(phases_token)
+
+        return response
+
+    async def __acall__(self, request):
+        phases_token, started_at = self.start()
+        try:
+            response = await self.get_response(request)
+            self.finish(request, response, started_at)
+        finally:
+            current_request_phases.reset(phases_token)
+
+        return response
+
+    def start(self):
+        return current_request_phases.set({}), time.perf_counter()
+
+    def finish(self, request, response, started_at):
+        duration = time.perf_counter() - started_at
+        phases = current_request_phases.get()
+
+        # the route pattern keeps the number of series bounded, the ids in the urls are not part of it
+        resolver_match = getattr(request, "resolver_match", None)
+        route = resolver_match.route if resolver_match else "unmatched"
+
+        observe_request(request.method, route, response.status_code, duration, phases)
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = ", ".join(
+                [
+                    *(
+                        f"{phase};dur={total * 1000:.3f}"
+                        for phase, (total, _) in phases.items()
+                    ),
+                    f"total;dur={duration * 1000:.3f}",
+                ]
+            )
@@ -1,7 +1,207 @@
-from rest_framework import serializers
-from notes.models import Notes
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from notes.models import Notes, NoteCollaborator, Attachment
+from ..utils.metrics import timed
+from users.models import User
+
+
+# the files of a note are the urls of its attachments in their order
+def files_field():
+    return serializers.SlugRelatedField(
+        source="attachments", slug_field="url", many=True, read_only=True
+    )
+
 
 class NotesSerializer(serializers.ModelSerializer):
+    files = files_field()
+
     class Meta:
         model = Notes
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+# the compact public profile of a collaborator embedded in the expanded note listing
+class CollaboratorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id", "name", "profile_picture_url"]
+
+
+# same as the notes serializer but with the collaborators embedded as compact profiles instead of ids
+class NotesExpandedSerializer(serializers.ModelSerializer):
+    files = files_field()
+    collaborators = CollaboratorSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Notes
+        fields = '__all__'
+
+
+# the collaborators of a whole page of notes are fetched in one batched query, only the columns the serializer renders are loaded
+def collaborators_prefetch(expand=False):
+    if expand:
+        return Prefetch(
+            "collaborators",
+            queryset=User.objects.only("id", "name", "profile_picture_url"),
+        )
+
+    return Prefetch("collaborators", queryset=User.objects.only("id"))
+
+
+# the attachments of a whole page of notes are fetched in one batched query, only the columns the serializer renders are loaded
+def attachments_prefetch():
+    return Prefetch(
+        "attachments", queryset=Attachment.objects.only("note_id", "url", "position")
+    )
+
+
+# the field types whose representation is the database value itself, they are copied from the row without a converter
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.JSONField,
+)
+
+
+# the iso 8601 representation of the datetime field without looking up the timezone for every value, the rest framework converts the aware datetimes to the current timezone and writes utc with a Z suffix
+def datetime_converter(field):
+    field_timezone = field.default_timezone()
+
+    def convert(value):
+        if field_timezone is not None and timezone.is_aware(value):
+            value = value.astimezone(field_timezone)
+
+        representation = value.isoformat()
+        if representation.endswith("+00:00"):
+            representation = representation[:-6] + "Z"
+
+        return representation
+
+    return convert
+
+
+# compile the fields of a model serializer into (output name, values() column, converter) triples once, the many to many fields get no column and are filled in separately
+def compile_read_fields(serializer_class, prefix=""):
+    read_fields = []
+
+    for name, field in serializer_class().fields.items():
+        if isinstance(
+            field, (serializers.ManyRelatedField, serializers.ListSerializer)
+        ):
+            read_fields.append((name, None, None))
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            read_fields.append((name, f"{prefix}{field.source}_id", None))
+        elif isinstance(field, PASSTHROUGH_FIELDS):
+            read_fields.append((name, f"{prefix}{field.source}", None))
+        elif (
+            isinstance(field, serializers.UUIDField)
+            and field.uuid_format == "hex_verbose"
+        ):
+            read_fields.append((name, f"{prefix}{field.source}", str))
+        elif isinstance(field, serializers.DateTimeField) and (
+            getattr(field, "format", api_settings.DATETIME_FORMAT) == ISO_8601
+        ):
+            read_fields.append(
+                (name, f"{prefix}{field.source}", datetime_converter(field))
+            )
+        else:
+            read_fields.append(
+                (name, f"{prefix}{field.source}", field.to_representation)
+            )
+
+    return read_fields
+
+
+# convert one values() row with the compiled fields, a null value is kept as null like the model serializer does and the many to many fields are left empty in their place for the caller to fill
+def convert_row(row, read_fields):
+    converted = {}
+
+    for name, column, converter in read_fields:
+        value = row[column] if column else None
+        converted[name] = (
+            value if converter is None or value is None else converter(value)
+        )
+
+    return converted
+
+
+# a read only serializer for the notes listing that works on .values() rows of the public note columns instead of model instances, the output has the same shape as the notes serializer (or the expanded one) but skips building the field objects for every note, with previews every note also gets the preview urls of its files
+class NoteRowsSerializer:
+    def __init__(self, expand=False, previews=False):
+        serializer_class = NotesExpandedSerializer if expand else NotesSerializer
+
+        self.expand = expand
+        self.previews = previews
+        self.read_fields = compile_read_fields(serializer_class)
+        self.columns = [column for _, column, _ in self.read_fields if column]
+        self.collaborator_fields = compile_read_fields(
+            CollaboratorSerializer, prefix="user__"
+        )
+
+    # the rows of the notes queryset holding only the columns the serializer renders
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    # the collaborators of all the rows are loaded with one query on the through table
+    def load_collaborators(self, note_ids):
+        collaborators = {}
+        through_rows = NoteCollaborator.objects.filter(notes_id__in=note_ids)
+
+        if self.expand:
+            for row in through_rows.values(
+                "notes_id", *[column for _, column, _ in self.collaborator_fields]
+            ):
+                collaborators.setdefault(row["notes_id"], []).append(
+                    convert_row(row, self.collaborator_fields)
+                )
+        else:
+            for note_id, user_id in through_rows.values_list("notes_id", "user_id"):
+                collaborators.setdefault(note_id, []).append(user_id)
+
+        return collaborators
+
+    # the files of all the rows and their previews are loaded with one query on the attachments, as lists of (url, preview url) pairs in the order of the files
+    def load_files(self, note_ids):
+        files = {}
+        for note_id, url, thumbnail_url, poster_url in Attachment.objects.filter(
+            note_id__in=note_ids
+        ).values_list("note_id", "url", "thumbnail_url", "poster_url"):
+            files.setdefault(note_id, []).append(
+                (url, thumbnail_url or poster_url or None)
+            )
+
+        return files
+
+    def serialize(self, rows):
+        if not rows:
+            return []
+
+        note_ids = [row["id"] for row in rows]
+        collaborators = self.load_collaborators(note_ids)
+        files = self.load_files(note_ids)
+
+        # the conversion is reported by the request metrics, the collaborators and files queries above are counted as db time
+        with timed("serialize"):
+            serialized_notes = []
+            for row in rows:
+                note = convert_row(row, self.read_fields)
+                note["collaborators"] = collaborators.get(row["id"], [])
+
+                note_files = files.get(row["id"], [])
+                note["files"] = [url for url, _ in note_files]
+
+                # a preview url for each file in the same order, null while it is being made or for the files without one
+                if self.previews:
+                    note["previews"] = [preview for _, preview in note_files]
+
+                serialized_notes.append(note)
+
+        return serialized_notes
+
+    # the async views run the collaborators and files queries in a worker thread
+    async def aserialize(self, rows):
+        return await sync_to_async(self.serialize)(rows)
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from users.models import User
 
+
+# the password hash never leaves the server
 class UsersSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = '__all__'
\ No newline at end of file
+        exclude = ["password"]
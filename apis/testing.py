@@ -0,0 +1,47 @@
+import re
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from users.models import User
+from auth_sessions.utils import initializeToken, token_cache
+
+# a plan step that reads a whole table or a whole index instead of searching it
+FULL_SCAN = re.compile(r"\bSCAN (?!CONSTANT ROW)(\S+)")
+
+# a plan step that sorts the rows after reading them instead of walking an index in order
+TEMP_SORT = re.compile(r"\bUSE TEMP B-TREE\b")
+
+
+# the checks of the sqlite query plans shared by the query plan tests of every app
+class QueryPlanAssertions:
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(FULL_SCAN.search(plan), f"Full scan in query plan:\n{plan}")
+
+    def assertNoTempSort(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(TEMP_SORT.search(plan), f"Sort in query plan:\n{plan}")
+
+
+# the setup shared by the api tests of every app, the tokens are signed with a test secret, the token and listing caches are emptied after every test and self.user owns the notes the tests create
+class AuthenticatedTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch("auth_sessions.utils.ENV_SECRET_KEY", "test-secret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(token_cache.clear)
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create(
+            name="owner", email="owner@example.com", password="x"
+        )
+
+    # start a new session for the user and send its token with the next requests
+    def login(self, user=None):
+        self.client.cookies["token"] = initializeToken(user or self.user)
+
+    def get_notes(self, query="", token=None):
+        if token is not None:
+            self.client.cookies["token"] = token
+
+        return self.client.get(f"/api/v1/notes/getnotes/{query}")
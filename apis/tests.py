@@ -1,3 +1,2224 @@
+import base64
+import bcrypt
+import json
+import os
+import threading
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+import cloudinary.exceptions
+from rest_framework.renderers import JSONRenderer
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.utils import timezone
+from users.models import User
+from notes.models import (
+    Notes,
+    NoteUpload,
+    Attachment,
+    NoteSearchDocument,
+    NoteTombstone,
+)
+from apis.serializers.note_serializers import (
+    NotesSerializer,
+    NotesExpandedSerializer,
+    NoteRowsSerializer,
+    collaborators_prefetch,
+    attachments_prefetch,
+)
+from apis.serializers.user_serializers import UsersSerializer
+from auth_sessions.utils import initializeToken, token_cache
+from apis.utils.media_storage import (
+    get_media_storage,
+    MediaStorage,
+    CloudinaryStorage,
+    InMemoryStorage,
+    LocalFileSystemStorage,
+)
+from apis.utils.attachments import add_attachments, note_file_urls, store_files
+from apis.utils.media_uploads import upload_files, aupload_files
+from apis.utils.passwords import check_password, password_needs_rehash
+from apis.utils.api_response import build_response_body
+from apis.utils.renderers import FastJSONRenderer, render_json
+from apis.utils.pagination import encode_cursor
+from apis.utils.note_changes import record_note_changes
+from apis.utils.bulk_notes import BulkNoteOperations
+from apis.testing import AuthenticatedTestCase
+from apis.utils.upload_handlers import UPLOAD_FIELD_RULES, sniff_content_types
+from apis.validators.note_validators import ACCEPTED_CONTENT_TYPES
 
-# Create your tests here.
+
+# the notes listing has to run the same number of queries no matter how many notes and collaborators are on the page
+class GetNotesQueryCountTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.collaborators = [
+            User.objects.create(name=f"user {index}", email=f"user{index}@example.com", password="x")
+            for index in range(5)
+        ]
+        self.login()
+
+    def create_notes(self, count):
+        for index in range(count):
+            note = Notes.objects.create(user=self.user, title=f"note {index}", note="body")
+            note.collaborators.set(self.collaborators[: index % 5 + 1])
+
+    def count_queries(self, path):
+        # the token and listing caches are emptied so the auth lookup and the listing are counted on every request, the owned and the shared notes are two queries and the sixth query loads the files and their previews
+        token_cache.clear()
+        cache.clear()
+
+        with self.assertNumQueries(6) as captured:
+            response = self.client.get(path)
+
+        self.assertEqual(response.status_code, 200)
+        return len(captured.captured_queries)
+
+    def test_query_count_does_not_grow_with_notes(self):
+        self.create_notes(2)
+        few_notes = self.count_queries("/api/v1/notes/getnotes/")
+
+        self.create_notes(30)
+        many_notes = self.count_queries("/api/v1/notes/getnotes/")
+
+        self.assertEqual(few_notes, many_notes)
+
+    def test_expanded_collaborators_query_count_does_not_grow_with_notes(self):
+        self.create_notes(2)
+        few_notes = self.count_queries("/api/v1/notes/getnotes/?expand=collaborators")
+
+        self.create_notes(30)
+        many_notes = self.count_queries("/api/v1/notes/getnotes/?expand=collaborators")
+
+        self.assertEqual(few_notes, many_notes)
+
+    def test_expanded_collaborators_are_compact_profiles(self):
+        self.create_notes(1)
+
+        response = self.client.get("/api/v1/notes/getnotes/?expand=collaborators")
+        collaborator = response.json()["data"][0]["collaborators"][0]
+
+        self.assertEqual(set(collaborator), {"id", "name", "profile_picture_url"})
+
+
+# repeated polls of an unchanged notes listing are answered from the etag without reading the notes again
+class GetNotesETagTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        self.note = Notes.objects.create(user=self.user, title="note", note="body")
+        self.login()
+
+    def get_etag(self, path="/api/v1/notes/getnotes/"):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_listing_returns_not_modified(self):
+        etag = self.get_etag()
+
+        # one query to verify the token and one aggregate query for the etag
+        token_cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/v1/notes/getnotes/", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_cached_listing_skips_the_notes_queries(self):
+        first = self.client.get("/api/v1/notes/getnotes/")
+
+        token_cache.clear()
+        with self.assertNumQueries(2):
+            second = self.client.get("/api/v1/notes/getnotes/")
+
+        self.assertEqual(first.json()["data"], second.json()["data"])
+
+    def test_etag_changes_with_the_query_parameters(self):
+        self.assertNotEqual(
+            self.get_etag(), self.get_etag("/api/v1/notes/getnotes/?page_size=1")
+        )
+
+    def test_etag_changes_when_a_note_is_created(self):
+        etag = self.get_etag()
+
+        self.client.post("/api/v1/notes/", {"title": "new", "note": "body"})
+
+        self.assertNotEqual(etag, self.get_etag())
+
+    def test_etag_changes_when_a_note_is_updated(self):
+        etag = self.get_etag()
+
+        self.client.put(
+            f"/api/v1/notes/{self.note.id}/",
+            encode_multipart(BOUNDARY, {"title": "changed", "note": "body"}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+        response = self.client.get("/api/v1/notes/getnotes/")
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(response.json()["data"][0]["title"], "changed")
+
+    def test_etag_changes_when_a_note_is_deleted(self):
+        Notes.objects.create(user=self.user, title="second", note="body")
+        etag = self.get_etag()
+
+        self.client.delete(
+            f"/api/v1/notes/{self.note.id}/",
+            {"note_id": str(self.note.id)},
+            content_type="application/json",
+        )
+
+        response = self.client.get("/api/v1/notes/getnotes/")
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(len(response.json()["data"]), 1)
+
+    def test_etag_changes_when_a_collaborator_is_added(self):
+        etag = self.get_etag()
+
+        self.client.post(
+            f"/api/v1/notes/collaborators/{self.note.id}/",
+            {"collaborator_id": str(self.other_user.id)},
+            content_type="application/json",
+        )
+
+        response = self.client.get("/api/v1/notes/getnotes/")
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(
+            response.json()["data"][0]["collaborators"], [str(self.other_user.id)]
+        )
+
+
+# the notes listing walks the (updated_at, id) keyset newest first, rejects cursors it did not make and can stream every note as a json line
+class GetNotesPaginationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.login()
+        other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+
+        # two notes share every timestamp so the id has to break the ties, every third note is shared by another user so the owned and the shared notes are merged into one order
+        now = timezone.now()
+        for index in range(6):
+            note = Notes.objects.create(
+                user=other_user if index % 3 == 1 else self.user,
+                title=f"note {index}",
+                note="body",
+            )
+            note.collaborators.add(self.user if index % 3 == 1 else other_user)
+            Notes.objects.filter(id=note.id).update(
+                updated_at=now - timedelta(minutes=index // 2)
+            )
+            record_note_changes([note.id])
+
+        self.expected_ids = [
+            str(note_id)
+            for note_id in Notes.objects.order_by("-updated_at", "-id").values_list(
+                "id", flat=True
+            )
+        ]
+
+    def test_pages_follow_the_keyset_order_across_ties(self):
+        seen_ids = []
+        cursor = None
+
+        while True:
+            query = "?page_size=2" + (f"&cursor={cursor}" if cursor else "")
+            response = self.get_notes(query)
+            self.assertEqual(response.status_code, 200)
+
+            body = response.json()
+            self.assertLessEqual(len(body["data"]), 2)
+            seen_ids += [note["id"] for note in body["data"]]
+
+            cursor = body["meta"]["nextCursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(seen_ids, self.expected_ids)
+
+    def test_owned_note_the_user_also_collaborates_on_is_listed_once(self):
+        note = Notes.objects.filter(user=self.user).first()
+        note.collaborators.add(self.user)
+        record_note_changes([note.id])
+
+        response = self.get_notes("?page_size=10")
+
+        self.assertEqual(
+            [note["id"] for note in response.json()["data"]], self.expected_ids
+        )
+
+    def test_last_page_has_no_next_cursor(self):
+        response = self.get_notes("?page_size=6")
+
+        self.assertEqual(len(response.json()["data"]), 6)
+        self.assertIsNone(response.json()["meta"]["nextCursor"])
+
+    def test_malformed_and_tampered_cursors_are_rejected(self):
+        tampered = base64.urlsafe_b64encode(
+            json.dumps(["not a date", "not a uuid"]).encode()
+        ).decode()
+
+        for cursor in (
+            "garbage",
+            "%00",
+            tampered,
+            encode_cursor(timezone.now(), 1)[:-4],
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.get_notes(f"?cursor={cursor}")
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(NOTES_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        response = self.get_notes("?page_size=100")
+
+        self.assertEqual(response.json()["meta"]["pageSize"], 3)
+        self.assertEqual(len(response.json()["data"]), 3)
+
+    def test_page_size_has_to_be_positive(self):
+        self.assertEqual(self.get_notes("?page_size=0").status_code, 400)
+
+    def test_stream_writes_every_note_as_a_json_line(self):
+        for response in (
+            self.get_notes("?stream=true&page_size=4"),
+            self.client.get(
+                "/api/v1/notes/getnotes/?page_size=4",
+                HTTP_ACCEPT="application/x-ndjson",
+            ),
+        ):
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+            lines = b"".join(response.streaming_content).decode().splitlines()
+            self.assertEqual(
+                [json.loads(line)["id"] for line in lines], self.expected_ids
+            )
+
+
+# the search ranks the matching notes the user can see, pages through them and follows the notes as they are updated and deleted
+class NoteSearchTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        self.login()
+
+    def create_note(self, title, note, user=None):
+        if user is not None:
+            self.client.cookies["token"] = initializeToken(user)
+
+        response = self.client.post("/api/v1/notes/", {"title": title, "note": note})
+        self.assertEqual(response.status_code, 200)
+        self.client.cookies["token"] = initializeToken(self.user)
+
+        return Notes.objects.get(title=title)
+
+    def search(self, query):
+        response = self.client.get(f"/api/v1/notes/search/?q={query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, query):
+        return [note["title"] for note in self.search(query)["data"]]
+
+    def test_better_matches_rank_first(self):
+        self.create_note("passing", "groceries " + "and some other words " * 20)
+        self.create_note("list", "groceries groceries groceries")
+        self.create_note("unrelated", "nothing to see")
+
+        self.assertEqual(self.titles("groceries"), ["list", "passing"])
+
+    def test_last_word_matches_as_a_prefix(self):
+        self.create_note("shopping", "buy groceries")
+
+        self.assertEqual(self.titles("buy groc"), ["shopping"])
+        self.assertEqual(self.titles("AND OR NOT groc*"), [])
+
+    def test_only_owned_and_collaborated_notes_are_found(self):
+        self.create_note("mine", "secret plan")
+        shared = self.create_note("shared", "secret plan", user=self.other_user)
+        self.create_note("hidden", "secret plan", user=self.other_user)
+        shared.collaborators.add(self.user)
+
+        self.assertEqual(sorted(self.titles("secret")), ["mine", "shared"])
+
+    def test_results_are_paginated(self):
+        for index in range(3):
+            self.create_note(f"note {index}", "paged body")
+
+        pages = [
+            self.client.get(
+                f"/api/v1/notes/search/?q=paged&page_size=2&page={page}"
+            ).json()
+            for page in (1, 2)
+        ]
+
+        self.assertEqual([len(page["data"]) for page in pages], [2, 1])
+        self.assertEqual([page["meta"]["hasNextPage"] for page in pages], [True, False])
+        self.assertEqual(
+            len({note["id"] for page in pages for note in page["data"]}), 3
+        )
+
+    def test_index_follows_updates(self):
+        note = self.create_note("recipe", "flour and sugar")
+
+        self.client.put(
+            f"/api/v1/notes/{note.id}/",
+            encode_multipart(BOUNDARY, {"title": "recipe", "note": "butter and salt"}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+        self.assertEqual(self.titles("sugar"), [])
+        self.assertEqual(self.titles("butter"), ["recipe"])
+
+    def test_index_follows_deletes(self):
+        note = self.create_note("recipe", "flour and sugar")
+
+        self.client.delete(f"/api/v1/notes/{note.id}/")
+
+        self.assertEqual(self.titles("sugar"), [])
+        self.assertFalse(NoteSearchDocument.objects.exists())
+
+    def test_query_without_words_is_empty(self):
+        self.create_note("recipe", "flour and sugar")
+
+        self.assertEqual(self.titles("%22*%22"), [])
+
+
+# the compiled read serializer has to render exactly what the model serializers render
+class NoteRowsSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            name="owner", email="owner@example.com", password="x"
+        )
+        collaborators = [
+            User.objects.create(
+                name=f"user {index}", email=f"user{index}@example.com", password="x"
+            )
+            for index in range(3)
+        ]
+
+        for index in range(4):
+            note = Notes.objects.create(
+                user=self.user, title=f"note {index}", note="body"
+            )
+            note.collaborators.set(collaborators[:index])
+            Attachment.objects.bulk_create(
+                Attachment(
+                    note=note,
+                    url=f"https://example.com/{index}-{position}.png",
+                    content_type="image/png",
+                    position=position,
+                )
+                for position in range(index)
+            )
+
+    def assert_same_output(self, expand, serializer_class):
+        notes = Notes.objects.order_by("id")
+
+        expected = serializer_class(
+            notes.prefetch_related(
+                collaborators_prefetch(expand), attachments_prefetch()
+            ),
+            many=True,
+        ).data
+
+        note_rows_serializer = NoteRowsSerializer(expand)
+        actual = note_rows_serializer.serialize(
+            list(note_rows_serializer.values(notes))
+        )
+
+        # the collaborators of a note have no defined order in either serializer
+        def normalize(serialized_notes):
+            return [
+                {
+                    **note,
+                    "collaborators": sorted(note["collaborators"], key=str),
+                }
+                for note in serialized_notes
+            ]
+
+        self.assertEqual(normalize(expected), normalize(actual))
+        self.assertEqual(
+            [list(note) for note in expected], [list(note) for note in actual]
+        )
+
+    def test_matches_notes_serializer(self):
+        self.assert_same_output(False, NotesSerializer)
+
+    def test_matches_expanded_notes_serializer(self):
+        self.assert_same_output(True, NotesExpandedSerializer)
+
+    def test_user_serializer_hides_the_password(self):
+        self.assertNotIn("password", UsersSerializer(self.user).data)
+
+
+# the collaborators of a note are resolved and written with a fixed number of queries however many are given
+class CollaboratorBatchTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.collaborators = [
+            User.objects.create(
+                name=f"user {index}", email=f"user{index}@example.com", password="x"
+            )
+            for index in range(20)
+        ]
+        self.note = Notes.objects.create(user=self.user, title="note", note="body")
+        self.login()
+
+    def collaborators_request(self, method, data):
+        return getattr(self.client, method)(
+            f"/api/v1/notes/collaborators/{self.note.id}/",
+            data,
+            content_type="application/json",
+        )
+
+    def test_create_note_query_count_does_not_grow_with_collaborators(self):
+        # the first request caches the token so both measured requests skip the auth query
+        self.client.get("/api/v1/notes/getnotes/")
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(
+                "/api/v1/notes/",
+                {
+                    "title": "a",
+                    "note": "b",
+                    "collaborators": [str(self.collaborators[0].id)],
+                },
+            )
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(
+                "/api/v1/notes/",
+                {
+                    "title": "a",
+                    "note": "b",
+                    "collaborators": [str(user.id) for user in self.collaborators],
+                },
+            )
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(
+            Notes.objects.get(
+                title="a", collaborators=self.collaborators[-1]
+            ).collaborators.count(),
+            20,
+        )
+
+    def test_add_a_list_of_collaborators(self):
+        collaborator_ids = [str(user.id) for user in self.collaborators[:5]]
+
+        response = self.collaborators_request(
+            "post", {"collaborator_ids": collaborator_ids}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {
+                str(user_id)
+                for user_id in self.note.collaborators.values_list("id", flat=True)
+            },
+            set(collaborator_ids),
+        )
+
+    def test_add_only_the_new_collaborators(self):
+        self.note.collaborators.add(self.collaborators[0])
+
+        response = self.collaborators_request(
+            "post",
+            {"collaborator_ids": [str(user.id) for user in self.collaborators[:2]]},
+        )
+
+        self.assertEqual(
+            response.json()["data"], {"added": [str(self.collaborators[1].id)]}
+        )
+
+    def test_single_collaborator_id_is_still_accepted(self):
+        response = self.collaborators_request(
+            "post", {"collaborator_id": str(self.collaborators[0].id)}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.note.collaborators.all()), [self.collaborators[0]])
+
+    def test_unknown_collaborator_ids_are_reported(self):
+        unknown_id = "4f7d7c9e-6f0e-4c5d-9a0b-111111111111"
+
+        response = self.collaborators_request(
+            "post", {"collaborator_ids": [str(self.collaborators[0].id), unknown_id]}
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], {"invalidIds": [unknown_id]})
+        self.assertFalse(self.note.collaborators.exists())
+
+    def test_remove_a_list_of_collaborators(self):
+        self.note.collaborators.set(self.collaborators[:3])
+
+        response = self.collaborators_request(
+            "delete",
+            {"collaborator_ids": [str(user.id) for user in self.collaborators[:2]]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.note.collaborators.all()), [self.collaborators[2]])
+
+    def test_stranger_can_not_change_the_collaborators(self):
+        self.note.collaborators.add(self.collaborators[0])
+        self.client.cookies["token"] = initializeToken(self.collaborators[1])
+
+        for method in ("post", "delete"):
+            response = self.collaborators_request(
+                method, {"collaborator_ids": [str(self.collaborators[0].id)]}
+            )
+            self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(list(self.note.collaborators.all()), [self.collaborators[0]])
+
+    def test_collaborator_can_change_the_collaborators(self):
+        self.note.collaborators.add(self.collaborators[0])
+        self.client.cookies["token"] = initializeToken(self.collaborators[0])
+
+        response = self.collaborators_request(
+            "post", {"collaborator_ids": [str(self.collaborators[1].id)]}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.note.collaborators.count(), 2)
+
+    def test_collaborator_can_update_the_note(self):
+        self.note.collaborators.add(self.collaborators[0])
+        self.client.cookies["token"] = initializeToken(self.collaborators[0])
+
+        response = self.client.put(
+            f"/api/v1/notes/{self.note.id}/",
+            encode_multipart(BOUNDARY, {"title": "changed", "note": "body"}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, "changed")
+
+
+# a bulk request applies its operations in order with the rules of the single note endpoints and writes them all or nothing
+class BulkNotesTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        self.third_user = User.objects.create(
+            name="third", email="third@example.com", password="x"
+        )
+        self.note = Notes.objects.create(user=self.user, title="note", note="body")
+        self.login()
+
+    def bulk(self, body):
+        return self.client.post(
+            "/api/v1/notes/bulk/", body, content_type="application/json"
+        )
+
+    def run_operations(self, *operations):
+        response = self.bulk({"operations": list(operations)})
+        self.assertEqual(response.status_code, 200)
+
+        return [result["statusCode"] for result in response.json()["data"]]
+
+    def test_operations_are_checked_and_written_in_one_transaction(self):
+        blocks = {}
+
+        def inside(step):
+            original = getattr(BulkNoteOperations, step)
+
+            def record(operations):
+                blocks[step] = list(connection.savepoint_ids)
+                return original(operations)
+
+            return mock.patch.object(BulkNoteOperations, step, record)
+
+        outside = list(connection.savepoint_ids)
+        with inside("load"), inside("save"):
+            self.run_operations(
+                {
+                    "op": "update",
+                    "note_id": str(self.note.id),
+                    "title": "a",
+                    "note": "b",
+                }
+            )
+
+        self.assertEqual(blocks["load"], blocks["save"])
+        self.assertGreater(len(blocks["load"]), len(outside))
+
+    def test_mixed_operations(self):
+        statuses = self.run_operations(
+            {
+                "op": "create",
+                "title": "new",
+                "note": "body",
+                "collaborators": [str(self.other_user.id)],
+            },
+            {
+                "op": "update",
+                "note_id": str(self.note.id),
+                "title": "changed",
+                "note": "body",
+            },
+            {
+                "op": "add_collaborator",
+                "note_id": str(self.note.id),
+                "collaborator_id": str(self.third_user.id),
+            },
+        )
+
+        self.assertEqual(statuses, [201, 200, 200])
+        new_note = Notes.objects.get(title="new")
+        self.assertEqual(list(new_note.collaborators.all()), [self.other_user])
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, "changed")
+        self.assertEqual(list(self.note.collaborators.all()), [self.third_user])
+
+        statuses = self.run_operations(
+            {
+                "op": "remove_collaborator",
+                "note_id": str(self.note.id),
+                "collaborator_id": str(self.third_user.id),
+            },
+            {"op": "delete", "note_id": str(new_note.id)},
+        )
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertFalse(self.note.collaborators.exists())
+        self.assertFalse(Notes.objects.filter(id=new_note.id).exists())
+
+    def test_every_operation_gets_its_own_status(self):
+        self.note.collaborators.add(self.other_user)
+        unknown_id = "4f7d7c9e-6f0e-4c5d-9a0b-111111111111"
+
+        response = self.bulk(
+            {
+                "operations": [
+                    {"op": "update", "note_id": unknown_id, "title": "a", "note": "b"},
+                    {
+                        "op": "add_collaborator",
+                        "note_id": str(self.note.id),
+                        "collaborator_id": str(self.other_user.id),
+                    },
+                    {
+                        "op": "add_collaborator",
+                        "note_id": str(self.note.id),
+                        "collaborator_id": unknown_id,
+                    },
+                    {
+                        "op": "remove_collaborator",
+                        "note_id": str(self.note.id),
+                        "collaborator_id": str(self.user.id),
+                    },
+                    {
+                        "op": "create",
+                        "title": "a",
+                        "note": "b",
+                        "collaborators": [unknown_id],
+                    },
+                    {"op": "create", "title": "kept", "note": "b"},
+                ]
+            }
+        )
+
+        results = response.json()["data"]
+        self.assertEqual(
+            [
+                (result["index"], result["statusCode"], result["success"])
+                for result in results
+            ],
+            [
+                (0, 404, False),
+                (1, 409, False),
+                (2, 404, False),
+                (3, 409, False),
+                (4, 409, False),
+                (5, 201, True),
+            ],
+        )
+        self.assertTrue(Notes.objects.filter(title="kept").exists())
+
+    def test_delete_then_update_in_one_batch(self):
+        statuses = self.run_operations(
+            {"op": "delete", "note_id": str(self.note.id)},
+            {"op": "update", "note_id": str(self.note.id), "title": "a", "note": "b"},
+        )
+
+        self.assertEqual(statuses, [200, 404])
+        self.assertFalse(Notes.objects.filter(id=self.note.id).exists())
+
+        # an update followed by a delete of the same note only deletes it
+        note = Notes.objects.create(user=self.user, title="note", note="body")
+        statuses = self.run_operations(
+            {"op": "update", "note_id": str(note.id), "title": "a", "note": "b"},
+            {"op": "delete", "note_id": str(note.id)},
+        )
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertFalse(Notes.objects.filter(id=note.id).exists())
+
+    def test_permission_denials(self):
+        foreign_note = Notes.objects.create(
+            user=self.other_user, title="foreign", note="body"
+        )
+        shared_note = Notes.objects.create(
+            user=self.other_user, title="shared", note="body"
+        )
+        shared_note.collaborators.add(self.user)
+
+        statuses = self.run_operations(
+            {
+                "op": "update",
+                "note_id": str(foreign_note.id),
+                "title": "a",
+                "note": "b",
+            },
+            {"op": "delete", "note_id": str(foreign_note.id)},
+            {
+                "op": "add_collaborator",
+                "note_id": str(foreign_note.id),
+                "collaborator_id": str(self.third_user.id),
+            },
+            # a collaborator can edit the note but not delete it
+            {
+                "op": "update",
+                "note_id": str(shared_note.id),
+                "title": "edited",
+                "note": "b",
+            },
+            {"op": "delete", "note_id": str(shared_note.id)},
+        )
+
+        self.assertEqual(statuses, [401, 401, 401, 200, 401])
+        foreign_note.refresh_from_db()
+        self.assertEqual(foreign_note.title, "foreign")
+        self.assertFalse(foreign_note.collaborators.exists())
+        self.assertEqual(Notes.objects.get(id=shared_note.id).title, "edited")
+
+    def test_failed_write_rolls_back_the_whole_batch(self):
+        with mock.patch(
+            "apis.utils.bulk_notes.record_note_changes",
+            side_effect=RuntimeError("Write failed."),
+        ):
+            response = self.bulk(
+                {
+                    "operations": [
+                        {"op": "create", "title": "new", "note": "body"},
+                        {
+                            "op": "update",
+                            "note_id": str(self.note.id),
+                            "title": "changed",
+                            "note": "body",
+                        },
+                        {
+                            "op": "add_collaborator",
+                            "note_id": str(self.note.id),
+                            "collaborator_id": str(self.other_user.id),
+                        },
+                    ]
+                }
+            )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Notes.objects.filter(title="new").exists())
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, "note")
+        self.assertFalse(self.note.collaborators.exists())
+
+    def test_invalid_operation_rejects_the_batch(self):
+        response = self.bulk(
+            {
+                "operations": [
+                    {"op": "create", "title": "new", "note": "body"},
+                    {"op": "rename", "note_id": str(self.note.id)},
+                    {"op": "delete", "note_id": "not-a-uuid"},
+                ]
+            }
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [
+                (result["index"], result["message"])
+                for result in response.json()["error"]
+            ],
+            [(1, "Unknown operation."), (2, "Failed in type validation.")],
+        )
+        self.assertFalse(Notes.objects.filter(title="new").exists())
+
+    def test_body_has_to_be_an_object_with_operations(self):
+        for body in ([{"op": "delete", "note_id": str(self.note.id)}], "text", {}):
+            with self.subTest(body=body):
+                self.assertEqual(self.bulk(body).status_code, 400)
+
+        self.assertTrue(Notes.objects.filter(id=self.note.id).exists())
+
+    @override_settings(NOTES_BULK_MAX_OPERATIONS=2)
+    def test_batch_size_is_capped(self):
+        response = self.bulk(
+            {"operations": [{"op": "create", "title": "a", "note": "b"}] * 3}
+        )
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Notes.objects.filter(title="a").exists())
+
+
+# the delta sync hands out the notes changed and the notes removed after the cursor of the client, in pages that never skip a change
+class NoteChangesTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.collaborator = User.objects.create(
+            name="collaborator", email="collaborator@example.com", password="x"
+        )
+        self.tokens = {
+            self.user: initializeToken(self.user),
+            self.collaborator: initializeToken(self.collaborator),
+        }
+        self.client.cookies["token"] = self.tokens[self.user]
+
+    def create_note(self, title, collaborators=()):
+        response = self.client.post(
+            "/api/v1/notes/",
+            {
+                "title": title,
+                "note": "body",
+                "collaborators": [str(user.id) for user in collaborators],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+
+        return Notes.objects.get(title=title)
+
+    def changes(self, since=0, user=None, page_size=None):
+        self.client.cookies["token"] = self.tokens[user or self.user]
+        query = f"?since={since}" + (f"&page_size={page_size}" if page_size else "")
+        response = self.client.get(f"/api/v1/notes/changes/{query}")
+        self.client.cookies["token"] = self.tokens[self.user]
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return (
+            [note["title"] for note in body["data"]["notes"]],
+            body["data"]["deleted"],
+            body["meta"]["cursor"],
+            body["meta"]["hasMore"],
+        )
+
+    def test_only_changes_after_the_cursor_are_sent(self):
+        first = self.create_note("first")
+        self.create_note("second")
+
+        titles, deleted, cursor, has_more = self.changes()
+        self.assertEqual((titles, deleted, has_more), (["first", "second"], [], False))
+
+        self.assertEqual(self.changes(cursor), ([], [], cursor, False))
+
+        self.client.put(
+            f"/api/v1/notes/{first.id}/",
+            encode_multipart(BOUNDARY, {"title": "first", "note": "changed"}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+        titles, _, next_cursor, _ = self.changes(cursor)
+        self.assertEqual(titles, ["first"])
+        self.assertGreater(next_cursor, cursor)
+
+    def test_deleted_note_leaves_a_tombstone_for_everyone_who_saw_it(self):
+        note = self.create_note("shared", collaborators=[self.collaborator])
+        _, _, owner_cursor, _ = self.changes()
+        _, _, collaborator_cursor, _ = self.changes(user=self.collaborator)
+
+        self.client.delete(f"/api/v1/notes/{note.id}/")
+
+        self.assertEqual(self.changes(owner_cursor)[:2], ([], [str(note.id)]))
+        self.assertEqual(
+            self.changes(collaborator_cursor, user=self.collaborator)[:2],
+            ([], [str(note.id)]),
+        )
+
+    def test_removed_collaborator_gets_a_tombstone(self):
+        note = self.create_note("shared", collaborators=[self.collaborator])
+        _, _, owner_cursor, _ = self.changes()
+        _, _, collaborator_cursor, _ = self.changes(user=self.collaborator)
+
+        self.client.delete(
+            f"/api/v1/notes/collaborators/{note.id}/",
+            {"collaborator_id": str(self.collaborator.id)},
+            content_type="application/json",
+        )
+
+        self.assertEqual(
+            self.changes(collaborator_cursor, user=self.collaborator)[:2],
+            ([], [str(note.id)]),
+        )
+        # the owner still sees the note and gets it as changed
+        self.assertEqual(self.changes(owner_cursor)[:2], (["shared"], []))
+
+        # sharing the note again brings it back instead of the tombstone
+        self.client.post(
+            f"/api/v1/notes/collaborators/{note.id}/",
+            {"collaborator_id": str(self.collaborator.id)},
+            content_type="application/json",
+        )
+        self.assertEqual(
+            self.changes(collaborator_cursor, user=self.collaborator)[:2],
+            (["shared"], []),
+        )
+
+    def test_changes_are_paged_by_the_cursor(self):
+        for index in range(5):
+            self.create_note(f"note {index}")
+        self.client.delete(f"/api/v1/notes/{Notes.objects.get(title='note 0').id}/")
+
+        pages = []
+        cursor = 0
+        while True:
+            titles, deleted, cursor, has_more = self.changes(cursor, page_size=2)
+            self.assertLessEqual(len(titles) + len(deleted), 2)
+            pages.append((titles, len(deleted)))
+            if not has_more:
+                break
+
+        self.assertEqual(
+            pages,
+            [(["note 1", "note 2"], 0), (["note 3", "note 4"], 0), ([], 1)],
+        )
+
+    def test_note_is_not_created_without_its_change_cursor(self):
+        with mock.patch(
+            "apis.views.note_views.record_note_changes",
+            side_effect=RuntimeError("Write failed."),
+        ):
+            response = self.client.post(
+                "/api/v1/notes/", {"title": "new", "note": "body"}
+            )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Notes.objects.exists())
+
+
+# the async views take the same requests and give the same answers as their sync versions, with every write of a request in one transaction
+@override_settings(
+    MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage",
+    MEDIA_PREVIEW_WORKERS=0,
+)
+class AsyncViewsTests(AuthenticatedTestCase):
+    PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+    def setUp(self):
+        super().setUp()
+
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+
+        self.collaborator = User.objects.create(
+            name="collaborator", email="collaborator@example.com", password="x"
+        )
+        self.stranger = User.objects.create(
+            name="stranger", email="stranger@example.com", password="x"
+        )
+        self.note = Notes.objects.create(user=self.user, title="note", note="body")
+        self.note.collaborators.add(self.collaborator)
+        self.tokens = {
+            user: initializeToken(user)
+            for user in (self.user, self.collaborator, self.stranger)
+        }
+        self.login(self.user)
+
+    def login(self, user):
+        self.async_client.cookies["token"] = self.tokens[user]
+
+    async def update_note(self, fields):
+        return await self.async_client.put(
+            f"/api/v1/async/notes/{self.note.id}/",
+            encode_multipart(BOUNDARY, {"title": "note", "note": "body", **fields}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+    async def test_create_note_with_collaborators_and_files(self):
+        response = await self.async_client.post(
+            "/api/v1/async/notes/",
+            {
+                "title": "new",
+                "note": "body",
+                "collaborators": [str(self.collaborator.id)],
+                "files": SimpleUploadedFile("a.png", self.PNG, "image/png"),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+
+        note = await Notes.objects.aget(title="new")
+        self.assertGreater(note.change_seq, 0)
+        self.assertEqual(
+            [user async for user in note.collaborators.all()], [self.collaborator]
+        )
+        self.assertEqual(await Attachment.objects.filter(note=note).acount(), 1)
+        self.assertEqual(await NoteSearchDocument.objects.filter(note=note).acount(), 1)
+
+    async def test_failed_create_leaves_no_note_behind(self):
+        with mock.patch(
+            "apis.views.note_views.record_note_changes",
+            side_effect=RuntimeError("Write failed."),
+        ):
+            response = await self.async_client.post(
+                "/api/v1/async/notes/",
+                {
+                    "title": "new",
+                    "note": "body",
+                    "collaborators": [str(self.collaborator.id)],
+                    "files": SimpleUploadedFile("a.png", self.PNG, "image/png"),
+                },
+            )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(await Notes.objects.filter(title="new").aexists())
+        self.assertFalse(await Attachment.objects.aexists())
+
+    async def test_stream_merges_the_owned_and_the_shared_notes(self):
+        own_note = await Notes.objects.acreate(
+            user=self.collaborator, title="own", note="body"
+        )
+        self.login(self.collaborator)
+
+        response = await self.async_client.get(
+            "/api/v1/async/notes/getnotes/?stream=true&page_size=1"
+        )
+        lines = b"".join(
+            [chunk async for chunk in response.streaming_content]
+        ).splitlines()
+
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines],
+            [str(own_note.id), str(self.note.id)],
+        )
+
+    async def test_get_notes_reuses_the_cached_listing(self):
+        first = await self.async_client.get("/api/v1/async/notes/getnotes/")
+        self.assertEqual(first.status_code, 200)
+
+        with mock.patch(
+            "apis.views.async_note_views.apaginate_notes",
+            side_effect=AssertionError("The listing was read again."),
+        ):
+            second = await self.async_client.get("/api/v1/async/notes/getnotes/")
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()["data"], second.json()["data"])
+
+        # the sync view reads the same cached payload
+        self.client.cookies["token"] = self.tokens[self.user]
+        with mock.patch(
+            "apis.views.note_views.paginate_notes",
+            side_effect=AssertionError("The listing was read again."),
+        ):
+            response = await sync_to_async(self.client.get)("/api/v1/notes/getnotes/")
+        self.assertEqual(response.json()["data"], first.json()["data"])
+
+    async def test_update_note(self):
+        self.login(self.collaborator)
+        response = await self.update_note(
+            {
+                "title": "changed",
+                "files": [SimpleUploadedFile("a.png", self.PNG, "image/png")],
+            }
+        )
+        self.assertEqual(response.status_code, 200)
+
+        await self.note.arefresh_from_db()
+        self.assertEqual(self.note.title, "changed")
+        self.assertEqual(await Attachment.objects.filter(note=self.note).acount(), 1)
+
+        self.login(self.stranger)
+        self.assertEqual((await self.update_note({"title": "taken"})).status_code, 401)
+
+        self.login(self.user)
+        self.assertEqual(
+            (await self.update_note({"title": "changed"})).status_code, 409
+        )
+
+    async def test_delete_note(self):
+        self.login(self.collaborator)
+        response = await self.async_client.delete(
+            f"/api/v1/async/notes/{self.note.id}/"
+        )
+        self.assertEqual(response.status_code, 401)
+
+        self.login(self.user)
+        response = await self.async_client.delete(
+            f"/api/v1/async/notes/{self.note.id}/"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(await Notes.objects.filter(id=self.note.id).aexists())
+        self.assertEqual(
+            {
+                user_id
+                async for user_id in NoteTombstone.objects.values_list(
+                    "user_id", flat=True
+                )
+            },
+            {self.user.id, self.collaborator.id},
+        )
+
+    async def test_add_and_remove_collaborators(self):
+        url = f"/api/v1/async/notes/collaborators/{self.note.id}/"
+        body = {"collaborator_ids": [str(self.stranger.id)]}
+
+        response = await self.async_client.post(
+            url, body, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"], {"added": [str(self.stranger.id)]})
+
+        response = await self.async_client.post(
+            url, body, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+
+        response = await self.async_client.delete(
+            url, body, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            await self.note.collaborators.filter(id=self.stranger.id).aexists()
+        )
+
+    async def test_stranger_can_not_change_the_collaborators(self):
+        self.login(self.stranger)
+
+        response = await self.async_client.delete(
+            f"/api/v1/async/notes/collaborators/{self.note.id}/",
+            {"collaborator_ids": [str(self.collaborator.id)]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(
+            await self.note.collaborators.filter(id=self.collaborator.id).aexists()
+        )
+
+    async def test_create_and_get_user(self):
+        with mock.patch(
+            "apis.views.async_user_views.ahash_password", return_value="hashed"
+        ):
+            response = await self.async_client.post(
+                "/api/v1/async/users/",
+                {
+                    "name": "new user",
+                    "email": "new@example.com",
+                    "password": "secret password",
+                    "profile_picture": SimpleUploadedFile(
+                        "me.png", self.PNG, "image/png"
+                    ),
+                },
+            )
+        self.assertEqual(response.status_code, 201)
+
+        user = await User.objects.aget(email="new@example.com")
+        self.assertEqual(user.password, "hashed")
+        self.assertEqual(get_media_storage().files[user.profile_picture_url], self.PNG)
+
+        response = await self.async_client.generic(
+            "GET",
+            "/api/v1/async/users/",
+            json.dumps({"email": "new@example.com"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["name"], "new user")
+        self.assertNotIn("password", response.json()["data"])
+
+    async def test_logout_ends_the_session(self):
+        response = await self.async_client.post("/api/v1/async/users/logout/")
+        self.assertEqual(response.status_code, 200)
+
+        response = await self.async_client.get("/api/v1/async/notes/getnotes/")
+        self.assertEqual(response.status_code, 401)
+
+
+# every request is measured into the prometheus metrics and the server timing header
+@override_settings(METRICS_ENABLED=True, SERVER_TIMING_HEADER=True)
+class RequestMetricsTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        Notes.objects.create(user=self.user, title="note", note="body")
+        self.login()
+
+    def test_server_timing_header_has_the_request_phases(self):
+        token_cache.clear()
+        response = self.client.get("/api/v1/notes/getnotes/")
+
+        phases = {
+            entry.split(";")[0].strip(): entry
+            for entry in response["Server-Timing"].split(",")
+        }
+        self.assertLessEqual(
+            {"auth", "db", "serialize", "render", "total"}, set(phases)
+        )
+
+    def test_metrics_endpoint_exports_the_endpoint_series(self):
+        self.client.get("/api/v1/notes/getnotes/")
+
+        response = self.client.get("/metrics")
+        metrics = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="api/v1/notes/getnotes/",status="200"}',
+            metrics,
+        )
+        self.assertIn(
+            'http_request_phase_calls_total{method="GET",route="api/v1/notes/getnotes/",phase="db"}',
+            metrics,
+        )
+
+    @override_settings(METRICS_ENABLED=False, SERVER_TIMING_HEADER=False)
+    def test_metrics_and_server_timing_can_be_turned_off(self):
+        response = self.client.get("/api/v1/notes/getnotes/")
+        self.assertNotIn("Server-Timing", response)
+
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+# the files of a request are uploaded at the same time on the shared pool, the urls come back in the order of the files and a failed upload leaves nothing stored behind
+class MediaUploadPoolTests(TestCase):
+    def setUp(self):
+        self.storage = CloudinaryStorage()
+
+        # three uploads have to be in flight at the same time to get past the barrier
+        self.barrier = threading.Barrier(3, timeout=5)
+
+        patcher = mock.patch("cloudinary.uploader.upload", side_effect=self.upload)
+        self.upload_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch("cloudinary.uploader.destroy")
+        self.destroy_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # a stand in for the cloudinary uploader, the later files finish first and a file named fail.png fails once the others are stored
+    def upload(self, file, **options):
+        name = file.name.rsplit(".", 1)[0]
+        self.barrier.wait()
+
+        if name == "fail":
+            time.sleep(0.05)
+            raise RuntimeError("Upload failed.")
+
+        time.sleep(0.01 * (3 - int(name)))
+        return {
+            "secure_url": f"https://res.cloudinary.com/demo/image/upload/v1/google_keep_notes_clone/{name}.png"
+        }
+
+    def files(self, *names):
+        return [
+            SimpleUploadedFile(f"{name}.png", b"\x89PNG\r\n\x1a\n", "image/png")
+            for name in names
+        ]
+
+    def test_uploads_run_in_parallel_and_keep_the_order(self):
+        urls = upload_files(self.files("0", "1", "2"), storage=self.storage)
+
+        self.assertEqual(
+            urls,
+            [
+                f"https://res.cloudinary.com/demo/image/upload/v1/google_keep_notes_clone/{name}.png"
+                for name in ("0", "1", "2")
+            ],
+        )
+        self.destroy_mock.assert_not_called()
+
+    def test_async_uploads_run_in_parallel_and_keep_the_order(self):
+        urls = async_to_sync(aupload_files)(
+            self.files("2", "0", "1"), storage=self.storage
+        )
+
+        self.assertEqual(
+            [url.rsplit("/", 1)[-1] for url in urls], ["2.png", "0.png", "1.png"]
+        )
+
+    def test_stored_files_are_deleted_when_an_upload_fails(self):
+        for upload in (upload_files, async_to_sync(aupload_files)):
+            self.destroy_mock.reset_mock()
+
+            with self.subTest(upload=upload):
+                with self.assertRaisesMessage(RuntimeError, "Upload failed."):
+                    upload(self.files("0", "fail", "2"), storage=self.storage)
+
+                self.assertEqual(
+                    sorted(call.args[0] for call in self.destroy_mock.call_args_list),
+                    ["google_keep_notes_clone/0", "google_keep_notes_clone/2"],
+                )
+
+    def test_a_single_file_is_uploaded_on_the_pool(self):
+        threads = []
+
+        def upload(file, **options):
+            threads.append(threading.current_thread().name)
+            return {"secure_url": "https://res.cloudinary.com/demo/0.png"}
+
+        self.upload_mock.side_effect = upload
+
+        upload_files(self.files("0"), storage=self.storage)
+        async_to_sync(aupload_files)(self.files("0"), storage=self.storage)
+
+        self.assertEqual(len(threads), 2)
+        for thread in threads:
+            self.assertTrue(thread.startswith("media-upload"), thread)
+
+
+# every media storage backend stores, lists and deletes files and takes resumable uploads the same way
+class MediaStorageTests(TestCase):
+    PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+    def local_storage(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+
+        return LocalFileSystemStorage(root.name, "/media/")
+
+    def backends(self):
+        return {"local": self.local_storage(), "memory": InMemoryStorage()}
+
+    def read(self, storage, url):
+        if isinstance(storage, InMemoryStorage):
+            return storage.files[url]
+
+        return (storage.root / url.rsplit("/", 1)[-1]).read_bytes()
+
+    def test_backend_missing_a_method_fails_when_created(self):
+        class PartialStorage(InMemoryStorage):
+            list_files = MediaStorage.list_files
+
+        with self.assertRaisesMessage(TypeError, "list_files"):
+            PartialStorage()
+
+        # every shipped backend implements the whole interface
+        for backend in (CloudinaryStorage, LocalFileSystemStorage, InMemoryStorage):
+            self.assertEqual(backend.__abstractmethods__, frozenset())
+
+    def test_save_and_delete(self):
+        for name, storage in self.backends().items():
+            with self.subTest(backend=name):
+                url = storage.save(SimpleUploadedFile("a.png", self.PNG, "image/png"))
+                self.assertEqual(self.read(storage, url), self.PNG)
+
+                storage.delete(url)
+                storage.delete(url)
+                self.assertEqual(storage.list_files(), ([], None))
+
+    def test_local_storage_copies_spooled_uploads(self):
+        storage = self.local_storage()
+        spooled = TemporaryUploadedFile("a.png", "image/png", len(self.PNG), None)
+        spooled.write(self.PNG)
+        spooled.flush()
+
+        url = storage.save(spooled)
+        spooled.close()
+
+        self.assertTrue(url.startswith("/media/") and url.endswith(".png"))
+        self.assertEqual(self.read(storage, url), self.PNG)
+
+    def test_save_content(self):
+        for name, storage in self.backends().items():
+            with self.subTest(backend=name):
+                url = storage.save_content(b"jpeg", ".jpg")
+
+                self.assertTrue(url.endswith(".jpg"))
+                self.assertEqual(self.read(storage, url), b"jpeg")
+
+    def test_resumable_upload(self):
+        for name, storage in self.backends().items():
+            with self.subTest(backend=name):
+                key = storage.start_upload("a.png", len(self.PNG))
+                self.assertIsNone(storage.write_chunk(key, 0, self.PNG[:50], 108))
+                self.assertIsNone(storage.write_chunk(key, 50, self.PNG[50:], 108))
+
+                # a partial file is not a stored file until the upload is finished
+                self.assertEqual(storage.list_files(), ([], None))
+
+                url = storage.finish_upload(key)
+                self.assertEqual(self.read(storage, url), self.PNG)
+
+    def test_aborted_upload_leaves_nothing(self):
+        storage = self.local_storage()
+        key = storage.start_upload("a.png", 108)
+        storage.write_chunk(key, 0, self.PNG, 108)
+
+        storage.abort_upload(key)
+        storage.abort_upload(key)
+
+        self.assertFalse(storage.partial_path(key).exists())
+
+        storage = InMemoryStorage()
+        storage.abort_upload(storage.start_upload("a.png", 108))
+        self.assertEqual(storage.uploads, {})
+
+    def test_list_files_in_pages(self):
+        for name, storage in self.backends().items():
+            with self.subTest(backend=name):
+                urls = {storage.save_content(b"x" * size, ".bin") for size in range(5)}
+
+                listed = []
+                cursor = None
+                while True:
+                    files, cursor = storage.list_files(cursor, limit=2)
+                    self.assertLessEqual(len(files), 2)
+                    listed += files
+                    if cursor is None:
+                        break
+
+                self.assertEqual({url for url, _, _ in listed}, urls)
+                self.assertEqual(sorted(size for _, size, _ in listed), list(range(5)))
+
+    def test_cloudinary_finishes_an_upload_by_its_public_id(self):
+        storage = CloudinaryStorage()
+        url = "https://res.cloudinary.com/demo/video/upload/v1/key.mp4"
+
+        def resource(public_id, resource_type):
+            if resource_type != "video":
+                raise cloudinary.exceptions.NotFound("Not found.")
+            return {"secure_url": url}
+
+        with mock.patch("cloudinary.api.resource", side_effect=resource):
+            self.assertEqual(storage.finish_upload("key"), url)
+
+        with mock.patch(
+            "cloudinary.api.resource",
+            side_effect=cloudinary.exceptions.NotFound("Not found."),
+        ):
+            with self.assertRaises(ValueError):
+                storage.finish_upload("key")
+
+    def test_cloudinary_save_content(self):
+        url = "https://res.cloudinary.com/demo/image/upload/v1/preview.jpg"
+
+        with mock.patch(
+            "cloudinary.uploader.upload", return_value={"secure_url": url}
+        ) as upload:
+            self.assertEqual(CloudinaryStorage().save_content(b"jpeg", ".jpg"), url)
+
+        ((name, content),) = upload.call_args.args
+        self.assertTrue(name.endswith(".jpg"))
+        self.assertEqual(content, b"jpeg")
+        self.assertEqual(
+            upload.call_args.kwargs["public_id"],
+            f"google_keep_notes_clone/{name[:-4]}",
+        )
+
+    def test_cloudinary_deletes_by_the_public_id_of_the_upload(self):
+        storage = CloudinaryStorage()
+
+        with mock.patch("cloudinary.uploader.destroy") as destroy:
+            storage.delete(
+                "https://res.cloudinary.com/demo/image/upload/v1/google_keep_notes_clone/abc.png"
+            )
+            storage.delete(
+                "https://res.cloudinary.com/demo/raw/upload/v1/google_keep_notes_clone/def"
+            )
+
+        self.assertEqual(
+            [
+                (call.args[0], call.kwargs["resource_type"])
+                for call in destroy.call_args_list
+            ],
+            [
+                ("google_keep_notes_clone/abc", "image"),
+                ("google_keep_notes_clone/def", "raw"),
+            ],
+        )
+
+    def test_cloudinary_only_lists_the_upload_folder(self):
+        resources = {
+            "resources": [
+                {
+                    "secure_url": "https://res.cloudinary.com/demo/image/upload/v1/google_keep_notes_clone/abc.png",
+                    "bytes": 10,
+                    "created_at": "2024-01-01T00:00:00Z",
+                }
+            ]
+        }
+
+        with mock.patch("cloudinary.api.resources", return_value=resources) as listing:
+            files, cursor = CloudinaryStorage().list_files()
+
+        self.assertEqual(listing.call_args.kwargs["prefix"], "google_keep_notes_clone/")
+        self.assertEqual(files[0][1], 10)
+        self.assertEqual(cursor, "video:")
+
+
+# a resumable upload is sent in chunks at increasing offsets, can be resumed from the offset the server reports and is attached to a note once complete
+@override_settings(
+    MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage",
+    NOTE_UPLOAD_CHUNK_SIZE=8,
+)
+class NoteUploadTests(AuthenticatedTestCase):
+    MP4 = b"\x00\x00\x00\x14ftypmp42isommp41data"
+
+    def setUp(self):
+        super().setUp()
+
+        # every test gets its own in memory storage
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+
+        self.note = Notes.objects.create(user=self.user, title="video", note="body")
+        self.login()
+
+    def start_upload(self, size):
+        response = self.client.post(
+            "/api/v1/notes/uploads/",
+            {"filename": "clip.mp4", "content_type": "video/mp4", "size": size},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["data"]["uploadId"]
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.put(
+            f"/api/v1/notes/uploads/{upload_id}/",
+            data,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def test_chunks_are_assembled_and_attached_to_the_note(self):
+        upload_id = self.start_upload(len(self.MP4))
+
+        self.assertEqual(self.put_chunk(upload_id, 0, self.MP4[:8]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 8, self.MP4[8:16]).status_code, 200)
+
+        # a chunk sent again after a dropped response is rejected with the offset to resume from
+        conflict = self.put_chunk(upload_id, 8, self.MP4[8:16])
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict["Upload-Offset"], "16")
+
+        progress = self.client.get(f"/api/v1/notes/uploads/{upload_id}/")
+        self.assertEqual(progress.json()["data"]["offset"], 16)
+
+        self.assertEqual(self.put_chunk(upload_id, 16, self.MP4[16:]).status_code, 200)
+
+        response = self.client.post(
+            f"/api/v1/notes/uploads/{upload_id}/finish/",
+            {"note_id": str(self.note.id)},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        url = response.json()["data"]["url"]
+        self.assertEqual(note_file_urls(self.note.id), [url])
+        self.assertEqual(get_media_storage().files[url], self.MP4)
+        self.assertFalse(NoteUpload.objects.exists())
+
+    def test_chunk_limits(self):
+        upload_id = self.start_upload(len(self.MP4))
+
+        # larger than the chunk size and past the end of the file
+        self.assertEqual(self.put_chunk(upload_id, 0, self.MP4[:9]).status_code, 413)
+        self.put_chunk(upload_id, 0, self.MP4[:8])
+        self.put_chunk(upload_id, 8, self.MP4[8:16])
+        self.put_chunk(upload_id, 16, self.MP4[16:20])
+        self.assertEqual(self.put_chunk(upload_id, 20, self.MP4[:8]).status_code, 400)
+
+    def test_incomplete_upload_can_not_be_finished(self):
+        upload_id = self.start_upload(len(self.MP4))
+        self.put_chunk(upload_id, 0, self.MP4[:8])
+
+        response = self.client.post(
+            f"/api/v1/notes/uploads/{upload_id}/finish/",
+            {"note_id": str(self.note.id)},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["error"]["offset"], 8)
+
+    def test_first_chunk_must_match_the_content_type(self):
+        upload_id = self.start_upload(len(self.MP4))
+
+        response = self.put_chunk(upload_id, 0, b"MZ\x90\x00abcd")
+        self.assertEqual(response.status_code, 400)
+
+    def test_uploads_of_other_users_are_not_found(self):
+        upload_id = self.start_upload(len(self.MP4))
+
+        other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        self.client.cookies["token"] = initializeToken(other_user)
+
+        self.assertEqual(self.put_chunk(upload_id, 0, self.MP4[:8]).status_code, 404)
+
+    def test_body_that_is_not_an_object_is_rejected(self):
+        upload_id = self.start_upload(len(self.MP4))
+
+        for url in (
+            "/api/v1/notes/uploads/",
+            f"/api/v1/notes/uploads/{upload_id}/finish/",
+        ):
+            response = self.client.post(url, [], content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_chunk_is_not_written_when_another_request_took_the_offset(self):
+        upload_id = self.start_upload(len(self.MP4))
+        stale_upload = NoteUpload.objects.get(id=upload_id)
+        self.put_chunk(upload_id, 0, self.MP4[:8])
+
+        # the request read the upload before the concurrent chunk moved its offset
+        with mock.patch(
+            "apis.views.upload_views.find_upload", return_value=stale_upload
+        ), mock.patch.object(get_media_storage(), "write_chunk") as write_chunk:
+            response = self.put_chunk(upload_id, 0, self.MP4[:8])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "8")
+        write_chunk.assert_not_called()
+
+
+# the upload handler checks the uploaded files by their first bytes and their size while the request body is read
+@override_settings(MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage")
+class ValidatingUploadHandlerTests(AuthenticatedTestCase):
+    PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+    def setUp(self):
+        super().setUp()
+
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+
+        self.login()
+
+    def create_note(self, content, content_type):
+        return self.client.post(
+            "/api/v1/notes/",
+            {
+                "title": "picture",
+                "note": "body",
+                "files": SimpleUploadedFile("picture.png", content, content_type),
+            },
+        )
+
+    def test_sniffed_content_types(self):
+        self.assertEqual(sniff_content_types(self.PNG), {"image/png"})
+        self.assertIn(
+            "video/mp4", sniff_content_types(b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 8)
+        )
+        self.assertEqual(
+            sniff_content_types(b'<?xml version="1.0"?>\n<svg xmlns="..."></svg>'),
+            {"image/svg+xml"},
+        )
+        self.assertEqual(sniff_content_types(b"MZ\x90\x00"), set())
+
+    def test_matching_file_is_accepted(self):
+        response = self.create_note(self.PNG, "image/png")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(get_media_storage().files.values()), [self.PNG])
+
+    def test_content_not_matching_the_content_type_is_rejected(self):
+        response = self.create_note(b"MZ\x90\x00 not an image", "image/png")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"][0]["reason"], "invalid_type")
+        self.assertFalse(Notes.objects.exists())
+
+    def test_oversized_file_is_rejected_while_streaming(self):
+        with mock.patch.dict(
+            UPLOAD_FIELD_RULES, {"files": (ACCEPTED_CONTENT_TYPES, 64)}
+        ):
+            response = self.create_note(self.PNG, "image/png")
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()["error"][0]["reason"], "too_large")
+        self.assertFalse(Notes.objects.exists())
+
+
+# the previews of the note files are made after the note is saved and come with the notes listing
+@override_settings(
+    MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage",
+    MEDIA_PREVIEW_WORKERS=0,
+)
+class MediaPreviewTests(AuthenticatedTestCase):
+    PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+    def setUp(self):
+        super().setUp()
+
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+
+        self.login()
+
+    def test_cloudinary_previews_are_url_transformations(self):
+        storage = CloudinaryStorage()
+
+        self.assertEqual(
+            storage.create_previews(
+                "https://res.cloudinary.com/demo/image/upload/v1/picture.png",
+                "image/png",
+            ),
+            {
+                "thumbnail": "https://res.cloudinary.com/demo/image/upload/c_limit,w_400,h_400,f_auto,q_auto/v1/picture.png"
+            },
+        )
+        self.assertEqual(
+            storage.create_previews(
+                "https://res.cloudinary.com/demo/video/upload/v1/clip.mp4",
+                "video/mp4",
+            ),
+            {
+                "poster": "https://res.cloudinary.com/demo/video/upload/so_0,c_limit,w_400,h_400,q_auto/v1/clip.jpg"
+            },
+        )
+        self.assertEqual(storage.create_previews("memory://a", "audio/mpeg"), {})
+
+    def test_listing_returns_the_previews(self):
+        with mock.patch.object(
+            InMemoryStorage,
+            "create_previews",
+            return_value={"thumbnail": "memory://thumbnail.jpg"},
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/v1/notes/",
+                    {
+                        "title": "picture",
+                        "note": "body",
+                        "files": SimpleUploadedFile(
+                            "picture.png", self.PNG, "image/png"
+                        ),
+                    },
+                )
+        self.assertEqual(response.status_code, 200)
+
+        attachment = Attachment.objects.get()
+        self.assertEqual(attachment.preview_status, Attachment.PREVIEW_READY)
+
+        note = self.client.get("/api/v1/notes/getnotes/").json()["data"][0]
+        self.assertEqual(note["files"], [attachment.url])
+        self.assertEqual(note["previews"], ["memory://thumbnail.jpg"])
+
+        note = self.client.get("/api/v1/notes/getnotes/?media=original").json()["data"][
+            0
+        ]
+        self.assertNotIn("previews", note)
+
+    def test_files_without_a_preview_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/v1/notes/",
+                {
+                    "title": "sound",
+                    "note": "body",
+                    "files": SimpleUploadedFile(
+                        "sound.mp3", b"ID3" + b"\x00" * 100, "audio/mpeg"
+                    ),
+                },
+            )
+
+        self.assertEqual(
+            Attachment.objects.get().preview_status, Attachment.PREVIEW_SKIPPED
+        )
+        note = self.client.get("/api/v1/notes/getnotes/").json()["data"][0]
+        self.assertEqual(note["previews"], [None])
+
+    def test_command_makes_the_previews_of_the_pending_attachments(self):
+        note = Notes.objects.create(user=self.user, title="pictures", note="body")
+        Attachment.objects.bulk_create(
+            Attachment(
+                note=note,
+                url=f"memory://{position}.png",
+                content_type="image/png",
+                position=position,
+                created_at=timezone.now() - timedelta(hours=1),
+            )
+            for position in range(3)
+        )
+        # a new attachment is still queued on the preview workers of the server
+        recent = Attachment.objects.create(
+            note=note, url="memory://3.png", content_type="image/png", position=3
+        )
+
+        output = StringIO()
+        with mock.patch.object(
+            InMemoryStorage,
+            "create_previews",
+            side_effect=lambda url, content_type: {"thumbnail": url + ".jpg"},
+        ):
+            call_command("create_media_previews", batch_size=2, stdout=output)
+
+        self.assertEqual(
+            list(
+                Attachment.objects.exclude(id=recent.id).values_list(
+                    "preview_status", "thumbnail_url"
+                )
+            ),
+            [
+                (Attachment.PREVIEW_READY, f"memory://{position}.png.jpg")
+                for position in range(3)
+            ],
+        )
+        recent.refresh_from_db()
+        self.assertEqual(recent.preview_status, Attachment.PREVIEW_PENDING)
+        self.assertIn("Made the previews of 3 pending attachments.", output.getvalue())
+
+        note = self.client.get("/api/v1/notes/getnotes/").json()["data"][0]
+        self.assertEqual(
+            note["previews"],
+            [f"memory://{position}.png.jpg" for position in range(3)] + [None],
+        )
+
+
+# the files of a note are attachment rows, they are added and removed one by one and a content that is already stored is not uploaded again
+@override_settings(
+    MEDIA_STORAGE_BACKEND="apis.utils.media_storage.InMemoryStorage",
+    MEDIA_PREVIEW_WORKERS=0,
+)
+class AttachmentTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+
+        self.login()
+
+    def png(self, name, fill=b"\x00"):
+        return SimpleUploadedFile(
+            name, b"\x89PNG\r\n\x1a\n" + fill * 100, content_type="image/png"
+        )
+
+    def create_note(self, *files):
+        self.client.post(
+            "/api/v1/notes/", {"title": "pictures", "note": "body", "files": files}
+        )
+        return Notes.objects.latest("created_at")
+
+    def update_note(self, note, fields):
+        return self.client.put(
+            f"/api/v1/notes/{note.id}/",
+            encode_multipart(
+                BOUNDARY, {"title": note.title, "note": note.note, **fields}
+            ),
+            content_type=MULTIPART_CONTENT,
+        )
+
+    def test_identical_content_is_stored_once(self):
+        first_note = self.create_note(self.png("a.png"), self.png("b.png"))
+        second_note = self.create_note(self.png("c.png"))
+
+        self.assertEqual(len(get_media_storage().files), 1)
+        self.assertEqual(
+            note_file_urls(first_note.id) + note_file_urls(second_note.id),
+            [note_file_urls(first_note.id)[0]] * 3,
+        )
+
+        attachment = Attachment.objects.filter(note=second_note).get()
+        self.assertEqual(attachment.size, 108)
+        self.assertEqual(len(attachment.checksum), 64)
+
+    def test_files_are_added_and_removed_incrementally(self):
+        note = self.create_note(self.png("a.png", b"a"), self.png("b.png", b"b"))
+        first_url, second_url = note_file_urls(note.id)
+
+        response = self.update_note(
+            note, {"remove_files": [first_url], "files": [self.png("c.png", b"c")]}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        files = note_file_urls(note.id)
+        self.assertEqual(files[0], second_url)
+        self.assertEqual(len(files), 2)
+
+        # the clients that send the whole list of urls to keep still work
+        response = self.update_note(note, {"files_urls": [files[1]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(note_file_urls(note.id), [files[1]])
+
+    def test_unknown_removed_file_is_not_a_change(self):
+        note = self.create_note(self.png("a.png"))
+
+        response = self.update_note(note, {"remove_files": ["memory://unknown"]})
+        self.assertEqual(response.status_code, 409)
+
+    def test_content_of_another_user_is_stored_again(self):
+        first_note = self.create_note(self.png("a.png"))
+        other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        self.client.cookies["token"] = initializeToken(other_user)
+
+        second_note = self.create_note(self.png("b.png"))
+
+        self.assertEqual(len(get_media_storage().files), 2)
+        self.assertNotEqual(
+            note_file_urls(first_note.id), note_file_urls(second_note.id)
+        )
+
+    def test_file_whose_attachments_were_removed_is_uploaded_again(self):
+        note = self.create_note(self.png("a.png"))
+        stored = store_files([self.png("b.png")], self.user.id)
+        self.assertEqual(stored[0]["url"], note_file_urls(note.id)[0])
+
+        # the last attachment of the file is removed between the lookup and the transaction so prune_media may delete it
+        Attachment.objects.filter(note=note).delete()
+        with transaction.atomic():
+            add_attachments(note.id, stored)
+
+        self.assertEqual(len(get_media_storage().files), 2)
+        self.assertNotEqual(note_file_urls(note.id)[0], stored[0]["url"])
+
+
+class PruneMediaTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+
+        get_media_storage.cache_clear()
+        self.addCleanup(get_media_storage.cache_clear)
+        settings_override = override_settings(
+            MEDIA_STORAGE_BACKEND="apis.utils.media_storage.LocalFileSystemStorage",
+            MEDIA_ROOT=root.name,
+            MEDIA_URL="/media/",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.storage = get_media_storage()
+        self.user = User.objects.create(
+            name="owner", email="owner@example.com", password="x"
+        )
+        self.note = Notes.objects.create(user=self.user, title="t", note="n")
+
+    # store a file and date it hours back so it is past the grace period
+    def stored(self, name, size, hours_old=48):
+        path = self.storage.root / name
+        path.write_bytes(b"x" * size)
+        modified = time.time() - hours_old * 3600
+        os.utime(path, (modified, modified))
+
+        return f"/media/{name}"
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command("prune_media", *args, stdout=out)
+        return out.getvalue()
+
+    def test_only_old_unreferenced_files_are_deleted(self):
+        attached = self.stored("a.png", 10)
+        thumbnail = self.stored("b.jpg", 20)
+        picture = self.stored("c.png", 30)
+        self.stored("d.png", 40)
+        self.stored("e.png", 50, hours_old=1)
+        Attachment.objects.create(
+            note=self.note,
+            url=attached,
+            content_type="image/png",
+            position=0,
+            thumbnail_url=thumbnail,
+        )
+        User.objects.filter(id=self.user.id).update(profile_picture_url=picture)
+
+        output = self.prune("--batch-size", "2")
+
+        self.assertIn("Deleted 1 orphaned files of 5 scanned", output)
+        self.assertIn("reclaimed 40 bytes", output)
+        self.assertEqual(
+            sorted(os.listdir(self.storage.root)),
+            ["a.png", "b.jpg", "c.png", "e.png"],
+        )
+
+    def test_dry_run_and_resume_from_cursor(self):
+        self.stored("a.png", 10)
+        self.stored("b.png", 20)
+
+        output = self.prune("--dry-run", "--batch-size", "1")
+        self.assertIn("Found 2 orphaned files", output)
+        self.assertIn("resume with --cursor a.png", output)
+        self.assertEqual(len(os.listdir(self.storage.root)), 2)
+
+        output = self.prune("--cursor", "a.png")
+        self.assertIn("Deleted 1 orphaned files of 1 scanned", output)
+        self.assertEqual(os.listdir(self.storage.root), ["a.png"])
+
+    def test_files_without_a_stored_time_are_kept(self):
+        with mock.patch.object(
+            self.storage,
+            "list_files",
+            return_value=([("/media/a.png", 10, None)], None),
+        ), mock.patch.object(self.storage, "delete") as delete:
+            output = self.prune()
+
+        self.assertIn("Deleted 0 orphaned files of 1 scanned", output)
+        delete.assert_not_called()
+
+    def test_expired_uploads_are_aborted(self):
+        key = self.storage.start_upload("movie.mp4", 10)
+        NoteUpload.objects.create(
+            user=self.user,
+            filename="movie.mp4",
+            content_type="video/mp4",
+            size=10,
+            storage_key=key,
+            expires_at=timezone.now() - timedelta(hours=1),
+        )
+
+        output = self.prune()
+
+        self.assertIn("and 1 expired uploads", output)
+        self.assertFalse(NoteUpload.objects.exists())
+        self.assertFalse(self.storage.partial_path(key).exists())
+
+
+# a password stored with another bcrypt work factor than the configured one is hashed again on the next successful login, a failed login leaves it as it is
+@override_settings(PASSWORD_HASH_ROUNDS=5)
+class PasswordRehashTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.user.password = bcrypt.hashpw(
+            b"secret-password", bcrypt.gensalt(4)
+        ).decode()
+        self.user.save(update_fields=["password"])
+
+    def login_with(self, password, path="/api/v1/users/login/"):
+        return self.client.post(
+            path,
+            {"email": self.user.email, "password": password},
+            content_type="application/json",
+        )
+
+    def assertRehashed(self, response):
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split("$")[2], "05")
+        self.assertFalse(password_needs_rehash(self.user.password))
+        self.assertTrue(check_password("secret-password", self.user.password))
+
+    def test_login_rehashes_with_the_configured_rounds(self):
+        self.assertRehashed(self.login_with("secret-password"))
+
+    def test_async_login_rehashes_with_the_configured_rounds(self):
+        self.assertRehashed(
+            self.login_with("secret-password", "/api/v1/async/users/login/")
+        )
+
+    def test_wrong_password_does_not_rehash(self):
+        stored_password = self.user.password
+
+        with mock.patch("apis.views.user_views.hash_password") as hash_password:
+            response = self.login_with("wrong-password")
+
+        self.assertEqual(response.status_code, 409)
+        hash_password.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, stored_password)
+
+    def test_password_with_the_configured_rounds_is_not_rehashed(self):
+        self.user.password = bcrypt.hashpw(
+            b"secret-password", bcrypt.gensalt(5)
+        ).decode()
+        self.user.save(update_fields=["password"])
+
+        with mock.patch("apis.views.user_views.hash_password") as hash_password:
+            response = self.login_with("secret-password")
+
+        self.assertEqual(response.status_code, 200)
+        hash_password.assert_not_called()
+
+
+# the responses are rendered with orjson when it is installed and by the rest framework's json renderer otherwise, both give the same bytes for the same response body
+class JSONRendererTests(AuthenticatedTestCase):
+    def envelope(self):
+        now = datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc)
+
+        with mock.patch("apis.utils.api_response.timezone.now", return_value=now):
+            return build_response_body(
+                True,
+                200,
+                "Notes have been found.",
+                data=[
+                    {
+                        "id": 1,
+                        "title": "Grüße ✓",
+                        "note": 'a "quoted" body\nwith a new line',
+                        "created_at": now,
+                        "user": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+                        "size": Decimal("1.5"),
+                        "files": [],
+                    }
+                ],
+                meta={"next_cursor": None, "page_size": 20},
+            )
+
+    def test_both_renderers_give_the_same_bytes(self):
+        body = self.envelope()
+
+        self.assertEqual(FastJSONRenderer().render(body), JSONRenderer().render(body))
+        self.assertEqual(render_json(body), JSONRenderer().render(body))
+
+    def test_timestamp_is_utc_with_a_z_suffix(self):
+        meta = json.loads(FastJSONRenderer().render(self.envelope()))["meta"]
+
+        self.assertEqual(meta["timestamp"], "2026-01-02T03:04:05.678901Z")
+
+    def test_without_orjson_the_rest_framework_renderer_is_used(self):
+        body = self.envelope()
+
+        with mock.patch("apis.utils.renderers.orjson", None):
+            self.assertEqual(
+                FastJSONRenderer().render(body), JSONRenderer().render(body)
+            )
+            self.assertEqual(render_json(body), JSONRenderer().render(body))
+
+    def test_indented_json_is_rendered_by_the_rest_framework_renderer(self):
+        body = self.envelope()
+
+        with mock.patch("apis.utils.renderers.orjson") as orjson:
+            rendered = FastJSONRenderer().render(
+                body, "application/json", {"indent": 2}
+            )
+
+        orjson.dumps.assert_not_called()
+        self.assertEqual(
+            rendered, JSONRenderer().render(body, "application/json", {"indent": 2})
+        )
+
+    def test_client_can_ask_for_indented_json(self):
+        self.login()
+
+        response = self.client.get(
+            "/api/v1/notes/getnotes/", HTTP_ACCEPT="application/json; indent=4"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'{\n    "success": true'))
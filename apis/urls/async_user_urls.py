@@ -0,0 +1,8 @@
+from django.urls import path
+from ..views.async_user_views import create_or_get_user, login, logout
+
+urlpatterns = [
+    path("", create_or_get_user),
+    path("login/", login),
+    path("logout/", logout),
+]
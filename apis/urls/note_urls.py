@@ -4,11 +4,21 @@ from ..views.note_views import (
     update_note,
     get_notes,
     add_remove_collaborator,
+    search_notes,
+    bulk_notes,
+    get_note_changes,
 )
+from ..views.upload_views import start_upload, upload_chunk, finish_upload
 
 urlpatterns = [
     path("", create_note),
     path("<uuid:note_id>/", update_note),
     path("getnotes/", get_notes),
+    path("search/", search_notes),
+    path("bulk/", bulk_notes),
+    path("changes/", get_note_changes),
     path("collaborators/<uuid:note_id>/", add_remove_collaborator),
+    path("uploads/", start_upload),
+    path("uploads/<uuid:upload_id>/", upload_chunk),
+    path("uploads/<uuid:upload_id>/finish/", finish_upload),
 ]
@@ -1,31 +1,86 @@
 from rest_framework.response import Response
+from django.http import HttpResponse
 from django.utils import timezone
+from .renderers import render_json
 
 
-# a standardized api response function that uses the django rest framework's response class to send back the api response to the client while maintaing a clean code base
-def APIResponse(
-    success: bool, status_code: int, message: str, data=None, cookie=None, error=None
+# creation of the standardized response dictionary shared by the sync and the async views
+def build_response_body(
+    success, status_code, message, data=None, error=None, meta=None
 ):
-
-    # creation of the response dictionary
     response_body = {
         "success": success,
         "statusCode": status_code,
         "message": message,
         "data": data if success else None,
         "error": error if not success else None,
+        # the timestamp is left as a datetime so the json renderer formats it natively
         "meta": {
-            "timestamp": timezone.now().isoformat(),
+            "timestamp": timezone.now(),
         },
     }
 
+    # extra meta information like pagination cursors are merged next to the timestamp
+    if meta:
+        response_body["meta"].update(meta)
+
+    return response_body
+
+
+# set the token cookie on the response of the login function
+def set_token_cookie(response, cookie):
+    response.set_cookie(
+        key="token", value=cookie, httponly=True, secure=False, samesite="Lax"
+    )
+
+
+# a standardized api response function that uses the django rest framework's response class to send back the api response to the client while maintaing a clean code base
+def APIResponse(
+    success: bool,
+    status_code: int,
+    message: str,
+    data=None,
+    cookie=None,
+    error=None,
+    meta=None,
+    headers=None,
+):
+
     # initialize the response object with the response body
-    response = Response(response_body, status=status_code)
+    response = Response(
+        build_response_body(success, status_code, message, data, error, meta),
+        status=status_code,
+        headers=headers,
+    )
 
     # if there is a cookie in the login function
     if cookie:
-        response.set_cookie(
-            key="token", value=cookie, httponly=True, secure=False, samesite="Lax"
-        )
-    
+        set_token_cookie(response, cookie)
+
+    return response
+
+
+# the same standardized api response for the async views, they are plain django views so the body is rendered with the same json renderer directly instead of going through the rest framework's response
+def APIJsonResponse(
+    success: bool,
+    status_code: int,
+    message: str,
+    data=None,
+    cookie=None,
+    error=None,
+    meta=None,
+    headers=None,
+):
+    response = HttpResponse(
+        render_json(
+            build_response_body(success, status_code, message, data, error, meta)
+        ),
+        content_type="application/json",
+        status=status_code,
+        headers=headers,
+    )
+
+    if cookie:
+        set_token_cookie(response, cookie)
+
     return response
@@ -0,0 +1,192 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Max
+from notes.models import Attachment
+from .media_uploads import upload_files, aupload_files
+from .media_previews import schedule_previews
+from .metrics import timed
+
+# the preview states that can be copied to a new attachment of the same content, a pending or failed preview is made again for it
+REUSABLE_PREVIEW_STATUSES = (Attachment.PREVIEW_READY, Attachment.PREVIEW_SKIPPED)
+
+
+# the sha256 of every uploaded file, read in chunks so the files spooled to disk are not loaded into memory
+def file_checksums(files):
+    checksums = []
+    for file in files:
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+        checksums.append(digest.hexdigest())
+
+    return checksums
+
+
+# only the files of the notes of the uploading user are reused, the url and the previews of another account's file are never handed out
+def known_files_query(checksums, user_id):
+    return Attachment.objects.filter(
+        checksum__in=set(checksums), note__user_id=user_id
+    ).values("checksum", "url", "thumbnail_url", "poster_url", "preview_status")
+
+
+# the already stored file of each of the checksums, looked up with a single query
+def known_files(checksums, user_id):
+    known = {}
+    for row in known_files_query(checksums, user_id):
+        known.setdefault(row["checksum"], row)
+
+    return known
+
+
+# the async version of known files for the async views
+async def aknown_files(checksums, user_id):
+    known = {}
+    async for row in known_files_query(checksums, user_id):
+        known.setdefault(row["checksum"], row)
+
+    return known
+
+
+# the files whose content is not stored yet keyed by their checksum, a content sent twice in the same request is uploaded once
+def files_to_upload(files, checksums, known):
+    new_files = {}
+    for file, checksum in zip(files, checksums):
+        if checksum not in known:
+            new_files.setdefault(checksum, file)
+
+    return new_files
+
+
+# the fields of the attachment of every file in the same order as the files, the files that were not uploaded take the url and the previews of the stored file with the same content and keep the file in case that one is gone by the time they are attached
+def stored_files(files, checksums, known, uploaded_urls):
+    stored = []
+    for file, checksum in zip(files, checksums):
+        fields = {
+            "content_type": file.content_type,
+            "size": file.size,
+            "checksum": checksum,
+        }
+
+        if checksum in uploaded_urls:
+            fields["url"] = uploaded_urls[checksum]
+        elif known[checksum]["preview_status"] in REUSABLE_PREVIEW_STATUSES:
+            fields.update(known[checksum], file=file)
+        else:
+            fields.update(url=known[checksum]["url"], file=file)
+
+        stored.append(fields)
+
+    return stored
+
+
+# store the uploaded files in the media storage and return the fields of their attachments, the content the user already stored for another attachment is not uploaded again
+def store_files(files, user_id):
+    files = list(files or [])
+    if not files:
+        return []
+
+    with timed("upload"):
+        checksums = file_checksums(files)
+
+    known = known_files(checksums, user_id)
+    new_files = files_to_upload(files, checksums, known)
+    uploaded_urls = dict(zip(new_files, upload_files(new_files.values())))
+
+    return stored_files(files, checksums, known, uploaded_urls)
+
+
+# the async version of store files, the files are hashed on a worker thread and uploaded on the upload pool
+async def astore_files(files, user_id):
+    files = list(files or [])
+    if not files:
+        return []
+
+    with timed("upload"):
+        checksums = await sync_to_async(file_checksums, thread_sensitive=False)(files)
+
+    known = await aknown_files(checksums, user_id)
+    new_files = files_to_upload(files, checksums, known)
+    uploaded_urls = dict(zip(new_files, await aupload_files(new_files.values())))
+
+    return stored_files(files, checksums, known, uploaded_urls)
+
+
+# the prune_media command deletes a file once no attachment refers to it, so the files that reuse a stored one are looked up again in the transaction and their attachments are locked until it commits, a file whose attachments were all removed since store files is uploaded after all
+def still_stored(stored):
+    reused_urls = {fields["url"] for fields in stored if "file" in fields}
+    if not reused_urls:
+        return stored
+
+    found_urls = set(
+        Attachment.objects.select_for_update()
+        .filter(url__in=reused_urls)
+        .values_list("url", flat=True)
+    )
+
+    checked = []
+    gone = {}
+    for fields in stored:
+        fields = dict(fields)
+        file = fields.pop("file", None)
+        if file is not None and fields["url"] not in found_urls:
+            gone.setdefault(fields["url"], file)
+        checked.append(fields)
+
+    # the content is stored again under a new url and its previews are made again
+    if gone:
+        new_urls = dict(zip(gone, upload_files(gone.values())))
+        for fields in checked:
+            if fields["url"] in new_urls:
+                for key in ("thumbnail_url", "poster_url", "preview_status"):
+                    fields.pop(key, None)
+                fields["url"] = new_urls[fields["url"]]
+
+    return checked
+
+
+# attach the stored files after the current files of the note, a new note passes position 0 to skip looking up the last position, the previews of the attachments that do not have them are made once the surrounding transaction commits
+def add_attachments(note_id, stored, position=None):
+    if not stored:
+        return []
+
+    stored = still_stored(stored)
+
+    if position is None:
+        last_position = Attachment.objects.filter(note_id=note_id).aggregate(
+            last_position=Max("position")
+        )["last_position"]
+        position = 0 if last_position is None else last_position + 1
+
+    attachments = Attachment.objects.bulk_create(
+        [
+            Attachment(note_id=note_id, position=position + index, **fields)
+            for index, fields in enumerate(stored)
+        ]
+    )
+
+    pending_ids = [
+        attachment.id
+        for attachment in attachments
+        if attachment.preview_status == Attachment.PREVIEW_PENDING
+    ]
+    if pending_ids:
+        transaction.on_commit(lambda: schedule_previews(pending_ids))
+
+    return attachments
+
+
+# detach the files with these urls from the note, the stored files are kept since other notes can share them, the prune_media command deletes them once nothing refers to them
+def remove_attachments(note_id, urls):
+    if not urls:
+        return 0
+
+    return Attachment.objects.filter(note_id=note_id, url__in=urls).delete()[0]
+
+
+# the urls of the files of the note in their order
+def note_file_urls(note_id):
+    return list(
+        Attachment.objects.filter(note_id=note_id).values_list("url", flat=True)
+    )
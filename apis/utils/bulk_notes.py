@@ -0,0 +1,267 @@
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from pydantic import ValidationError
+from notes.models import Notes, NoteCollaborator, Attachment
+from ..validators.note_validators import BULK_OPERATION_VALIDATORS
+from .note_search import index_notes, unindex_notes
+from .collaborators import existing_user_ids
+from .note_changes import record_note_changes, record_note_removals
+
+
+# the outcome of a single operation of a bulk request, shaped like the api response body
+def operation_result(index, op, status_code, message, note_id=None, error=None):
+    return {
+        "index": index,
+        "op": op,
+        "success": status_code < 400,
+        "statusCode": status_code,
+        "message": message,
+        "noteId": str(note_id) if note_id else None,
+        "error": error,
+    }
+
+
+# validate every operation with the validator of its single note endpoint, returns the validated operations and the results of the invalid ones
+def validate_operations(operations):
+    validated_operations = []
+    invalid_results = []
+
+    for index, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        validator = BULK_OPERATION_VALIDATORS.get(op)
+
+        if validator is None:
+            invalid_results.append(
+                operation_result(index, op, 400, "Unknown operation.")
+            )
+            continue
+
+        fields = {key: value for key, value in operation.items() if key != "op"}
+
+        # files can not be sent in a json body, only the urls of already uploaded files
+        if op in ("create", "update"):
+            fields["files"] = None
+
+        try:
+            validated_operations.append((index, op, validator(**fields)))
+        except ValidationError as e:
+            invalid_results.append(
+                operation_result(
+                    index, op, 400, "Failed in type validation.", error=e.errors()
+                )
+            )
+
+    return validated_operations, invalid_results
+
+
+# applies a batch of validated operations for a user, everything that is read is loaded up front with one query per table and everything that is written is written in bulk, the loading, the permission checks and the writes run in one transaction
+class BulkNoteOperations:
+    def __init__(self, user, validated_operations):
+        self.user = user
+        self.validated_operations = validated_operations
+
+        self.created_notes = []
+        self.updated_notes = {}
+        self.deleted_note_ids = set()
+        self.added_pairs = set()
+        self.removed_pairs = set()
+        self.removed_attachment_ids = set()
+
+    # load the notes, the users and the collaborator pairs every operation refers to, the note and collaborator rows stay locked until the batch is written so a note deleted or a collaborator removed in the meantime can not be written past its check
+    def load(self):
+        note_ids = set()
+        user_ids = set()
+
+        for _, op, data in self.validated_operations:
+            if op == "create":
+                user_ids.update(data.collaborators or [])
+            else:
+                note_ids.add(data.note_id)
+
+            if op in ("add_collaborator", "remove_collaborator"):
+                user_ids.add(data.collaborator_id)
+
+        self.found_notes = Notes.objects.select_for_update().in_bulk(note_ids)
+        self.existing_user_ids = existing_user_ids(user_ids)
+        self.collaborator_pairs = set(
+            NoteCollaborator.objects.select_for_update()
+            .filter(notes_id__in=note_ids)
+            .values_list("notes_id", "user_id")
+        )
+
+        # the attachment ids of every file url of the notes, an update removes files by their url
+        self.note_files = {}
+        for attachment_id, note_id, url in Attachment.objects.filter(
+            note_id__in=note_ids
+        ).values_list("id", "note_id", "url"):
+            self.note_files.setdefault(note_id, {}).setdefault(url, []).append(
+                attachment_id
+            )
+
+    def run(self):
+        with transaction.atomic():
+            self.load()
+
+            results = []
+            for index, op, data in self.validated_operations:
+                if op == "create":
+                    status_code, message, note_id = self.create(data)
+                else:
+                    status_code, message, note_id = self.change(op, data)
+
+                results.append(
+                    operation_result(index, op, status_code, message, note_id)
+                )
+
+            self.save()
+
+        return results
+
+    def create(self, data):
+        invalid_ids = [
+            str(collaborator)
+            for collaborator in data.collaborators or []
+            if collaborator not in self.existing_user_ids
+        ]
+        if invalid_ids:
+            return 409, f"Invalid collaborator ID(s): {', '.join(invalid_ids)}", None
+
+        note = Notes(user=self.user, title=data.title, note=data.note)
+        self.created_notes.append(note)
+        self.added_pairs.update(
+            (note.id, collaborator) for collaborator in set(data.collaborators or [])
+        )
+
+        return 201, "Note has been created successfully.", note.id
+
+    def change(self, op, data):
+        found_note = self.found_notes.get(data.note_id)
+
+        # a note deleted earlier in the same batch counts as not found
+        if found_note is None or found_note.id in self.deleted_note_ids:
+            return 404, "Note not found with this id.", data.note_id
+
+        is_owner = found_note.user_id == self.user.id
+        is_collaborator = (found_note.id, self.user.id) in self.collaborator_pairs
+
+        if op == "update":
+            if not is_owner and not is_collaborator:
+                return 401, "You are not authorized to update this note.", found_note.id
+
+            found_note.title = data.title
+            found_note.note = data.note
+            self.updated_notes[found_note.id] = found_note
+
+            # the files in remove_files and the ones left out of files_urls are removed, the others are kept
+            note_files = self.note_files.get(found_note.id, {})
+            removed_files = set(data.remove_files)
+            if data.files_urls is not None:
+                removed_files.update(
+                    url for url in note_files if url not in data.files_urls
+                )
+            for url in removed_files & note_files.keys():
+                self.removed_attachment_ids.update(note_files.pop(url))
+
+            return 200, "Note has been updated.", found_note.id
+
+        if op == "delete":
+            if not is_owner:
+                return 401, "Unauthorized", found_note.id
+
+            self.deleted_note_ids.add(found_note.id)
+            self.updated_notes.pop(found_note.id, None)
+            return 200, "Note has been deleted.", found_note.id
+
+        # the rest are the collaborator operations
+        pair = (found_note.id, data.collaborator_id)
+
+        if not is_owner and not is_collaborator:
+            return 401, "Unauthorized", found_note.id
+
+        if data.collaborator_id not in self.existing_user_ids:
+            return 404, "No user found with this id.", found_note.id
+
+        if data.collaborator_id == self.user.id:
+            return 409, "Can not make changes of yourself.", found_note.id
+
+        if op == "add_collaborator":
+            if pair in self.collaborator_pairs:
+                return 409, "This user is already a collaborator.", found_note.id
+
+            self.collaborator_pairs.add(pair)
+            self.removed_pairs.discard(pair)
+            self.added_pairs.add(pair)
+            return 200, "This user has been added as a collaborator.", found_note.id
+
+        if pair not in self.collaborator_pairs:
+            return 409, "This user is not a collaborator.", found_note.id
+
+        self.collaborator_pairs.discard(pair)
+        self.added_pairs.discard(pair)
+        self.removed_pairs.add(pair)
+        return 200, "This user has been removed from a collaborator.", found_note.id
+
+    # write every change in bulk inside the transaction of the batch
+    def save(self):
+        # the collaborator rows of deleted notes go away with the cascade
+        added_pairs = [
+            pair for pair in self.added_pairs if pair[0] not in self.deleted_note_ids
+        ]
+        removed_pairs = [
+            pair for pair in self.removed_pairs if pair[0] not in self.deleted_note_ids
+        ]
+
+        # bulk update does not run auto_now so the timestamp is set by hand
+        now = timezone.now()
+        for note in self.updated_notes.values():
+            note.updated_at = now
+
+        Notes.objects.bulk_create(self.created_notes)
+        Notes.objects.bulk_update(
+            self.updated_notes.values(), ["title", "note", "updated_at"]
+        )
+        Attachment.objects.filter(id__in=self.removed_attachment_ids).delete()
+
+        unindex_notes(list(self.deleted_note_ids))
+        Notes.objects.filter(id__in=self.deleted_note_ids).delete()
+
+        NoteCollaborator.objects.bulk_create(
+            [
+                NoteCollaborator(notes_id=notes_id, user_id=user_id)
+                for notes_id, user_id in added_pairs
+            ],
+            ignore_conflicts=True,
+        )
+        if removed_pairs:
+            NoteCollaborator.objects.filter(
+                reduce(
+                    or_,
+                    (
+                        Q(notes_id=notes_id, user_id=user_id)
+                        for notes_id, user_id in removed_pairs
+                    ),
+                )
+            ).delete()
+
+        index_notes(self.created_notes + list(self.updated_notes.values()))
+
+        # the users that could see a deleted note and the removed collaborators get tombstones, every other touched note moves past the delta sync cursor
+        removed_note_users = {
+            note_id: {self.found_notes[note_id].user_id}
+            for note_id in self.deleted_note_ids
+        }
+        for notes_id, user_id in self.collaborator_pairs | self.removed_pairs:
+            if notes_id in self.deleted_note_ids:
+                removed_note_users[notes_id].add(user_id)
+        for notes_id, user_id in removed_pairs:
+            removed_note_users.setdefault(notes_id, set()).add(user_id)
+
+        record_note_removals(removed_note_users)
+        record_note_changes(
+            [note.id for note in self.created_notes]
+            + list(self.updated_notes)
+            + [notes_id for notes_id, _ in added_pairs + removed_pairs]
+        )
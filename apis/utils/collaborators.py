@@ -0,0 +1,83 @@
+from notes.models import NoteCollaborator
+from users.models import User
+
+
+# the ids among the given ones that belong to an existing user, looked up with a single query however many ids are given
+def existing_user_ids(user_ids):
+    return set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+
+
+# the async version of existing user ids for the async views
+async def aexisting_user_ids(user_ids):
+    return {
+        user_id
+        async for user_id in User.objects.filter(id__in=user_ids).values_list(
+            "id", flat=True
+        )
+    }
+
+
+# the given ids that do not belong to any user, as strings in the order they were given for the error messages
+def missing_user_ids(user_ids, found_user_ids):
+    return [
+        str(user_id)
+        for user_id in dict.fromkeys(user_ids)
+        if user_id not in found_user_ids
+    ]
+
+
+# the users among the given ones that are already collaborators of the note
+def note_collaborator_ids(note_id, user_ids):
+    return set(
+        NoteCollaborator.objects.filter(
+            notes_id=note_id, user_id__in=user_ids
+        ).values_list("user_id", flat=True)
+    )
+
+
+def collaborator_rows(note_id, user_ids):
+    return [
+        NoteCollaborator(notes_id=note_id, user_id=user_id)
+        for user_id in dict.fromkeys(user_ids)
+    ]
+
+
+# add the users as collaborators of the note with a single insert into the through table
+def add_collaborators(note_id, user_ids):
+    NoteCollaborator.objects.bulk_create(
+        collaborator_rows(note_id, user_ids), ignore_conflicts=True
+    )
+
+
+# the async version of add collaborators
+async def aadd_collaborators(note_id, user_ids):
+    await NoteCollaborator.objects.abulk_create(
+        collaborator_rows(note_id, user_ids), ignore_conflicts=True
+    )
+
+
+# remove the users from the collaborators of the note with a single delete
+def remove_collaborators(note_id, user_ids):
+    NoteCollaborator.objects.filter(notes_id=note_id, user_id__in=user_ids).delete()
+
+
+# the async version of note collaborator ids
+async def anote_collaborator_ids(note_id, user_ids):
+    return {
+        user_id
+        async for user_id in NoteCollaborator.objects.filter(
+            notes_id=note_id, user_id__in=user_ids
+        ).values_list("user_id", flat=True)
+    }
+
+
+# check if the user is a collaborator of the note with a lookup on the through table
+def is_collaborator(note_id, user_id):
+    return NoteCollaborator.objects.filter(notes_id=note_id, user_id=user_id).exists()
+
+
+# the async version of is collaborator
+async def ais_collaborator(note_id, user_id):
+    return await NoteCollaborator.objects.filter(
+        notes_id=note_id, user_id=user_id
+    ).aexists()
@@ -0,0 +1,71 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from notes.models import Attachment
+from .media_storage import get_media_storage
+from .note_changes import record_note_changes
+
+logger = logging.getLogger(__name__)
+
+# a process wide pool of worker threads the previews are made on, the requests only hand their new attachments over to it
+preview_executor = ThreadPoolExecutor(
+    max_workers=max(settings.MEDIA_PREVIEW_WORKERS, 1),
+    thread_name_prefix="media-preview",
+)
+
+
+# hand the attachments over to the preview workers, with no workers configured the previews are made right away on the calling thread
+def schedule_previews(attachment_ids):
+    if settings.MEDIA_PREVIEW_WORKERS == 0:
+        create_previews(attachment_ids)
+        return
+
+    preview_executor.submit(create_previews_in_worker, attachment_ids)
+
+
+# the worker threads hold their own database connections, they are recycled around every job the same way the request threads do it
+def create_previews_in_worker(attachment_ids):
+    close_old_connections()
+    try:
+        create_previews(attachment_ids)
+    except Exception:
+        logger.exception("Could not make the previews of %s", attachment_ids)
+    finally:
+        close_old_connections()
+
+
+# make the previews of the attachments with the media storage and move their notes past the change cursor so the listings pick the previews up
+def create_previews(attachment_ids):
+    storage = get_media_storage()
+    attachments = list(
+        Attachment.objects.filter(
+            id__in=attachment_ids, preview_status=Attachment.PREVIEW_PENDING
+        )
+    )
+
+    for attachment in attachments:
+        try:
+            previews = storage.create_previews(attachment.url, attachment.content_type)
+        except Exception:
+            logger.exception("Could not make the previews of %s", attachment.url)
+            attachment.preview_status = Attachment.PREVIEW_FAILED
+            attachment.updated_at = timezone.now()
+            continue
+
+        attachment.thumbnail_url = previews.get("thumbnail", "")
+        attachment.poster_url = previews.get("poster", "")
+        attachment.preview_status = (
+            Attachment.PREVIEW_READY if previews else Attachment.PREVIEW_SKIPPED
+        )
+        attachment.updated_at = timezone.now()
+
+    with transaction.atomic():
+        Attachment.objects.bulk_update(
+            attachments,
+            ["thumbnail_url", "poster_url", "preview_status", "updated_at"],
+        )
+        record_note_changes(
+            [attachment.note_id for attachment in attachments if attachment.preview_url]
+        )
@@ -0,0 +1,72 @@
+import io
+import shutil
+import subprocess
+
+# pillow and ffmpeg are optional, without them the storage backends that render previews on this machine skip them
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# the longest a poster frame extraction can take before it is given up
+FFMPEG_TIMEOUT = 60
+
+
+# a jpeg thumbnail of an image that fits a square of the given size, the source is a file path or the bytes of the image, None when pillow is not installed
+def image_thumbnail(source, size):
+    if Image is None:
+        return None
+
+    with Image.open(
+        source if not isinstance(source, bytes) else io.BytesIO(source)
+    ) as image:
+        image.thumbnail((size, size))
+
+        # jpeg has no transparency so transparent images are laid on a white background
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+
+        thumbnail = io.BytesIO()
+        image.save(thumbnail, "JPEG", quality=80, optimize=True)
+
+    return thumbnail.getvalue()
+
+
+# a jpeg of the first frame of a video scaled to fit a square of the given size, the source is a file path or the bytes of the video, None when ffmpeg is not installed or can not read the video
+def video_poster(source, size):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+
+    from_bytes = isinstance(source, bytes)
+    completed = subprocess.run(
+        [
+            ffmpeg,
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0" if from_bytes else str(source),
+            "-frames:v",
+            "1",
+            "-vf",
+            f"scale={size}:{size}:force_original_aspect_ratio=decrease",
+            "-f",
+            "image2",
+            "-c:v",
+            "mjpeg",
+            "pipe:1",
+        ],
+        input=source if from_bytes else None,
+        capture_output=True,
+        timeout=FFMPEG_TIMEOUT,
+    )
+
+    if completed.returncode != 0 or not completed.stdout:
+        return None
+
+    return completed.stdout
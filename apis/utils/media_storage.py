@@ -0,0 +1,378 @@
+import heapq
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from functools import cache
+from pathlib import Path
+from uuid import uuid4
+from django.conf import settings
+from django.utils.module_loading import import_string
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+from .media_renditions import image_thumbnail, video_poster
+
+# size of the chunks copied from an uploaded file into a storage backend
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+# the interface every media storage backend follows, a backend that leaves one of the abstract methods out fails when it is created, save stores an uploaded file and returns the url the clients will use to fetch it
+class MediaStorage(ABC):
+    # the smallest chunk of a resumable upload the backend accepts, only the last chunk of an upload can be smaller
+    min_chunk_size = 1
+
+    @abstractmethod
+    def save(self, file): ...
+
+    @abstractmethod
+    def delete(self, url): ...
+
+    # start a resumable upload and return the key of the partial file the chunks are written to
+    @abstractmethod
+    def start_upload(self, filename, size): ...
+
+    # write a chunk of a resumable upload at its offset, the backends that complete the file with the last chunk return its url then and None otherwise
+    @abstractmethod
+    def write_chunk(self, key, offset, data, size): ...
+
+    # turn a fully written resumable upload into a stored file and return its url
+    @abstractmethod
+    def finish_upload(self, key): ...
+
+    # drop the partial file of an abandoned resumable upload
+    @abstractmethod
+    def abort_upload(self, key): ...
+
+    # store generated content like a preview under a new name with the extension and return its url
+    @abstractmethod
+    def save_content(self, content, extension): ...
+
+    # a page of the stored files as (url, size in bytes, time last modified) tuples in a stable order and the cursor of the next page, None after the last page, the partial files of unfinished uploads are not listed and a file listed without a time is never pruned
+    @abstractmethod
+    def list_files(self, cursor=None, limit=500): ...
+
+    # make the previews of a stored file, a thumbnail url for an image and a poster url for a video, an empty dictionary when the backend can not make them
+    def create_previews(self, url, content_type):
+        return {}
+
+    # render the previews on this machine from the path or the bytes of the stored file and store them as files of their own
+    def render_previews(self, source, content_type):
+        size = settings.MEDIA_PREVIEW_SIZE
+
+        # svg images are already small and scale by themselves
+        if content_type.startswith("image/") and content_type != "image/svg+xml":
+            thumbnail = image_thumbnail(source, size)
+            return (
+                {"thumbnail": self.save_content(thumbnail, ".jpg")} if thumbnail else {}
+            )
+
+        if content_type.startswith("video/"):
+            poster = video_poster(source, size)
+            return {"poster": self.save_content(poster, ".jpg")} if poster else {}
+
+        return {}
+
+
+# stores the files on cloudinary, this is the backend used in production
+class CloudinaryStorage(MediaStorage):
+    # every file is uploaded with a public id chosen here, a uuid without an extension in the upload folder of the app, so the public id is known again from the name at the end of its url whatever the folder and the resource type
+    def public_id(self, name):
+        return f"{settings.CLOUDINARY_UPLOAD_FOLDER}/{name}"
+
+    def save(self, file):
+        return cloudinary.uploader.upload(file, public_id=self.public_id(uuid4().hex))[
+            "secure_url"
+        ]
+
+    def delete(self, url):
+        # a delivery url looks like .../<resource type>/upload/v<version>/<upload folder>/<uuid>.<extension>, a raw file has no extension
+        parts = url.split("/")
+        resource_type = parts[parts.index("upload") - 1]
+        name = parts[-1].split(".", 1)[0]
+
+        cloudinary.uploader.destroy(self.public_id(name), resource_type=resource_type)
+
+    # cloudinary takes chunked uploads of at least 5mb per part, the parts of one upload share the unique upload id and the file is complete after the last part
+    min_chunk_size = 5 * 1024 * 1024
+
+    def start_upload(self, filename, size):
+        return uuid4().hex
+
+    def write_chunk(self, key, offset, data, size):
+        result = cloudinary.uploader.upload_large_part(
+            (key, data),
+            http_headers={
+                "Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{size}",
+                "X-Unique-Upload-Id": key,
+            },
+            public_id=self.public_id(key),
+            resource_type="auto",
+        )
+
+        if offset + len(data) == size:
+            return result["secure_url"]
+
+        return None
+
+    # the file is complete with its last part and the upload keeps the url written then, the file is only looked up by its public id when that url was not received
+    def finish_upload(self, key):
+        for resource_type in self.resource_types:
+            try:
+                return cloudinary.api.resource(
+                    self.public_id(key), resource_type=resource_type
+                )["secure_url"]
+            except cloudinary.exceptions.NotFound:
+                continue
+
+        raise ValueError(f"The upload {key} has not been completed on cloudinary.")
+
+    # the parts already uploaded expire on cloudinary by themselves
+    def abort_upload(self, key):
+        pass
+
+    def save_content(self, content, extension):
+        name = uuid4().hex
+        return cloudinary.uploader.upload(
+            (f"{name}{extension}", content),
+            public_id=self.public_id(name),
+            resource_type="auto",
+        )["secure_url"]
+
+    # cloudinary renders the previews itself from transformations written in the delivery url, they are made on their first request and cached by its cdn
+    def create_previews(self, url, content_type):
+        size = settings.MEDIA_PREVIEW_SIZE
+
+        if content_type.startswith("image/") and content_type != "image/svg+xml":
+            return {
+                "thumbnail": transformed_url(
+                    url, f"c_limit,w_{size},h_{size},f_auto,q_auto"
+                )
+            }
+
+        if content_type.startswith("video/"):
+            return {
+                "poster": transformed_url(
+                    url, f"so_0,c_limit,w_{size},h_{size},q_auto", ".jpg"
+                )
+            }
+
+        return {}
+
+    # the files of every resource type in the upload folder are listed one type after the other, the cursor holds the type being listed and the cursor cloudinary gave for it
+    resource_types = ("image", "video", "raw")
+
+    def list_files(self, cursor=None, limit=500):
+        resource_type, _, next_cursor = (
+            cursor or f"{self.resource_types[0]}:"
+        ).partition(":")
+        options = {"next_cursor": next_cursor} if next_cursor else {}
+
+        # cloudinary returns at most 500 resources per call
+        result = cloudinary.api.resources(
+            type="upload",
+            resource_type=resource_type,
+            prefix=self.public_id(""),
+            max_results=min(limit, 500),
+            **options,
+        )
+        files = [
+            (
+                resource["secure_url"],
+                resource["bytes"],
+                datetime.fromisoformat(resource["created_at"].replace("Z", "+00:00")),
+            )
+            for resource in result["resources"]
+        ]
+
+        if result.get("next_cursor"):
+            return files, f"{resource_type}:{result['next_cursor']}"
+
+        index = self.resource_types.index(resource_type) + 1
+        if index < len(self.resource_types):
+            return files, f"{self.resource_types[index]}:"
+
+        return files, None
+
+
+# add a cloudinary transformation to a delivery url, the extension of the url picks the format of the result
+def transformed_url(url, transformation, extension=None):
+    head, tail = url.split("/upload/", 1)
+    if extension is not None:
+        tail = f"{tail.rsplit('.', 1)[0]}{extension}"
+
+    return f"{head}/upload/{transformation}/{tail}"
+
+
+# stores the files on the local disk under the media root, useful for development and for measuring uploads without the network
+class LocalFileSystemStorage(MediaStorage):
+    def __init__(self, root=None, base_url=None):
+        self.root = Path(root or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def save(self, file):
+        name = f"{uuid4().hex}{Path(getattr(file, 'name', '') or '').suffix}"
+        path = self.root / name
+
+        # large uploads are already spooled to a temporary file by django, copying file to file lets the kernel do the copy with sendfile
+        if hasattr(file, "temporary_file_path"):
+            shutil.copyfile(file.temporary_file_path(), path)
+        else:
+            if hasattr(file, "seek"):
+                file.seek(0)
+
+            with open(path, "wb") as destination:
+                shutil.copyfileobj(file, destination, COPY_CHUNK_SIZE)
+
+        return f"{self.base_url}{name}"
+
+    def delete(self, url):
+        name = url.rsplit("/", 1)[-1]
+
+        try:
+            os.remove(self.root / name)
+        except FileNotFoundError:
+            pass
+
+    def save_content(self, content, extension):
+        name = f"{uuid4().hex}{extension}"
+        (self.root / name).write_bytes(content)
+
+        return f"{self.base_url}{name}"
+
+    def create_previews(self, url, content_type):
+        return self.render_previews(self.root / url.rsplit("/", 1)[-1], content_type)
+
+    # the partial files of the resumable uploads are kept apart from the stored files and moved into place once complete
+    def partial_path(self, key):
+        return self.root / ".uploads" / key
+
+    def start_upload(self, filename, size):
+        key = f"{uuid4().hex}{Path(filename).suffix}"
+        path = self.partial_path(key)
+        path.parent.mkdir(exist_ok=True)
+        path.touch()
+
+        return key
+
+    def write_chunk(self, key, offset, data, size):
+        with open(self.partial_path(key), "r+b") as partial:
+            partial.seek(offset)
+            partial.write(data)
+
+        return None
+
+    def finish_upload(self, key):
+        os.replace(self.partial_path(key), self.root / key)
+
+        return f"{self.base_url}{key}"
+
+    def abort_upload(self, key):
+        try:
+            os.remove(self.partial_path(key))
+        except FileNotFoundError:
+            pass
+
+    # the files are listed by name and the cursor is the last name of the page, only the names of a page are kept in memory while the media root is scanned
+    def list_files(self, cursor=None, limit=500):
+        with os.scandir(self.root) as entries:
+            names = heapq.nsmallest(
+                limit + 1,
+                (
+                    entry.name
+                    for entry in entries
+                    if entry.is_file() and (cursor is None or entry.name > cursor)
+                ),
+            )
+
+        files = []
+        for name in names[:limit]:
+            try:
+                stat = (self.root / name).stat()
+            except FileNotFoundError:
+                # deleted since the scan
+                continue
+
+            files.append(
+                (
+                    f"{self.base_url}{name}",
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                )
+            )
+
+        return files, names[limit - 1] if len(names) > limit else None
+
+
+# keeps the files in a dictionary, used for tests and load tests where nothing should touch the disk or the network
+class InMemoryStorage(MediaStorage):
+    def __init__(self):
+        self.files = {}
+        self.stored_at = {}
+        self.uploads = {}
+        self._lock = threading.Lock()
+
+    def store(self, url, content):
+        with self._lock:
+            self.files[url] = content
+            self.stored_at[url] = datetime.now(timezone.utc)
+
+        return url
+
+    def save(self, file):
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+        return self.store(f"memory://{uuid4().hex}", file.read())
+
+    def delete(self, url):
+        with self._lock:
+            self.files.pop(url, None)
+            self.stored_at.pop(url, None)
+
+    def save_content(self, content, extension):
+        return self.store(f"memory://{uuid4().hex}{extension}", content)
+
+    def create_previews(self, url, content_type):
+        return self.render_previews(self.files[url], content_type)
+
+    def start_upload(self, filename, size):
+        key = uuid4().hex
+
+        with self._lock:
+            self.uploads[key] = bytearray()
+
+        return key
+
+    def write_chunk(self, key, offset, data, size):
+        with self._lock:
+            self.uploads[key][offset : offset + len(data)] = data
+
+        return None
+
+    def finish_upload(self, key):
+        with self._lock:
+            content = bytes(self.uploads.pop(key))
+
+        return self.store(f"memory://{key}", content)
+
+    def abort_upload(self, key):
+        with self._lock:
+            self.uploads.pop(key, None)
+
+    def list_files(self, cursor=None, limit=500):
+        with self._lock:
+            urls = sorted(url for url in self.files if cursor is None or url > cursor)
+            files = [
+                (url, len(self.files[url]), self.stored_at[url]) for url in urls[:limit]
+            ]
+
+        return files, urls[limit - 1] if len(urls) > limit else None
+
+
+# get the configured media storage backend, the instance is created once per process
+@cache
+def get_media_storage():
+    return import_string(settings.MEDIA_STORAGE_BACKEND)()
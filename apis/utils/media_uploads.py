@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from .media_storage import get_media_storage
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# a process wide thread pool shared by every request so the number of uploads running at the same time stays bounded
+upload_executor = ThreadPoolExecutor(
+    max_workers=settings.MEDIA_UPLOAD_CONCURRENCY, thread_name_prefix="media-upload"
+)
+
+
+# the first error among the results of the uploads, None when every file was stored
+def upload_error(results):
+    return next(
+        (result for result in results if isinstance(result, BaseException)), None
+    )
+
+
+# delete the files a failed batch of uploads did store, nothing refers to them since the request fails
+def discard_uploads(storage, results):
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+
+        try:
+            storage.delete(result)
+        except Exception:
+            logger.exception("Could not delete the uploaded file %s", result)
+
+
+# upload the files concurrently and return their urls in the same order as the files, by default the files go to the configured media storage backend, when one upload fails the others are waited for and the files they stored are deleted before the error is raised
+def upload_files(files, storage=None):
+    files = list(files or [])
+    storage = storage or get_media_storage()
+
+    # the time the request waits for its uploads is reported by the request metrics
+    with timed("upload"):
+        # a single file goes through the pool as well so MEDIA_UPLOAD_CONCURRENCY bounds every upload of the process
+        futures = [upload_executor.submit(storage.save, file) for file in files]
+        wait(futures)
+
+    results = [future.exception() or future.result() for future in futures]
+
+    error = upload_error(results)
+    if error is not None:
+        discard_uploads(storage, results)
+        raise error
+
+    return results
+
+
+# the async version used by the async views, the uploads run on the same bounded pool and the event loop only waits for them
+async def aupload_files(files, storage=None):
+    files = list(files or [])
+    storage = storage or get_media_storage()
+
+    loop = asyncio.get_running_loop()
+    with timed("upload"):
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(upload_executor, storage.save, file)
+                for file in files
+            ),
+            return_exceptions=True,
+        )
+
+    error = upload_error(results)
+    if error is not None:
+        await loop.run_in_executor(upload_executor, discard_uploads, storage, results)
+        raise error
+
+    return list(results)
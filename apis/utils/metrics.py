@@ -0,0 +1,159 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# the upper bounds of the histogram buckets, in seconds for durations and in queries for the query counts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# a prometheus histogram with one series per label values, the buckets are cumulative when exported
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.setdefault(
+                labels, {"buckets": [0] * (len(self.buckets) + 1), "sum": 0, "count": 0}
+            )
+            series["buckets"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def export(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), series["buckets"]):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{format_labels(self.label_names, labels, le=bound)} {cumulative}"
+                    )
+                lines.append(
+                    f"{self.name}_sum{format_labels(self.label_names, labels)} {series['sum']}"
+                )
+                lines.append(
+                    f"{self.name}_count{format_labels(self.label_names, labels)} {series['count']}"
+                )
+
+        return lines
+
+
+# a prometheus counter with one series per label values
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def export(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+
+        with self._lock:
+            for labels, value in sorted(self._series.items()):
+                lines.append(
+                    f"{self.name}{format_labels(self.label_names, labels)} {value}"
+                )
+
+        return lines
+
+
+def format_labels(label_names, labels, **extra):
+    pairs = [*zip(label_names, labels), *extra.items()]
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# the metrics of this process, every worker process of the server exports its own
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving a request.",
+    ("method", "route", "status"),
+    LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "http_request_db_queries",
+    "Database queries run by a request.",
+    ("method", "route"),
+    QUERY_COUNT_BUCKETS,
+)
+phase_seconds = Counter(
+    "http_request_phase_seconds_total",
+    "Time spent in each phase of the requests: db, upload, password_hash, auth, serialize and render.",
+    ("method", "route", "phase"),
+)
+phase_calls = Counter(
+    "http_request_phase_calls_total",
+    "Number of times each phase ran, for db this is the number of queries.",
+    ("method", "route", "phase"),
+)
+REGISTRY = (request_duration, request_queries, phase_seconds, phase_calls)
+
+
+# the phase timings of the request being served, a context variable follows the request into sync_to_async threads and async tasks
+current_request_phases = ContextVar("current_request_phases", default=None)
+
+
+# add a duration to a phase of the current request, nothing is recorded outside of a request like in management commands
+def record_phase(phase, duration):
+    phases = current_request_phases.get()
+    if phases is None:
+        return
+
+    total, calls = phases.get(phase, (0, 0))
+    phases[phase] = (total + duration, calls + 1)
+
+
+@contextmanager
+def timed(phase):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started_at)
+
+
+# the execute wrapper installed on every database connection, it times each query of the current request
+def record_query(execute, sql, params, many, context):
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_phase("db", time.perf_counter() - started_at)
+
+
+# add the measurements of a finished request to the process metrics
+def observe_request(method, route, status, duration, phases):
+    request_duration.observe((method, route, str(status)), duration)
+    request_queries.observe((method, route), phases.get("db", (0, 0))[1])
+
+    for phase, (total, calls) in phases.items():
+        phase_seconds.inc((method, route, phase), total)
+        phase_calls.inc((method, route, phase), calls)
+
+
+# the prometheus text exposition of every metric
+def render_metrics():
+    return "\n".join(line for metric in REGISTRY for line in metric.export()) + "\n"
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from notes.models import Notes, NoteCollaborator, NoteChangeCounter, NoteTombstone
+from ..serializers.note_serializers import (
+    collaborators_prefetch,
+    attachments_prefetch,
+)
+
+
+# take the next values of the change cursor, the counter row stays locked until the surrounding transaction commits so a client never sees a higher cursor before a lower one is committed
+def next_change_seqs(count):
+    with transaction.atomic():
+        updated = NoteChangeCounter.objects.filter(pk=1).update(
+            value=F("value") + count
+        )
+
+        # the counter row is created by the migrations, this only covers a database that was set up without them
+        if not updated:
+            NoteChangeCounter.objects.create(pk=1, value=count)
+
+        value = NoteChangeCounter.objects.values_list("value", flat=True).get(pk=1)
+
+    return range(value - count + 1, value + 1)
+
+
+# move the notes past every cursor handed out so far, called after a note or its collaborators are written so the delta sync picks it up
+def record_note_changes(note_ids):
+    note_ids = list(dict.fromkeys(note_ids))
+    if not note_ids:
+        return
+
+    with transaction.atomic():
+        change_seqs = next_change_seqs(len(note_ids))
+
+        Notes.objects.bulk_update(
+            [
+                Notes(id=note_id, change_seq=change_seq)
+                for note_id, change_seq in zip(note_ids, change_seqs)
+            ],
+            ["change_seq"],
+        )
+
+        # the collaborator rows carry the updated at of their note for the notes listing
+        NoteCollaborator.objects.filter(notes_id__in=note_ids).update(
+            note_updated_at=Subquery(
+                Notes.objects.filter(id=OuterRef("notes_id")).values("updated_at")[:1]
+            )
+        )
+
+
+# leave a tombstone for every user a note disappeared for, takes a dictionary of note id to the ids of the users that could see it
+def record_note_removals(removed_note_users):
+    removed_note_users = {
+        note_id: user_ids
+        for note_id, user_ids in removed_note_users.items()
+        if user_ids
+    }
+    if not removed_note_users:
+        return
+
+    with transaction.atomic():
+        change_seqs = next_change_seqs(len(removed_note_users))
+
+        NoteTombstone.objects.bulk_create(
+            [
+                NoteTombstone(note_id=note_id, user_id=user_id, change_seq=change_seq)
+                for (note_id, user_ids), change_seq in zip(
+                    removed_note_users.items(), change_seqs
+                )
+                for user_id in user_ids
+            ]
+        )
+
+
+# the users that can see a note, used to know who needs a tombstone before the note is deleted
+def note_audience(note):
+    return [note.user_id, *note.collaborators.values_list("id", flat=True)]
+
+
+# the notes and tombstones of a user past the cursor, a page never has more than the limit of changes and the returned cursor is the last change it holds
+def changes_since(user_id, since, limit):
+    changed_notes = list(
+        Notes.objects.visible_to(user_id)
+        .prefetch_related(collaborators_prefetch(), attachments_prefetch())
+        .filter(change_seq__gt=since)
+        .order_by("change_seq")[: limit + 1]
+    )
+    tombstones = list(
+        NoteTombstone.objects.filter(user_id=user_id, change_seq__gt=since)
+        .order_by("change_seq")
+        .values_list("change_seq", "note_id")[: limit + 1]
+    )
+
+    # merge both lists by their cursor value and keep the first page of it
+    changes = sorted(
+        [(note.change_seq, note) for note in changed_notes] + tombstones,
+        key=lambda change: change[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    notes = [change for _, change in changes if isinstance(change, Notes)]
+    visible_note_ids = {note.id for note in notes}
+
+    # a note that was removed and then shared again shows up as changed, its older tombstone is dropped
+    deleted_note_ids = list(
+        dict.fromkeys(
+            change
+            for _, change in changes
+            if not isinstance(change, Notes) and change not in visible_note_ids
+        )
+    )
+
+    cursor = changes[-1][0] if changes else since
+    return notes, deleted_note_ids, cursor, has_more
@@ -0,0 +1,67 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from notes.models import Notes
+
+
+# compute the etag of a notes listing from one aggregate query over the notes the user can see, the change cursor only grows so any create, update, delete or collaborator change either raises the highest change_seq or lowers the count
+def notes_listing_etag(user_id, *params):
+    version = Notes.objects.visible_to(user_id).aggregate(
+        change_seq=Max("change_seq"), count=Count("id")
+    )
+
+    # the query parameters are part of the etag since every page and every representation is a different response
+    digest = hashlib.sha256(
+        "|".join(
+            str(part)
+            for part in (user_id, version["change_seq"], version["count"], *params)
+        ).encode()
+    ).hexdigest()
+
+    return f'"{digest[:32]}"'
+
+
+# check the if none match request header against the etag of the listing
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # weak validators are compared by their opaque tag, proxies can add the W/ prefix on compressed responses
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+# the serialized payload is cached under its etag, a write to the notes changes the etag so a stale payload is never read again and simply expires
+def cached_listing(etag):
+    if not settings.NOTES_LISTING_CACHE_TIMEOUT:
+        return None
+
+    return cache.get(f"notes-listing:{etag}")
+
+
+def cache_listing(etag, payload):
+    if not settings.NOTES_LISTING_CACHE_TIMEOUT:
+        return
+
+    cache.set(f"notes-listing:{etag}", payload, settings.NOTES_LISTING_CACHE_TIMEOUT)
+
+
+# the async versions of cached listing and cache listing for the async views
+async def acached_listing(etag):
+    if not settings.NOTES_LISTING_CACHE_TIMEOUT:
+        return None
+
+    return await cache.aget(f"notes-listing:{etag}")
+
+
+async def acache_listing(etag, payload):
+    if not settings.NOTES_LISTING_CACHE_TIMEOUT:
+        return
+
+    await cache.aset(
+        f"notes-listing:{etag}", payload, settings.NOTES_LISTING_CACHE_TIMEOUT
+    )
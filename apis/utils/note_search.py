@@ -0,0 +1,127 @@
+import re
+from uuid import UUID
+from django.db import connection
+from django.db.models import Q
+from notes.models import Notes, NoteSearchDocument
+from ..serializers.note_serializers import (
+    collaborators_prefetch,
+    attachments_prefetch,
+)
+
+# the sqlite fts5 table created by the notes migrations
+FTS_TABLE = "notes_fts"
+
+# the tsvector expression the postgres gin index is built on, the search query has to use the exact same expression to hit the index
+POSTGRES_SEARCH_VECTOR = "to_tsvector('english', title || ' ' || note)"
+
+
+# turn the user's search text into a safe fts5 query, every word is quoted so operators typed by the user are not interpreted and the last word matches as a prefix
+def build_match_query(query):
+    terms = re.findall(r"\w+", query)
+
+    if not terms:
+        return None
+
+    quoted_terms = [f'"{term}"' for term in terms]
+    quoted_terms[-1] += "*"
+
+    return " ".join(quoted_terms)
+
+
+# add or refresh a note in the search index, called whenever a note is created or its title or body changes
+def index_note(note):
+    index_notes([note])
+
+
+# add or refresh many notes in the search index with a fixed number of queries
+def index_notes(notes):
+    # the postgres index is an expression index that the database keeps up to date on its own
+    if connection.vendor != "sqlite" or not notes:
+        return
+
+    NoteSearchDocument.objects.bulk_create(
+        [NoteSearchDocument(note=note) for note in notes], ignore_conflicts=True
+    )
+    document_ids = dict(
+        NoteSearchDocument.objects.filter(note__in=notes).values_list("note_id", "id")
+    )
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, note) VALUES (%s, %s, %s)",
+            [(document_ids[note.id], note.title, note.note) for note in notes],
+        )
+
+
+# remove a note from the search index, has to be called before the note is deleted as the search document is deleted along with it
+def unindex_note(note_id):
+    unindex_notes([note_id])
+
+
+# remove many notes from the search index in a single query
+def unindex_notes(note_ids):
+    if connection.vendor != "sqlite" or not note_ids:
+        return
+
+    documents_sql, documents_params = (
+        NoteSearchDocument.objects.filter(note_id__in=note_ids)
+        .values("id")
+        .query.sql_with_params()
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({documents_sql})",
+            documents_params,
+        )
+
+
+# search the notes visible to the user, returns the matching notes ordered by relevance
+def search_visible_notes(user_id, query, limit, offset=0):
+    visible_notes = Notes.objects.visible_to(user_id)
+
+    if connection.vendor == "sqlite":
+        match_query = build_match_query(query)
+        if match_query is None:
+            return []
+
+        visible_sql, visible_params = visible_notes.values("id").query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT document.note_id FROM {FTS_TABLE} "
+                f"JOIN {NoteSearchDocument._meta.db_table} document ON document.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND document.note_id IN ({visible_sql}) "
+                f"ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s",
+                [match_query, *visible_params, limit, offset],
+            )
+            note_ids = [UUID(row[0]) for row in cursor.fetchall()]
+
+    elif connection.vendor == "postgresql":
+        visible_sql, visible_params = visible_notes.values("id").query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {Notes._meta.db_table} "
+                f"WHERE {POSTGRES_SEARCH_VECTOR} @@ plainto_tsquery('english', %s) AND id IN ({visible_sql}) "
+                f"ORDER BY ts_rank({POSTGRES_SEARCH_VECTOR}, plainto_tsquery('english', %s)) DESC "
+                f"LIMIT %s OFFSET %s",
+                [query, *visible_params, query, limit, offset],
+            )
+            note_ids = [row[0] for row in cursor.fetchall()]
+
+    else:
+        # other databases have no index behind them, fall back to an unranked substring match
+        return list(
+            visible_notes.prefetch_related(
+                collaborators_prefetch(), attachments_prefetch()
+            )
+            .filter(Q(title__icontains=query) | Q(note__icontains=query))
+            .order_by("-updated_at", "-id")[offset : offset + limit]
+        )
+
+    # fetch the notes, their collaborators and their files in one query each and put them back in the order of their rank
+    found_notes = Notes.objects.prefetch_related(
+        collaborators_prefetch(), attachments_prefetch()
+    ).in_bulk(note_ids)
+    return [found_notes[note_id] for note_id in note_ids if note_id in found_notes]
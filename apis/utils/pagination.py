@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from heapq import merge
+from itertools import islice
+from uuid import UUID
+from django.db.models import Q
+from notes.models import Notes
+
+
+# encode the position of the last note of a page into an opaque cursor string that the client sends back to get the next page
+def encode_cursor(updated_at, note_id):
+    payload = json.dumps([updated_at.isoformat(), str(note_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+# decode a cursor string back into the updated at and id pair, a malformed cursor raises a value error
+def decode_cursor(cursor):
+    try:
+        updated_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(updated_at), UUID(note_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+# the keyset position of a note, the pages are either note instances or .values() rows
+def note_position(note):
+    if isinstance(note, dict):
+        return note["updated_at"], note["id"]
+
+    return note.updated_at, note.id
+
+
+# the notes of the lookups ordered by the (updated_at, id) keyset, newest first, skipping everything up to and including the cursor position, the fields of the keyset can come from a joined table and are filtered in the same call as the lookups so the join is not made twice, the range on the first field is what an index on (user, updated_at, id) is searched with and the tie on the same time is only checked on the rows of that range
+def keyset_notes(
+    queryset, cursor=None, updated_at="updated_at", note_id="id", **lookups
+):
+    conditions = []
+    if cursor:
+        position_updated_at, position_id = decode_cursor(cursor)
+        conditions = [
+            Q(**{f"{updated_at}__lte": position_updated_at}),
+            Q(**{f"{updated_at}__lt": position_updated_at})
+            | Q(**{f"{note_id}__lt": position_id}),
+        ]
+
+    return queryset.filter(*conditions, **lookups).order_by(
+        f"-{updated_at}", f"-{note_id}"
+    )
+
+
+# the notes the user can see as two keyset ordered branches, the owned notes walk notes_user_updated_idx and the shared notes walk notes_collab_user_updated_idx, a page reads at most a page of rows from each index instead of sorting every visible note
+def visible_notes_keyset(user_id, cursor=None):
+    return [
+        keyset_notes(Notes.objects, cursor, user_id=user_id),
+        keyset_notes(
+            Notes.objects,
+            cursor,
+            "notecollaborator__note_updated_at",
+            "notecollaborator__notes_id",
+            notecollaborator__user_id=user_id,
+        ),
+    ]
+
+
+# merge the rows of the newest first branches into one newest first sequence, a note that is in both branches comes out of them next to itself and is listed once
+def merge_notes(branches):
+    last_id = None
+    for note in merge(*branches, key=note_position, reverse=True):
+        note_id = note_position(note)[1]
+        if note_id != last_id:
+            last_id = note_id
+            yield note
+
+
+# the async version of merge notes over the async iterators of the branches
+async def amerge_notes(branches):
+    iterators = [aiter(branch) for branch in branches]
+    heads = [await anext(iterator, None) for iterator in iterators]
+
+    last_id = None
+    while any(head is not None for head in heads):
+        index = max(
+            (index for index, head in enumerate(heads) if head is not None),
+            key=lambda index: note_position(heads[index]),
+        )
+        note = heads[index]
+        heads[index] = await anext(iterators[index], None)
+
+        note_id = note_position(note)[1]
+        if note_id != last_id:
+            last_id = note_id
+            yield note
+
+
+# a page of the merged branches, one extra row is fetched to know if there is a next page without running a count query
+def merged_page(pages, page_size):
+    notes = list(islice(merge_notes(pages), page_size + 1))
+
+    next_cursor = None
+    if len(notes) > page_size:
+        notes = notes[:page_size]
+        next_cursor = encode_cursor(*note_position(notes[-1]))
+
+    return notes, next_cursor
+
+
+# slice one page out of the keyset ordered branches, each branch reads one row more than a page
+def paginate_notes(branches, page_size):
+    return merged_page([branch[: page_size + 1] for branch in branches], page_size)
+
+
+# the async version of paginate notes for the async views
+async def apaginate_notes(branches, page_size):
+    pages = [[note async for note in branch[: page_size + 1]] for branch in branches]
+
+    return merged_page(pages, page_size)
@@ -0,0 +1,67 @@
+import asyncio
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from .metrics import timed
+
+
+# bcrypt releases the gil while it hashes so the threads of this pool run on separate cores, the size of the pool bounds how many cores a login storm can take away from the other endpoints
+def create_password_executor():
+    if settings.PASSWORD_HASH_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+
+    return ThreadPoolExecutor(
+        max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+    )
+
+
+password_executor = create_password_executor()
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode()
+
+
+def _check_password(password, hashed_password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+# hash a password with the configured work factor on the password pool
+def hash_password(password):
+    with timed("password_hash"):
+        return password_executor.submit(
+            _hash_password, password, settings.PASSWORD_HASH_ROUNDS
+        ).result()
+
+
+# check a password against its hash on the password pool
+def check_password(password, hashed_password):
+    with timed("password_hash"):
+        return password_executor.submit(
+            _check_password, password, hashed_password
+        ).result()
+
+
+# the async versions await the password pool without holding a thread of the event loop
+async def ahash_password(password):
+    with timed("password_hash"):
+        return await asyncio.wrap_future(
+            password_executor.submit(
+                _hash_password, password, settings.PASSWORD_HASH_ROUNDS
+            )
+        )
+
+
+async def acheck_password(password, hashed_password):
+    with timed("password_hash"):
+        return await asyncio.wrap_future(
+            password_executor.submit(_check_password, password, hashed_password)
+        )
+
+
+# a hash made with another work factor than the configured one is rehashed on the next successful login, the cost is the number between the second and third $ of a bcrypt hash
+def password_needs_rehash(hashed_password):
+    try:
+        return int(hashed_password.split("$")[2]) != settings.PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,53 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .metrics import timed
+
+# orjson is optional, without it the responses are rendered by the rest framework's json renderer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# the types orjson does not know like decimals and lazy translation strings are converted the same way the rest framework's encoder does
+json_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+# render a python object to json bytes with orjson when it is installed, used by the renderer, the async views and the streaming notes listing
+def render_json(data):
+    with timed("render"):
+        if orjson is not None:
+            return orjson.dumps(
+                data, default=json_encoder.default, option=ORJSON_OPTIONS
+            )
+
+        return JSONRenderer().render(data)
+
+
+# a drop in replacement of the rest framework's json renderer that renders with orjson, it falls back to the default renderer when orjson is not installed or the client asked for indented json
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(
+            accepted_media_type or "", renderer_context or {}
+        ):
+            with timed("render"):
+                return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        return render_json(data)
+
+
+# lets the clients ask for the streamed notes listing with an Accept: application/x-ndjson header, the content negotiation would answer them with a 406 otherwise, a response that is not streamed like an error is rendered as a single json line
+class NDJSONRenderer(FastJSONRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        return render_json(data) + b"\n"
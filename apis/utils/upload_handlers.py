@@ -0,0 +1,147 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from ..validators.note_validators import ACCEPTED_CONTENT_TYPES, MAX_FILE_SIZE
+from ..validators.user_validators import (
+    PROFILE_PICTURE_CONTENT_TYPES,
+    MAX_PROFILE_PICTURE_SIZE,
+)
+
+# the bytes at the start of a file the content type is sniffed from, svg is text and its root element can come after an xml declaration and comments
+SNIFF_LENGTH = 1024
+
+# the content types and the largest size accepted for each file field, any other file field follows the rules of the note files
+UPLOAD_FIELD_RULES = {
+    "files": (ACCEPTED_CONTENT_TYPES, MAX_FILE_SIZE),
+    "profile_picture": (PROFILE_PICTURE_CONTENT_TYPES, MAX_PROFILE_PICTURE_SIZE),
+}
+
+# the iso media container holds mp4, quicktime and 3gpp files with or without video, the brands inside it are too varied to tell them apart reliably
+ISO_MEDIA_TYPES = {
+    "video/mp4",
+    "audio/mp4",
+    "video/quicktime",
+    "video/3gpp",
+    "audio/3gpp",
+    "video/3gpp2",
+    "audio/3gpp2",
+}
+ISO_MEDIA_BOXES = (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip")
+
+
+# the content types the first bytes of a file can belong to, an empty set when they match none of the accepted types
+def sniff_content_types(head):
+    if head.startswith(b"\xff\xd8\xff"):
+        return {"image/jpeg"}
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return {"image/png"}
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return {"image/gif"}
+    if head.startswith(b"BM"):
+        return {"image/bmp"}
+    if head.startswith(b"RIFF"):
+        return {
+            b"WEBP": {"image/webp"},
+            b"WAVE": {"audio/wav"},
+            b"AVI ": {"video/x-msvideo"},
+        }.get(head[8:12], set())
+    if head[4:8] in ISO_MEDIA_BOXES:
+        return ISO_MEDIA_TYPES
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        # the ebml header names the document type of matroska and webm files
+        if b"webm" in head[:64]:
+            return {"video/webm", "audio/webm"}
+        return {"video/x-matroska"}
+    if head.startswith(b"OggS"):
+        return {"audio/ogg", "video/ogg"}
+    if head.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return {"audio/x-ms-wma"}
+    if head.startswith(b"ID3") or (
+        len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0
+    ):
+        # an id3 tag or an mpeg frame header, the adts headers of aac files use the same sync bits
+        return {"audio/mpeg", "audio/aac"}
+
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<") and b"<svg" in text:
+        return {"image/svg+xml"}
+
+    return set()
+
+
+# the uploads stopped by the upload handler for the request, the views answer with an error instead of validating the missing files
+def rejected_uploads(request):
+    return getattr(request, "rejected_uploads", [])
+
+
+# too large uploads are answered with a 413 and files of a wrong type with a 400
+def rejected_uploads_status(rejections):
+    if any(rejection["reason"] == "too_large" for rejection in rejections):
+        return 413
+
+    return 400
+
+
+# an upload handler placed before the django ones in FILE_UPLOAD_HANDLERS, it checks the content of every uploaded file against its declared content type and its size against the limit of the field while the request body is read, a bad file stops the upload without reading the rest of the body
+class ValidatingUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+
+        self.accepted_content_types, self.max_size = UPLOAD_FIELD_RULES.get(
+            field_name, UPLOAD_FIELD_RULES["files"]
+        )
+        self.head = b""
+        self.sniffed = False
+
+        if content_type not in self.accepted_content_types:
+            self.reject("invalid_type", "Not a valid file type.")
+
+        # a content length sent with the file is checked before any of it is read
+        if self.content_length is not None and self.content_length > self.max_size:
+            self.reject(
+                "too_large", f"File too large, max {self.max_size // 1024 // 1024}MB."
+            )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.reject(
+                "too_large", f"File too large, max {self.max_size // 1024 // 1024}MB."
+            )
+
+        # the chunks are passed on to the next handler while the start of the file is collected
+        if not self.sniffed:
+            self.head += raw_data[: SNIFF_LENGTH - len(self.head)]
+            if len(self.head) >= SNIFF_LENGTH:
+                self.check_content()
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        # files shorter than the sniffed length are checked once they are complete
+        if not self.sniffed:
+            self.check_content()
+
+        # the file itself is built by the next handler
+        return None
+
+    def check_content(self):
+        self.sniffed = True
+
+        if self.content_type not in sniff_content_types(self.head):
+            self.reject(
+                "invalid_type", "The file content does not match its content type."
+            )
+
+    # remember why the file was rejected and stop reading the request body
+    def reject(self, reason, message):
+        if not hasattr(self.request, "rejected_uploads"):
+            self.request.rejected_uploads = []
+
+        self.request.rejected_uploads.append(
+            {
+                "field": self.field_name,
+                "filename": self.file_name,
+                "reason": reason,
+                "message": message,
+            }
+        )
+
+        raise StopUpload(connection_reset=True)
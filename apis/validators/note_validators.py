@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Any, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Any, Literal, Optional
 from uuid import UUID
 from collections.abc import Iterable
+from django.conf import settings
 
 # all the accepted cntent types
 ACCEPTED_CONTENT_TYPES = [
@@ -34,6 +35,10 @@ ACCEPTED_CONTENT_TYPES = [
 ]
 
 
+# the largest note file accepted in a multipart upload
+MAX_FILE_SIZE = 25 * 1024 * 1024
+
+
 # create note validator for the validation of the notes with coontent types, collaborators
 class CreateNoteValidator(BaseModel):
     title: str = Field(max_length=300)
@@ -56,17 +61,19 @@ class CreateNoteValidator(BaseModel):
                 raise ValueError("Not a valid file type.")
 
             # file size check of max 25mb
-            if file.size > 25 * 1024 * 1024:
+            if file.size > MAX_FILE_SIZE:
                 raise ValueError("Image too large, max 25MB.")
 
         return files
 
 
+# update note validator, the files are changed incrementally: the new files are added after the current ones and the urls in remove_files are removed, files_urls is still taken from the clients that send the whole list of urls to keep
 class UpdateNoteValidator(BaseModel):
     note_id: UUID
     title: str = Field(max_length=300)
     note: str
-    files_urls: list[str]
+    files_urls: Optional[list[str]] = None
+    remove_files: list[str] = Field(default_factory=list)
     files: Any
 
     @field_validator("files")
@@ -84,7 +91,7 @@ class UpdateNoteValidator(BaseModel):
                 raise ValueError("Not a valid file type.")
 
             # file size check of max 25mb
-            if file.size > 25 * 1024 * 1024:
+            if file.size > MAX_FILE_SIZE:
                 raise ValueError("Image too large, max 25MB.")
 
         return files
@@ -97,3 +104,95 @@ class DeleteNoteValidator(BaseModel):
 class AddRemoveCollaboratorValidator(BaseModel):
     note_id: UUID
     collaborator_id: UUID
+
+
+# add remove collaborators validator for the collaborators endpoint, it takes a list of ids in collaborator_ids or a single id in collaborator_id and merges them into collaborator_ids
+class AddRemoveCollaboratorsValidator(BaseModel):
+    note_id: UUID
+    collaborator_id: Optional[UUID] = None
+    collaborator_ids: list[UUID] = Field(default_factory=list, max_length=500)
+
+    @model_validator(mode="after")
+    def merge_collaborator_ids(self):
+        if self.collaborator_id is not None:
+            self.collaborator_ids = [self.collaborator_id, *self.collaborator_ids]
+
+        if not self.collaborator_ids:
+            raise ValueError("collaborator_id or collaborator_ids is required.")
+
+        self.collaborator_ids = list(dict.fromkeys(self.collaborator_ids))
+        return self
+
+
+# get notes validator for the query parameters of the paginated notes listing
+class GetNotesValidator(BaseModel):
+    cursor: Optional[str] = None
+    page_size: Optional[int] = Field(default=None, ge=1)
+    stream: bool = False
+    expand: Optional[Literal["collaborators"]] = None
+    media: Literal["preview", "original"] = "preview"
+
+
+# search notes validator for the search text and the page of the ranked results
+class SearchNotesValidator(BaseModel):
+    q: str = Field(min_length=1, max_length=300)
+    page: int = Field(default=1, ge=1)
+    page_size: Optional[int] = Field(default=None, ge=1)
+
+
+# note changes validator for the delta sync cursor and the page size
+class NoteChangesValidator(BaseModel):
+    since: int = Field(default=0, ge=0)
+    page_size: Optional[int] = Field(default=None, ge=1)
+
+
+# start upload validator for the file a resumable upload will carry, the size is limited by NOTE_UPLOAD_MAX_SIZE instead of the 25mb of the multipart uploads
+class StartUploadValidator(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(ge=1)
+
+    @field_validator("content_type")
+    @classmethod
+    def validate_content_type(cls, content_type):
+        if content_type not in ACCEPTED_CONTENT_TYPES:
+            raise ValueError("Not a valid file type.")
+
+        return content_type
+
+    @field_validator("size")
+    @classmethod
+    def validate_size(cls, size):
+        if size > settings.NOTE_UPLOAD_MAX_SIZE:
+            raise ValueError(
+                f"File too large, max {settings.NOTE_UPLOAD_MAX_SIZE} bytes."
+            )
+
+        return size
+
+
+# upload chunk validator for the upload id and the offset the chunk starts at, given in the Upload-Offset header
+class UploadChunkValidator(BaseModel):
+    upload_id: UUID
+    offset: int = Field(ge=0)
+
+
+# finish upload validator for the upload and the note the uploaded file is attached to
+class FinishUploadValidator(BaseModel):
+    upload_id: UUID
+    note_id: UUID
+
+
+# the validator used for each kind of operation of a bulk request, they are the same validators the single note endpoints use
+BULK_OPERATION_VALIDATORS = {
+    "create": CreateNoteValidator,
+    "update": UpdateNoteValidator,
+    "delete": DeleteNoteValidator,
+    "add_collaborator": AddRemoveCollaboratorValidator,
+    "remove_collaborator": AddRemoveCollaboratorValidator,
+}
+
+
+# bulk notes validator for the list of operations, each operation is validated on its own afterwards
+class BulkNotesValidator(BaseModel):
+    operations: list[Any] = Field(min_length=1)
@@ -1,6 +1,10 @@
 from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Any
 
+# the content types and the largest size accepted for a profile picture
+PROFILE_PICTURE_CONTENT_TYPES = ["image/jpeg", "image/png"]
+MAX_PROFILE_PICTURE_SIZE = 5 * 1024 * 1024
+
 
 # creating a validator class model using the basemodel and providing the neccessary properties required for the validation, documentation link: https://docs.pydantic.dev/latest/#pydantic-examples
 class CreateUserValidator(BaseModel):
@@ -12,11 +16,11 @@ class CreateUserValidator(BaseModel):
     @field_validator("profile_picture")
     def validate_profile_picture(cls, file):
         # image type validation
-        if file.content_type not in ["image/jpeg", "image/png"]:
+        if file.content_type not in PROFILE_PICTURE_CONTENT_TYPES:
             raise ValueError("Only JPEG and PNG images are allowed.")
 
         # file size check of max 5mb
-        if file.size > 5 * 1024 * 1024:
+        if file.size > MAX_PROFILE_PICTURE_SIZE:
             raise ValueError("Image too large, max 5MB.")
 
         return file
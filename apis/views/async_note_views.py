@@ -0,0 +1,460 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotModified, StreamingHttpResponse, QueryDict
+from django.http.multipartparser import MultiPartParserError
+from django.utils.datastructures import MultiValueDict
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from pydantic import ValidationError
+from ..utils.renderers import render_json
+from ..utils.api_response import APIJsonResponse
+from ..validators.note_validators import (
+    CreateNoteValidator,
+    UpdateNoteValidator,
+    DeleteNoteValidator,
+    AddRemoveCollaboratorsValidator,
+    GetNotesValidator,
+)
+from auth_sessions.utils import averifyUser
+from notes.models import Notes
+from ..serializers.note_serializers import (
+    NoteRowsSerializer,
+)
+from ..utils.pagination import visible_notes_keyset, amerge_notes, apaginate_notes
+from ..utils.note_listing_cache import (
+    notes_listing_etag,
+    etag_matches,
+    acached_listing,
+    acache_listing,
+)
+from .note_views import (
+    listing_cache_headers,
+    save_new_note,
+    files_to_remove,
+    save_note_update,
+    delete_note,
+    save_added_collaborators,
+    save_removed_collaborators,
+)
+from .async_user_views import parse_json_body
+from ..utils.attachments import astore_files, note_file_urls
+from ..utils.upload_handlers import rejected_uploads, rejected_uploads_status
+from ..utils.collaborators import (
+    aexisting_user_ids,
+    missing_user_ids,
+    anote_collaborator_ids,
+    ais_collaborator,
+)
+
+
+# plain django views only parse the form body of post requests, the body of a put request is parsed here the same way so the upload handlers still check its files, None when the body is not a form
+def parse_form_body(request):
+    if request.method == "POST":
+        return request.POST, request.FILES
+
+    if request.content_type == "multipart/form-data":
+        return request.parse_file_upload(request.META, request)
+
+    if request.content_type == "application/x-www-form-urlencoded":
+        return QueryDict(request.body, encoding=request.encoding), MultiValueDict()
+
+    return None, None
+
+
+# the async version of the create note view, the event loop keeps serving other requests while the files are uploaded
+@csrf_exempt
+@require_http_methods(["POST"])
+async def create_note(request):
+    # pass the request object to the verify user function which will verify the cookie and return the logged in user incase of successful verification
+    found_user = await averifyUser(request)
+
+    # incase the verification was unsuccesful will return False
+    if found_user == False:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    # hold the form data in a dicionary type variable
+    data = {
+        "title": request.POST.get("title"),
+        "note": request.POST.get("note"),
+        "files": request.FILES.getlist("files"),
+        "collaborators": request.POST.getlist("collaborators"),
+    }
+
+    # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+    rejections = rejected_uploads(request)
+    if rejections:
+        return APIJsonResponse(
+            False,
+            rejected_uploads_status(rejections),
+            "File upload rejected.",
+            error=rejections,
+        )
+
+    try:
+        # validate the data dictionary using a pydantic validator
+        validate_data = CreateNoteValidator(**data)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    try:
+        # if the collaborators field is given check that all of them exist with a single query
+        if validate_data.collaborators:
+            invalid_ids = missing_user_ids(
+                validate_data.collaborators,
+                await aexisting_user_ids(validate_data.collaborators),
+            )
+
+            if invalid_ids:
+                return APIJsonResponse(
+                    False, 409, f"Invalid collaborator ID(s): {', '.join(invalid_ids)}"
+                )
+
+        # upload all the files at the same time without blocking the event loop, a file whose content is already stored is not uploaded again
+        stored = await astore_files(validate_data.files, found_user.id)
+
+        # the async orm has no transactions, the note with its collaborators and files is written in one transaction on a worker thread
+        await sync_to_async(save_new_note)(found_user, validate_data, stored)
+
+        return APIJsonResponse(True, 200, "Note has been created successfully.")
+    except Exception:
+        return APIJsonResponse(False, 500, "Internal Server Error.")
+
+
+# the async version of the get notes view
+@csrf_exempt
+@require_http_methods(["GET"])
+async def get_notes(request):
+    # pass the request object to the verify user function which will verify the cookie and return the logged in user incase of successful verification
+    found_user = await averifyUser(request)
+
+    # incase the verification was unsuccesful will return False
+    if found_user == False:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    # hold the query parameters in a dictionary type variable
+    data = {
+        "cursor": request.GET.get("cursor"),
+        "page_size": request.GET.get("page_size"),
+        "stream": request.GET.get("stream", False)
+        or "application/x-ndjson" in request.headers.get("Accept", ""),
+        "expand": request.GET.get("expand"),
+        "media": request.GET.get("media", "preview"),
+    }
+
+    try:
+        # validate the query parameters using a pydantic validator
+        validate_data = GetNotesValidator(**data)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    page_size = min(
+        validate_data.page_size or settings.NOTES_PAGE_SIZE,
+        settings.NOTES_MAX_PAGE_SIZE,
+    )
+
+    # with expand=collaborators the collaborators are embedded as compact profiles instead of ids, by default the preview urls of the files come with the notes and media=original leaves them out
+    note_rows_serializer = NoteRowsSerializer(
+        validate_data.expand == "collaborators",
+        previews=validate_data.media == "preview",
+    )
+
+    # answer the polls of an unchanged listing with an empty 304
+    etag = await sync_to_async(notes_listing_etag)(
+        found_user.id,
+        validate_data.cursor,
+        page_size,
+        validate_data.stream,
+        validate_data.expand,
+        validate_data.media,
+    )
+    if etag_matches(request, etag):
+        return HttpResponseNotModified(headers=listing_cache_headers(etag))
+
+    try:
+        # get the notes where the user is the creator or a collaborator ordered by the keyset starting after the cursor, read as an owned and a shared branch
+        found_notes = [
+            note_rows_serializer.values(branch)
+            for branch in visible_notes_keyset(found_user.id, validate_data.cursor)
+        ]
+    except ValueError:
+        return APIJsonResponse(False, 400, "Invalid cursor.")
+
+    try:
+        # in streaming mode the notes are written as json lines from an async generator so a slow client does not hold a thread
+        if validate_data.stream:
+            return StreamingHttpResponse(
+                astream_notes(found_notes, page_size, note_rows_serializer),
+                content_type="application/x-ndjson",
+                headers=listing_cache_headers(etag),
+            )
+
+        # the serialized page is reused while the etag stays the same, the cache is shared with the sync view
+        payload = await acached_listing(etag)
+        if payload is None:
+            # get a single page of notes and the cursor for the next one
+            page_notes, next_cursor = await apaginate_notes(found_notes, page_size)
+
+            payload = {
+                "data": await note_rows_serializer.aserialize(page_notes),
+                "meta": {"nextCursor": next_cursor, "pageSize": page_size},
+            }
+            await acache_listing(etag, payload)
+
+        return APIJsonResponse(
+            True,
+            200,
+            "Notes have been fetched.",
+            data=payload["data"],
+            meta=payload["meta"],
+            headers=listing_cache_headers(etag),
+        )
+
+    except Exception:
+        return APIJsonResponse(False, 500, "Internal server error.")
+
+
+# async generator used by the streaming mode of the async get notes view
+async def astream_notes(found_notes, chunk_size, note_rows_serializer):
+    chunk = []
+    rows = amerge_notes(
+        [branch.aiterator(chunk_size=chunk_size) for branch in found_notes]
+    )
+    async for row in rows:
+        chunk.append(row)
+
+        # the collaborators are loaded once per chunk of rows
+        if len(chunk) == chunk_size:
+            for note in await note_rows_serializer.aserialize(chunk):
+                yield render_json(note) + b"\n"
+            chunk = []
+
+    for note in await note_rows_serializer.aserialize(chunk):
+        yield render_json(note) + b"\n"
+
+
+# the async version of the update note view, put updates the note of the owner or a collaborator and delete removes the note of the owner
+@csrf_exempt
+@require_http_methods(["PUT", "DELETE"])
+async def update_note(request, note_id):
+    # pass the request object to the verify user function which will verify the cookie and return the logged in user incase of successful verification
+    found_user = await averifyUser(request)
+
+    # incase the verification was unsuccesful will return False
+    if found_user == False:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    if request.method == "PUT":
+        try:
+            form, files = parse_form_body(request)
+        except MultiPartParserError:
+            return APIJsonResponse(False, 400, "Malformed form data.")
+
+        if form is None:
+            return APIJsonResponse(False, 400, "Request body must be form data.")
+
+        data = {
+            "note_id": note_id,
+            "title": form.get("title"),
+            "note": form.get("note"),
+            "files_urls": (
+                form.getlist("files_urls") if "files_urls" in form else None
+            ),
+            "remove_files": form.getlist("remove_files"),
+            "files": files.getlist("files"),
+        }
+
+        # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+        rejections = rejected_uploads(request)
+        if rejections:
+            return APIJsonResponse(
+                False,
+                rejected_uploads_status(rejections),
+                "File upload rejected.",
+                error=rejections,
+            )
+
+        try:
+            # validate the request body and the note id of the url
+            validate_put_method_data = UpdateNoteValidator(**data)
+        except ValidationError as e:
+            return APIJsonResponse(
+                False, 400, "Failed in type validation.", error=e.errors()
+            )
+
+        # check if the note exists with the note id provided as parameter in request url
+        found_note = await Notes.objects.filter(
+            id=validate_put_method_data.note_id
+        ).afirst()
+        if found_note is None:
+            return APIJsonResponse(False, 404, "Note not found with this id.")
+
+        # check if the user trying to update the note is its owner or a collaborator
+        if found_user.id != found_note.user_id and not await ais_collaborator(
+            found_note.id, found_user.id
+        ):
+            return APIJsonResponse(
+                False, 401, "You are not authorized to update this note."
+            )
+
+        # the files of the note that the update removes
+        removed_files = files_to_remove(
+            await sync_to_async(note_file_urls)(found_note.id),
+            validate_put_method_data,
+        )
+
+        # check if the fields are updated and not the same as it was
+        if (
+            validate_put_method_data.title == found_note.title
+            and validate_put_method_data.note == found_note.note
+            and not removed_files
+            and not validate_put_method_data.files
+        ):
+            return APIJsonResponse(False, 409, "No changes found to update.")
+
+        try:
+            # upload the new files without blocking the event loop, a file whose content is already stored is not uploaded again
+            stored = await astore_files(validate_put_method_data.files, found_user.id)
+
+            # update the note and its attachments in one transaction on a worker thread
+            await sync_to_async(save_note_update)(
+                found_note, validate_put_method_data, removed_files, stored
+            )
+
+            return APIJsonResponse(True, 200, "Note has been updated.")
+        except Exception:
+            return APIJsonResponse(False, 500, "Internal server error.")
+
+    try:
+        # validate the request parameter of note id
+        validate_delete_method_data = DeleteNoteValidator(note_id=note_id)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    # check if a note exists with the provided note id request url parameter
+    found_note = await Notes.objects.filter(
+        id=validate_delete_method_data.note_id
+    ).afirst()
+    if found_note is None:
+        return APIJsonResponse(False, 404, "Note not found with this id.")
+
+    # check if the user making the request is the creator of the note
+    if found_user.id != found_note.user_id:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    try:
+        # remove the note from the search index, delete the note and leave the tombstones in one transaction
+        await sync_to_async(delete_note)(found_note)
+
+        return APIJsonResponse(True, 200, "Note has been deleted.")
+    except Exception:
+        return APIJsonResponse(False, 500, "Internal server error.")
+
+
+# the async version of the add remove collaborator view
+@csrf_exempt
+@require_http_methods(["POST", "DELETE"])
+async def add_remove_collaborator(request, note_id):
+    # pass the request object to the verify user function which will verify the cookie and return the logged in user incase of successful verification
+    found_user = await averifyUser(request)
+
+    # incase the verification was unsuccesful will return False
+    if found_user == False:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    body = parse_json_body(request)
+    if body is None:
+        return APIJsonResponse(False, 400, "Request body must be a json object.")
+
+    try:
+        # validate the request url parameter and the body for the ids of the potential collaborators
+        validated_data = AddRemoveCollaboratorsValidator(note_id=note_id, **body)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    # check if the provided note id's note exists in the database
+    found_note = await Notes.objects.filter(id=validated_data.note_id).afirst()
+    if found_note is None:
+        return APIJsonResponse(False, 404, "No note found with this id.")
+
+    # only the owner and the collaborators of the note can change its collaborators
+    if found_user.id != found_note.user_id and not await ais_collaborator(
+        found_note.id, found_user.id
+    ):
+        return APIJsonResponse(
+            False,
+            401,
+            "You are not authorized to change the collaborators of this note.",
+        )
+
+    collaborator_ids = validated_data.collaborator_ids
+
+    # check that every provided user id exists with a single query
+    invalid_ids = missing_user_ids(
+        collaborator_ids, await aexisting_user_ids(collaborator_ids)
+    )
+    if invalid_ids:
+        return APIJsonResponse(
+            False, 404, "No user found with this id.", error={"invalidIds": invalid_ids}
+        )
+
+    # check if the user himself is trying to make changes of himself as a collaborator
+    if found_user.id in collaborator_ids:
+        return APIJsonResponse(False, 409, "Can not make changes of yourself.")
+
+    # the users of the request that already are collaborators of the note
+    current_collaborator_ids = await anote_collaborator_ids(
+        found_note.id, collaborator_ids
+    )
+
+    if request.method == "POST":
+        new_collaborator_ids = [
+            collaborator_id
+            for collaborator_id in collaborator_ids
+            if collaborator_id not in current_collaborator_ids
+        ]
+
+        # check if the users are already collaborators
+        if not new_collaborator_ids:
+            return APIJsonResponse(False, 409, "This user is already a collaborator.")
+
+        # save the users as collaborators with one insert
+        await sync_to_async(save_added_collaborators)(
+            found_note.id, new_collaborator_ids
+        )
+
+        return APIJsonResponse(
+            True,
+            200,
+            "This user has been added as a collaborator.",
+            data={"added": new_collaborator_ids},
+        )
+
+    removed_collaborator_ids = [
+        collaborator_id
+        for collaborator_id in collaborator_ids
+        if collaborator_id in current_collaborator_ids
+    ]
+
+    # check if the users are not in the collaborators
+    if not removed_collaborator_ids:
+        return APIJsonResponse(False, 409, "This user is not a collaborator.")
+
+    # remove the users from the collaborators with one delete
+    await sync_to_async(save_removed_collaborators)(
+        found_note.id, removed_collaborator_ids
+    )
+
+    return APIJsonResponse(
+        True,
+        200,
+        "This user has been removed from a collaborator.",
+        data={"removed": removed_collaborator_ids},
+    )
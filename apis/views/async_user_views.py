@@ -0,0 +1,170 @@
+import json
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from pydantic import ValidationError
+from ..utils.api_response import APIJsonResponse
+from ..validators.user_validators import (
+    CreateUserValidator,
+    LoginValidator,
+    GetUserValidator,
+)
+from users.models import User
+from ..serializers.user_serializers import UsersSerializer
+from ..utils.media_uploads import aupload_files
+from ..utils.upload_handlers import rejected_uploads, rejected_uploads_status
+from ..utils.passwords import ahash_password, acheck_password, password_needs_rehash
+from auth_sessions.utils import initializeToken, aresolveToken, arevokeToken
+
+
+# the async views are plain django views so the json body is parsed here instead of by the rest framework
+def parse_json_body(request):
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+
+    return body if isinstance(body, dict) else None
+
+
+# the async version of the create or get user view, post creates a user with a profile picture and get looks a user up by the email of the json body
+@csrf_exempt
+@require_http_methods(["POST", "GET"])
+async def create_or_get_user(request):
+    if request.method == "POST":
+        data = {
+            "name": request.POST.get("name"),
+            "email": request.POST.get("email"),
+            "profile_picture": request.FILES.get("profile_picture"),
+            "password": request.POST.get("password"),
+        }
+
+        # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+        rejections = rejected_uploads(request)
+        if rejections:
+            return APIJsonResponse(
+                False,
+                rejected_uploads_status(rejections),
+                "File upload rejected.",
+                error=rejections,
+            )
+
+        # make the data go through a pydentic validator to check for the expected data type
+        try:
+            validate_data = CreateUserValidator(**data)
+        except ValidationError as e:
+            return APIJsonResponse(
+                False, 400, "Failed in type validation.", error=e.errors()
+            )
+
+        # check for any duplicate items with the email
+        if await User.objects.filter(email=validate_data.email).aexists():
+            return APIJsonResponse(False, 409, "User with this email already exists.")
+
+        try:
+            # hash the password on the password pool and upload the profile picture on the upload pool without blocking the event loop
+            hashed_password = await ahash_password(validate_data.password)
+            (profile_picture_secure_url,) = await aupload_files(
+                [validate_data.profile_picture]
+            )
+
+            # create a user
+            await User.objects.acreate(
+                name=validate_data.name,
+                email=validate_data.email,
+                profile_picture_url=profile_picture_secure_url,
+                password=hashed_password,
+            )
+
+            return APIJsonResponse(True, 201, "User has been created.")
+        except Exception:
+            return APIJsonResponse(False, 500, "Internal Server Error.")
+
+    body = parse_json_body(request)
+    if body is None:
+        return APIJsonResponse(False, 400, "Request body must be a json object.")
+
+    try:
+        # validate the request body's email field
+        validated_data = GetUserValidator(**body)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    try:
+        # look up for any existing user using the type validated email
+        found_user = await User.objects.aget(email=validated_data.email)
+    except User.DoesNotExist:
+        return APIJsonResponse(False, 404, "User not found with this email.")
+
+    # serialize the data of the found user and send back data to the client
+    return APIJsonResponse(
+        True,
+        200,
+        "User found with this email.",
+        data=UsersSerializer(found_user).data,
+    )
+
+
+# the async version of the login view, the password check is awaited on the password pool
+@csrf_exempt
+@require_http_methods(["POST"])
+async def login(request):
+    body = parse_json_body(request)
+    if body is None:
+        return APIJsonResponse(False, 400, "Request body must be a json object.")
+
+    try:
+        # validate the request body
+        validate_data = LoginValidator(**body)
+    except ValidationError as e:
+        return APIJsonResponse(
+            False, 400, "Failed in type validation.", error=e.errors()
+        )
+
+    try:
+        # get hold of the user
+        found_user = await User.objects.aget(email=validate_data.email)
+    except User.DoesNotExist:
+        return APIJsonResponse(False, 409, "Invalid Credentials.")
+
+    # check if the password is correct
+    if await acheck_password(validate_data.password, found_user.password) == False:
+        return APIJsonResponse(False, 409, "Invalid Credentials.")
+
+    # initialize the token and send reponse to the client
+    try:
+        # the password is hashed again when the configured work factor has changed since it was stored
+        if password_needs_rehash(found_user.password):
+            found_user.password = await ahash_password(validate_data.password)
+            await found_user.asave(update_fields=["password", "updated_at"])
+
+        token = await sync_to_async(initializeToken)(found_user)
+        return APIJsonResponse(True, 200, "User has been logged in.", cookie=token)
+    except Exception:
+        return APIJsonResponse(False, 500, "Internal Server Error.")
+
+
+# the async version of the logout view
+@csrf_exempt
+@require_http_methods(["POST"])
+async def logout(request):
+    # resolve the token cookie, the claims of the token are needed to find its session
+    resolved_token = await aresolveToken(request)
+
+    # incase the verification was unsuccesful
+    if resolved_token is None:
+        return APIJsonResponse(False, 401, "Unauthorized")
+
+    try:
+        # delete the session of this token in database and its cached verification
+        await arevokeToken(request.COOKIES.get("token"), resolved_token["claims"])
+
+        # delete the cookie named token by calling a method on the reponse object
+        response = APIJsonResponse(True, 200, "User has been logged out.")
+        response.delete_cookie("token")
+
+        return response
+    except Exception:
+        return APIJsonResponse(False, 500, "Internal Server Error.")
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+from ..utils.metrics import render_metrics
+
+
+# the request metrics of this process in the prometheus text format for the prometheus scraper
+@require_GET
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
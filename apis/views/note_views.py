@@ -1,34 +1,94 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from ..utils.renderers import render_json, NDJSONRenderer
 from ..utils.api_response import APIResponse
 from pydantic import ValidationError
 from ..validators.note_validators import (
     CreateNoteValidator,
     UpdateNoteValidator,
     DeleteNoteValidator,
-    AddRemoveCollaboratorValidator,
+    AddRemoveCollaboratorsValidator,
+    GetNotesValidator,
+    SearchNotesValidator,
+    BulkNotesValidator,
+    NoteChangesValidator,
 )
-from auth_sessions.utils import verifyToken
-from users.models import User
-import cloudinary.uploader
 from notes.models import Notes
-from django.db.models import Q
-from ..serializers.note_serializers import NotesSerializer
+from ..serializers.note_serializers import (
+    NotesSerializer,
+    NoteRowsSerializer,
+)
+from ..utils.pagination import visible_notes_keyset, merge_notes, paginate_notes
+from ..utils.note_listing_cache import (
+    notes_listing_etag,
+    etag_matches,
+    cached_listing,
+    cache_listing,
+)
+from ..utils.attachments import (
+    store_files,
+    add_attachments,
+    remove_attachments,
+    note_file_urls,
+)
+from ..utils.upload_handlers import rejected_uploads, rejected_uploads_status
+from ..utils.collaborators import (
+    existing_user_ids,
+    missing_user_ids,
+    note_collaborator_ids,
+    is_collaborator,
+    add_collaborators,
+    remove_collaborators,
+)
+from ..utils.bulk_notes import BulkNoteOperations, validate_operations
+from ..utils.note_changes import (
+    changes_since,
+    note_audience,
+    record_note_changes,
+    record_note_removals,
+)
+from django.db import transaction
+from itertools import islice
+from ..utils.note_search import index_note, unindex_note, search_visible_notes
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+
+# write a new note, its collaborators and its stored files in one transaction, shared by the sync and the async create note views
+def save_new_note(user, validate_data, stored):
+    with transaction.atomic():
+        # create the note document
+        note = Notes.objects.create(
+            user=user,
+            title=validate_data.title,
+            note=validate_data.note,
+        )
+
+        # if the collaborators are given insert them into the through table at once
+        if validate_data.collaborators:
+            add_collaborators(note.id, validate_data.collaborators)
+
+        # attach the files to the note, their previews are made by the preview workers once the note is committed
+        add_attachments(note.id, stored, position=0)
+
+        # add the note to the full text search index
+        index_note(note)
+
+        # move the note past the delta sync cursor of its owner and collaborators, in the same transaction so a note is never committed without a cursor value
+        record_note_changes([note.id])
+
+    return note
 
 
 # create a note view function that will recieve data from the client process them and save those data in the database including optional images, audio files and video files.
 @api_view(["POST"])
 def create_note(request):
-    # pass the request object to the verify token function which will verify the cookie and return the decoded id incase of successful verification
-    decodeToken = verifyToken(request)
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
 
-    # incase the verification was unsuccesful will return False
-    if decodeToken == False:
-        return APIResponse(False, 401, "Unauthorized")
-
-    try:
-        # geting hold of the user
-        found_user = User.objects.get(id=decodeToken)
-    except User.DoesNotExist:
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
     # hold the form data in a dicionary type variable
@@ -39,6 +99,16 @@ def create_note(request):
         "collaborators": request.data.getlist("collaborators"),
     }
 
+    # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+    rejections = rejected_uploads(request)
+    if rejections:
+        return APIResponse(
+            False,
+            rejected_uploads_status(rejections),
+            "File upload rejected.",
+            error=rejections,
+        )
+
     try:
         # validate the data dictionary using a pydantic validator
         validate_data = CreateNoteValidator(**data)
@@ -46,62 +116,71 @@ def create_note(request):
         return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
 
     try:
-        # if the collaborators field is given
-        if validate_data.collaborators != None:
-            invalid_ids = []
-
-            for collaborator in validate_data.collaborators:
-                try:
-                    User.objects.get(id=collaborator)
-                except User.DoesNotExist:
-                    invalid_ids.append(collaborator)
+        # if the collaborators field is given check that all of them exist with a single query
+        if validate_data.collaborators:
+            invalid_ids = missing_user_ids(
+                validate_data.collaborators,
+                existing_user_ids(validate_data.collaborators),
+            )
 
             if invalid_ids:
                 return APIResponse(
                     False, 409, f"Invalid collaborator ID(s): {', '.join(invalid_ids)}"
                 )
 
-        # upload all the files to the cloudinary
-        files_cloudinary_urls = []
-        if len(validate_data.files) > 0:
-            for file in validate_data.files:
-                file_secure_url = cloudinary.uploader.upload(file)["secure_url"]
+        # upload the files to the media storage at the same time, a file whose content is already stored is not uploaded again
+        stored = store_files(validate_data.files, found_user.id)
 
-                files_cloudinary_urls.append(file_secure_url)
-
-        # create the note document
-        note = Notes.objects.create(
-            user=found_user,
-            title=validate_data.title,
-            note=validate_data.note,
-            files=files_cloudinary_urls,
-        )
-
-        # if the collaborators are given updaate the note
-        if validate_data.collaborators != None:
-            collaborator_users = User.objects.filter(id__in=validate_data.collaborators)
-            note.collaborators.set(collaborator_users)
-            note.save()
+        # write the note with its collaborators and files in one transaction
+        save_new_note(found_user, validate_data, stored)
 
         return APIResponse(True, 200, "Note has been created successfully.")
     except Exception:
         return APIResponse(False, 500, "Internal Server Error.")
 
 
+# the files to remove are the ones in remove_files and, for the clients that send the whole list, the current files missing from files_urls
+def files_to_remove(current_files, validate_data):
+    removed_files = set(validate_data.remove_files)
+    if validate_data.files_urls is not None:
+        removed_files.update(current_files)
+        removed_files.difference_update(validate_data.files_urls)
+    removed_files.intersection_update(current_files)
+
+    return removed_files
+
+
+# update the title and the body of a note and only add and remove the attachments that changed, shared by the sync and the async update note views
+def save_note_update(found_note, validate_data, removed_files, stored):
+    with transaction.atomic():
+        found_note.title = validate_data.title
+        found_note.note = validate_data.note
+        found_note.save()
+        remove_attachments(found_note.id, removed_files)
+        add_attachments(found_note.id, stored)
+        index_note(found_note)
+        record_note_changes([found_note.id])
+
+
+# delete a note and its search index entry, the users that could see the note get a tombstone so their delta sync drops it
+def delete_note(found_note):
+    audience = note_audience(found_note)
+
+    with transaction.atomic():
+        unindex_note(found_note.id)
+        note_id = found_note.id
+        found_note.delete()
+        record_note_removals({note_id: audience})
+
+
 # creating a view to let the user or contributer update the note and also have the user delete their note based on their provided note id and http methods provided
 @api_view(["PUT", "DELETE"])
 def update_note(request, note_id):
-    # pass the request object to the verify token function which will verify the cookie and return the decoded id incase of successful verification
-    decodeToken = verifyToken(request)
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
 
-    # incase the verification was unsuccesful will return False
-    if decodeToken == False:
-        return APIResponse(False, 401, "Unauthorized")
-
-    try:
-        # geting hold of the user
-        found_user = User.objects.get(id=decodeToken)
-    except User.DoesNotExist:
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
     if request.method == "PUT":
@@ -109,10 +188,25 @@ def update_note(request, note_id):
             "note_id": note_id,
             "title": request.data.get("title"),
             "note": request.data.get("note"),
-            "files_urls": request.data.getlist("files_urls"),
+            "files_urls": (
+                request.data.getlist("files_urls")
+                if "files_urls" in request.data
+                else None
+            ),
+            "remove_files": request.data.getlist("remove_files"),
             "files": request.FILES.getlist("files"),
         }
 
+        # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+        rejections = rejected_uploads(request)
+        if rejections:
+            return APIResponse(
+                False,
+                rejected_uploads_status(rejections),
+                "File upload rejected.",
+                error=rejections,
+            )
+
         try:
             # after successful authentication it's time to validate the data recieved from this request that includes teh request body and the parameter of note id
             validate_put_method_data = UpdateNoteValidator(**data)
@@ -128,49 +222,35 @@ def update_note(request, note_id):
             return APIResponse(False, 404, "Note not found with this id.")
 
         # check if the user trying to update the note is allowed of their action
-        if (
-            found_user.id != found_note.user.id
-            and found_user.id not in found_note.collaborators
+        if found_user.id != found_note.user_id and not is_collaborator(
+            found_note.id, found_user.id
         ):
             return APIResponse(
                 False, 401, "You are not authorized to update this note."
             )
 
+        # the files of the note that the update removes
+        removed_files = files_to_remove(
+            note_file_urls(found_note.id), validate_put_method_data
+        )
+
         # check if the fields are updated and not the same as it was
         if (
             validate_put_method_data.title == found_note.title
             and validate_put_method_data.note == found_note.note
-            and validate_put_method_data.files_urls == found_note.files
-            and validate_put_method_data.files == None
+            and not removed_files
+            and not validate_put_method_data.files
         ):
             return APIResponse(False, 409, "No changes found to update.")
 
         try:
+            # upload the new files at the same time, a file whose content is already stored is not uploaded again
+            stored = store_files(validate_put_method_data.files, found_user.id)
 
-            # upload the file and hold the secure url if an file has been provided
-            files_cloudinary_urls = []
-            if len(validate_put_method_data.files) > 0:
-                for file in validate_put_method_data.files:
-                    file_secure_url = cloudinary.uploader.upload(file)["secure_url"]
-
-                    files_cloudinary_urls.append(file_secure_url)
-
-            if len(files_cloudinary_urls) > 0:
-                # update the note now
-                found_note.title = validate_put_method_data.title
-                found_note.note = validate_put_method_data.note
-                files = validate_put_method_data.files_urls or []
-                files.extend(files_cloudinary_urls)
-                found_note.files = files
-                found_note.save()
-
-                return APIResponse(True, 200, "Note has been updated.")
-
-            # if no new files are given
-            found_note.title = validate_put_method_data.title
-            found_note.note = validate_put_method_data.note
-            found_note.files = validate_put_method_data.files_urls
-            found_note.save()
+            # update the note and only add and remove the attachments that changed
+            save_note_update(
+                found_note, validate_put_method_data, removed_files, stored
+            )
 
             return APIResponse(True, 200, "Note has been updated.")
 
@@ -197,9 +277,8 @@ def update_note(request, note_id):
             return APIResponse(False, 401, "Unauthorized")
 
         try:
-            # delete the note and return a successful response
-            found_note.delete()
-            found_note.save()
+            # remove the note from the search index, delete the note and return a successful response
+            delete_note(found_note)
 
             return APIResponse(True, 200, "Note has been deleted.")
         except Exception:
@@ -208,57 +287,248 @@ def update_note(request, note_id):
 
 # this api controller function will send back notes of users and collaborator where the user has created or marked as a collaborator
 @api_view(["GET"])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer])
 def get_notes(request):
-    # pass the request object to the verify token function which will verify the cookie and return the decoded id incase of successful verification
-    decodeToken = verifyToken(request)
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
 
-    # incase the verification was unsuccesful will return False
-    if decodeToken == False:
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
+    # hold the query parameters in a dictionary type variable
+    data = {
+        "cursor": request.query_params.get("cursor"),
+        "page_size": request.query_params.get("page_size"),
+        "stream": request.query_params.get("stream", False)
+        or "application/x-ndjson" in request.headers.get("Accept", ""),
+        "expand": request.query_params.get("expand"),
+        "media": request.query_params.get("media", "preview"),
+    }
+
     try:
-        # geting hold of the user
-        found_user = User.objects.get(id=decodeToken)
-    except User.DoesNotExist:
+        # validate the query parameters using a pydantic validator
+        validate_data = GetNotesValidator(**data)
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    page_size = min(
+        validate_data.page_size or settings.NOTES_PAGE_SIZE,
+        settings.NOTES_MAX_PAGE_SIZE,
+    )
+
+    # with expand=collaborators the collaborators are embedded as compact profiles instead of ids, the listing is read as .values() rows converted by the compiled read serializer, by default the preview urls of the files come with the notes and media=original leaves them out
+    note_rows_serializer = NoteRowsSerializer(
+        validate_data.expand == "collaborators",
+        previews=validate_data.media == "preview",
+    )
+
+    # polling clients send back the etag of the last listing they got, if none of their notes changed since then they get an empty 304 after a single aggregate query
+    etag = notes_listing_etag(
+        found_user.id,
+        validate_data.cursor,
+        page_size,
+        validate_data.stream,
+        validate_data.expand,
+        validate_data.media,
+    )
+    if etag_matches(request, etag):
+        return Response(status=304, headers=listing_cache_headers(etag))
+
+    try:
+        # get the notes where the user is the creator or a collaborator ordered by the keyset starting after the cursor, read as an owned and a shared branch, the collaborators of each page are fetched in bulk
+        found_notes = [
+            note_rows_serializer.values(branch)
+            for branch in visible_notes_keyset(found_user.id, validate_data.cursor)
+        ]
+    except ValueError:
+        return APIResponse(False, 400, "Invalid cursor.")
+
+    try:
+        # in streaming mode every note is written as its own json line while the database is read in chunks so memory stays flat for any number of notes
+        if validate_data.stream:
+            return StreamingHttpResponse(
+                stream_notes(found_notes, page_size, note_rows_serializer),
+                content_type="application/x-ndjson",
+                headers=listing_cache_headers(etag),
+            )
+
+        # the serialized page is reused while the etag stays the same
+        payload = cached_listing(etag)
+        if payload is None:
+            # get a single page of notes and the cursor for the next one
+            page_notes, next_cursor = paginate_notes(found_notes, page_size)
+
+            payload = {
+                "data": note_rows_serializer.serialize(page_notes),
+                "meta": {"nextCursor": next_cursor, "pageSize": page_size},
+            }
+            cache_listing(etag, payload)
+
+        return APIResponse(
+            True,
+            200,
+            "Notes have been fetched.",
+            data=payload["data"],
+            meta=payload["meta"],
+            headers=listing_cache_headers(etag),
+        )
+
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
+
+
+# the listing may only be reused by the client after revalidating it with the etag
+def listing_cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+# generator used by the streaming mode of get notes, it yields one serialized note per line in the newline delimited json format
+def stream_notes(found_notes, chunk_size, note_rows_serializer):
+    rows = merge_notes(
+        [branch.iterator(chunk_size=chunk_size) for branch in found_notes]
+    )
+
+    # the collaborators are loaded once per chunk of rows
+    while chunk := list(islice(rows, chunk_size)):
+        for note in note_rows_serializer.serialize(chunk):
+            yield render_json(note) + b"\n"
+
+
+# delta sync for offline clients, sends back only the notes created or updated and the ids of the notes deleted (or unshared) after the client's change cursor
+@api_view(["GET"])
+def get_note_changes(request):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
-    # get all the notes where the user is the creator
+    # hold the query parameters in a dictionary type variable
+    data = {
+        "since": request.query_params.get("since", 0),
+        "page_size": request.query_params.get("page_size"),
+    }
+
     try:
-        # get all the notes where the user is the creator
-        found_notes = Notes.objects.filter(
-            Q(user_id=found_user.id) | Q(collaborators=found_user.id)
-        ).distinct()
+        # validate the query parameters using a pydantic validator
+        validate_data = NoteChangesValidator(**data)
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    page_size = min(
+        validate_data.page_size or settings.NOTES_PAGE_SIZE,
+        settings.NOTES_MAX_PAGE_SIZE,
+    )
 
-        # serialize the notes
-        serialized_found_notes = NotesSerializer(found_notes, many=True)
+    try:
+        # get the changes after the cursor and the cursor to continue from
+        changed_notes, deleted_note_ids, cursor, has_more = changes_since(
+            found_user.id, validate_data.since, page_size
+        )
 
         return APIResponse(
-            True, 200, "Notes have been fetched.", data=serialized_found_notes.data
+            True,
+            200,
+            "Note changes have been fetched.",
+            data={
+                "notes": NotesSerializer(changed_notes, many=True).data,
+                "deleted": [str(note_id) for note_id in deleted_note_ids],
+            },
+            meta={"cursor": cursor, "hasMore": has_more},
         )
 
     except Exception:
         return APIResponse(False, 500, "Internal server error.")
 
 
-@api_view(["POST", "DELETE"])
-def add_remove_collaborator(request, note_id):
-    # pass the request object to the verify token function which will verify the cookie and return the decoded id incase of successful verification
-    decodeToken = verifyToken(request)
+# full text search over the titles and bodies of the notes the user has created or is a collaborator of, the results are ranked by relevance
+@api_view(["GET"])
+def search_notes(request):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
 
-    # incase the verification was unsuccesful will return False
-    if decodeToken == False:
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
+    # hold the query parameters in a dictionary type variable
+    data = {
+        "q": request.query_params.get("q"),
+        "page": request.query_params.get("page", 1),
+        "page_size": request.query_params.get("page_size"),
+    }
+
     try:
-        # geting hold of the user
-        found_user = User.objects.get(id=decodeToken)
-    except User.DoesNotExist:
+        # validate the query parameters using a pydantic validator
+        validate_data = SearchNotesValidator(**data)
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    page_size = min(
+        validate_data.page_size or settings.NOTES_PAGE_SIZE,
+        settings.NOTES_MAX_PAGE_SIZE,
+    )
+
+    try:
+        # one extra note is looked up to know if there is a next page
+        found_notes = search_visible_notes(
+            found_user.id,
+            validate_data.q,
+            limit=page_size + 1,
+            offset=(validate_data.page - 1) * page_size,
+        )
+
+        # serialize the notes of this page
+        serialized_found_notes = NotesSerializer(found_notes[:page_size], many=True)
+
+        return APIResponse(
+            True,
+            200,
+            "Notes have been searched.",
+            data=serialized_found_notes.data,
+            meta={
+                "page": validate_data.page,
+                "pageSize": page_size,
+                "hasNextPage": len(found_notes) > page_size,
+            },
+        )
+
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
+
+
+# add the users as collaborators and move the note past the delta sync cursor
+def save_added_collaborators(note_id, collaborator_ids):
+    with transaction.atomic():
+        add_collaborators(note_id, collaborator_ids)
+        record_note_changes([note_id])
+
+
+# remove the users from the collaborators, the removed users get a tombstone and everyone else sees the note as changed
+def save_removed_collaborators(note_id, collaborator_ids):
+    with transaction.atomic():
+        remove_collaborators(note_id, collaborator_ids)
+        record_note_removals({note_id: collaborator_ids})
+        record_note_changes([note_id])
+
+
+@api_view(["POST", "DELETE"])
+def add_remove_collaborator(request, note_id):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
     try:
 
         # validate the request url parameter and the body for the id of the potential collaborator
-        validated_data = AddRemoveCollaboratorValidator(note_id=note_id, **request.data)
+        validated_data = AddRemoveCollaboratorsValidator(
+            note_id=note_id, **request.data
+        )
     except ValidationError as e:
         return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
 
@@ -269,30 +539,118 @@ def add_remove_collaborator(request, note_id):
     except Notes.DoesNotExist:
         return APIResponse(False, 404, "No note found with this id.")
 
-    try:
-        # check if the provided user's id
-        found_collaborator = User.objects.get(id=validated_data.collaborator_id)
-    except User.DoesNotExist:
-        return APIResponse(False, 404, "No user found with this id.")
+    # only the owner and the collaborators of the note can change its collaborators
+    if found_user.id != found_note.user_id and not is_collaborator(
+        found_note.id, found_user.id
+    ):
+        return APIResponse(
+            False,
+            401,
+            "You are not authorized to change the collaborators of this note.",
+        )
+
+    collaborator_ids = validated_data.collaborator_ids
+
+    # check that every provided user id exists with a single query
+    invalid_ids = missing_user_ids(
+        collaborator_ids, existing_user_ids(collaborator_ids)
+    )
+    if invalid_ids:
+        return APIResponse(
+            False, 404, "No user found with this id.", error={"invalidIds": invalid_ids}
+        )
 
     # check if the user himself is trying to make changes of himself as a collaborator
-    if found_user == found_collaborator:
+    if found_user.id in collaborator_ids:
         return APIResponse(False, 409, "Can not make changes of yourself.")
 
-    # if the request made to this url is a post we will add a collaborator of this id
+    # the users of the request that already are collaborators of the note
+    current_collaborator_ids = note_collaborator_ids(found_note.id, collaborator_ids)
+
+    # if the request made to this url is a post we will add the collaborators of these ids
     if request.method == "POST":
-        # check if the user is already a collaborator
-        if found_note.collaborators.filter(id=found_collaborator.id).exists():
+        new_collaborator_ids = [
+            collaborator_id
+            for collaborator_id in collaborator_ids
+            if collaborator_id not in current_collaborator_ids
+        ]
+
+        # check if the users are already collaborators
+        if not new_collaborator_ids:
             return APIResponse(False, 409, "This user is already a collaborator.")
 
-        # save the user as a collaborator
-        found_note.collaborators.add(found_collaborator)
-        return APIResponse(True, 200, "This user has been added as a collaborator.")
+        # save the users as collaborators with one insert
+        save_added_collaborators(found_note.id, new_collaborator_ids)
+
+        return APIResponse(
+            True,
+            200,
+            "This user has been added as a collaborator.",
+            data={"added": new_collaborator_ids},
+        )
     elif request.method == "DELETE":
-        # check if the user is not in the collaborators
-        if found_note.collaborators.filter(id=found_collaborator.id).exists() == False:
+        removed_collaborator_ids = [
+            collaborator_id
+            for collaborator_id in collaborator_ids
+            if collaborator_id in current_collaborator_ids
+        ]
+
+        # check if the users are not in the collaborators
+        if not removed_collaborator_ids:
             return APIResponse(False, 409, "This user is not a collaborator.")
 
-        # save the user as a collaborator
-        found_note.collaborators.remove(found_collaborator)
-        return APIResponse(True, 200, "This user has been removed from a collaborator.")
+        # remove the users from the collaborators with one delete
+        save_removed_collaborators(found_note.id, removed_collaborator_ids)
+
+        return APIResponse(
+            True,
+            200,
+            "This user has been removed from a collaborator.",
+            data={"removed": removed_collaborator_ids},
+        )
+
+
+# run a batch of note operations (create, update, delete, add_collaborator, remove_collaborator) in a single request and a single transaction, used by the sync clients to replay their offline edits
+@api_view(["POST"])
+def bulk_notes(request):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
+        return APIResponse(False, 401, "Unauthorized")
+
+    # the body has to be an object holding the list of operations, a bare list or a scalar is rejected before it is validated
+    if not isinstance(request.data, dict):
+        return APIResponse(
+            False, 400, "The request body must be an object with a list of operations."
+        )
+
+    try:
+        # validate the request body holding the list of operations
+        validate_data = BulkNotesValidator(operations=request.data.get("operations"))
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    if len(validate_data.operations) > settings.NOTES_BULK_MAX_OPERATIONS:
+        return APIResponse(
+            False,
+            413,
+            f"A bulk request can have at most {settings.NOTES_BULK_MAX_OPERATIONS} operations.",
+        )
+
+    # validate every operation before anything is written, a single invalid operation rejects the whole batch
+    validated_operations, invalid_results = validate_operations(
+        validate_data.operations
+    )
+    if invalid_results:
+        return APIResponse(
+            False, 400, "Failed in type validation.", error=invalid_results
+        )
+
+    try:
+        results = BulkNoteOperations(found_user, validated_operations).run()
+
+        return APIResponse(True, 200, "Bulk operations have been run.", data=results)
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
@@ -0,0 +1,305 @@
+from rest_framework.decorators import api_view
+from ..utils.api_response import APIResponse
+from pydantic import ValidationError
+from ..validators.note_validators import (
+    StartUploadValidator,
+    UploadChunkValidator,
+    FinishUploadValidator,
+)
+from notes.models import Notes, NoteUpload
+from ..utils.media_storage import get_media_storage, COPY_CHUNK_SIZE
+from ..utils.metrics import timed
+from ..utils.upload_handlers import SNIFF_LENGTH, sniff_content_types
+from ..utils.note_changes import record_note_changes
+from ..utils.attachments import add_attachments
+from django.db import transaction
+from django.conf import settings
+from django.utils import timezone
+
+
+# the largest chunk a single request can carry, it is raised to the smallest chunk the media storage accepts
+def upload_chunk_size(storage):
+    return max(settings.NOTE_UPLOAD_CHUNK_SIZE, storage.min_chunk_size)
+
+
+# the unfinished upload of the user with this id, None when it does not exist or has expired
+def find_upload(user, upload_id):
+    return NoteUpload.objects.filter(
+        id=upload_id, user=user, expires_at__gt=timezone.now()
+    ).first()
+
+
+# the progress of an upload, the clients resume from the offset after a dropped connection
+def upload_progress(upload, storage):
+    return {
+        "uploadId": upload.id,
+        "offset": upload.offset,
+        "size": upload.size,
+        "chunkSize": upload_chunk_size(storage),
+    }
+
+
+# read the body of a chunk request from the request stream a piece at a time, the body is never parsed or spooled by django so a request holds at most one chunk in memory
+def read_chunk(request, length):
+    data = bytearray()
+    while len(data) < length:
+        piece = request.stream.read(min(COPY_CHUNK_SIZE, length - len(data)))
+        if not piece:
+            break
+        data.extend(piece)
+
+    return bytes(data)
+
+
+# start a resumable upload of a note attachment, the client sends the chunks to the upload url and finishes the upload by attaching it to a note
+@api_view(["POST"])
+def start_upload(request):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
+        return APIResponse(False, 401, "Unauthorized")
+
+    # the body has to be an object with the fields of the file, a bare list or a scalar is rejected before it is validated
+    if not isinstance(request.data, dict):
+        return APIResponse(False, 400, "The request body must be an object.")
+
+    try:
+        # validate the name, the content type and the total size of the file that will be uploaded
+        validated_data = StartUploadValidator(**request.data)
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    storage = get_media_storage()
+
+    try:
+        # create the partial file in the media storage and the upload that tracks its progress
+        upload = NoteUpload.objects.create(
+            user=found_user,
+            filename=validated_data.filename,
+            content_type=validated_data.content_type,
+            size=validated_data.size,
+            storage_key=storage.start_upload(
+                validated_data.filename, validated_data.size
+            ),
+        )
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
+
+    return APIResponse(
+        True, 201, "Upload has been started.", data=upload_progress(upload, storage)
+    )
+
+
+# the upload url, get returns the offset to resume from, put writes the next chunk of the file at the offset of the Upload-Offset header and delete abandons the upload
+@api_view(["GET", "PUT", "DELETE"])
+def upload_chunk(request, upload_id):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
+        return APIResponse(False, 401, "Unauthorized")
+
+    try:
+        # validate the upload id and for a chunk the offset it starts at
+        validated_data = UploadChunkValidator(
+            upload_id=upload_id,
+            offset=request.headers.get("Upload-Offset", 0),
+        )
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    # check if the upload exists and belongs to the user
+    upload = find_upload(found_user, validated_data.upload_id)
+    if upload is None:
+        return APIResponse(False, 404, "No upload found with this id.")
+
+    storage = get_media_storage()
+
+    if request.method == "GET":
+        return APIResponse(
+            True,
+            200,
+            "Upload progress.",
+            data=upload_progress(upload, storage),
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    if request.method == "DELETE":
+        try:
+            storage.abort_upload(upload.storage_key)
+            upload.delete()
+        except Exception:
+            return APIResponse(False, 500, "Internal server error.")
+
+        return APIResponse(True, 200, "Upload has been cancelled.")
+
+    offset = validated_data.offset
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+
+    # the chunk has to continue the upload where it stopped, a client that lost track of it can ask for the offset again
+    if offset != upload.offset:
+        return APIResponse(
+            False,
+            409,
+            "The offset does not match the received bytes of the upload.",
+            error=upload_progress(upload, storage),
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    # check the chunk length before anything is read from the body
+    if length == 0:
+        return APIResponse(False, 400, "The chunk is empty.")
+
+    if length > upload_chunk_size(storage):
+        return APIResponse(
+            False,
+            413,
+            f"Chunk too large, max {upload_chunk_size(storage)} bytes.",
+        )
+
+    if offset + length > upload.size:
+        return APIResponse(False, 400, "The chunk goes past the size of the upload.")
+
+    if offset + length < upload.size and length < storage.min_chunk_size:
+        return APIResponse(
+            False,
+            400,
+            f"Chunk too small, only the last chunk can be under {storage.min_chunk_size} bytes.",
+        )
+
+    data = read_chunk(request, length)
+
+    # a dropped connection leaves the chunk incomplete, it is not written and the client sends it again
+    if len(data) != length:
+        return APIResponse(False, 400, "The chunk was not fully received.")
+
+    # the first chunk has to hold the kind of file the upload was started for
+    if offset == 0 and upload.content_type not in sniff_content_types(
+        data[:SNIFF_LENGTH]
+    ):
+        return APIResponse(
+            False, 400, "The file content does not match its content type."
+        )
+
+    try:
+        with transaction.atomic():
+            # claim the offset before the chunk is written, the conditional update locks the upload row so a concurrent request for the same offset waits and then finds the offset moved instead of writing over the accepted bytes
+            claimed = NoteUpload.objects.filter(id=upload.id, offset=offset).update(
+                updated_at=timezone.now()
+            )
+
+            if claimed:
+                # the time spent writing the chunk to the media storage is reported by the request metrics
+                with timed("upload"):
+                    url = storage.write_chunk(
+                        upload.storage_key, offset, data, upload.size
+                    )
+
+                NoteUpload.objects.filter(id=upload.id).update(
+                    offset=offset + length, url=url or upload.url
+                )
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
+
+    if not claimed:
+        upload.refresh_from_db()
+        return APIResponse(
+            False,
+            409,
+            "The offset does not match the received bytes of the upload.",
+            error=upload_progress(upload, storage),
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    upload.offset = offset + length
+
+    return APIResponse(
+        True,
+        200,
+        "Chunk has been received.",
+        data=upload_progress(upload, storage),
+        headers={"Upload-Offset": str(upload.offset)},
+    )
+
+
+# finish a fully sent upload and attach the stored file to a note the user owns or collaborates on
+@api_view(["POST"])
+def finish_upload(request, upload_id):
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
+
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
+        return APIResponse(False, 401, "Unauthorized")
+
+    # the body has to be an object with the note id, a bare list or a scalar is rejected before it is validated
+    if not isinstance(request.data, dict):
+        return APIResponse(False, 400, "The request body must be an object.")
+
+    try:
+        # validate the upload id of the url and the note id of the body
+        validated_data = FinishUploadValidator(upload_id=upload_id, **request.data)
+    except ValidationError as e:
+        return APIResponse(False, 400, "Failed in type validation.", error=e.errors())
+
+    # check if the upload exists and belongs to the user
+    upload = find_upload(found_user, validated_data.upload_id)
+    if upload is None:
+        return APIResponse(False, 404, "No upload found with this id.")
+
+    storage = get_media_storage()
+
+    # check if every byte of the file has been received
+    if upload.offset != upload.size:
+        return APIResponse(
+            False,
+            409,
+            "The upload is not complete.",
+            error=upload_progress(upload, storage),
+        )
+
+    # check if the note exists and the user can edit it
+    if (
+        not Notes.objects.visible_to(found_user.id)
+        .filter(id=validated_data.note_id)
+        .exists()
+    ):
+        return APIResponse(False, 404, "Note not found with this id.")
+
+    try:
+        # the url is kept on the upload so a retried request does not finish the stored file twice
+        if not upload.url:
+            with timed("upload"):
+                upload.url = storage.finish_upload(upload.storage_key)
+            upload.save(update_fields=["url", "updated_at"])
+
+        # the note row is locked while the file is attached after its last file so concurrent attachments do not take the same position
+        with transaction.atomic():
+            found_note = Notes.objects.select_for_update().get(
+                id=validated_data.note_id
+            )
+            found_note.save(update_fields=["updated_at"])
+            add_attachments(
+                found_note.id,
+                [
+                    {
+                        "url": upload.url,
+                        "content_type": upload.content_type,
+                        "size": upload.size,
+                    }
+                ],
+            )
+            record_note_changes([found_note.id])
+            upload.delete()
+    except Exception:
+        return APIResponse(False, 500, "Internal server error.")
+
+    return APIResponse(
+        True,
+        200,
+        "Upload has been attached to the note.",
+        data={"noteId": found_note.id, "url": upload.url},
+    )
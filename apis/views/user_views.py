@@ -7,10 +7,14 @@ from ..validators.user_validators import (
     GetUserValidator,
 )
 from users.models import User
-import bcrypt
-import cloudinary.uploader
-from auth_sessions.utils import initializeToken, verifyToken
-from auth_sessions.models import Session
+from ..utils.passwords import (
+    hash_password,
+    check_password,
+    password_needs_rehash,
+)
+from ..utils.media_storage import get_media_storage
+from ..utils.upload_handlers import rejected_uploads, rejected_uploads_status
+from auth_sessions.utils import initializeToken, revokeToken
 from rest_framework.response import Response
 from django.utils import timezone
 from ..serializers.user_serializers import UsersSerializer
@@ -26,6 +30,16 @@ def create_or_get_user(request):
             "password": request.data.get("password"),
         }
 
+        # the upload handler stops a file as soon as its content or its size is not allowed, the rest of the request is not read
+        rejections = rejected_uploads(request)
+        if rejections:
+            return APIResponse(
+                False,
+                rejected_uploads_status(rejections),
+                "File upload rejected.",
+                error=rejections,
+            )
+
         # make the data go through a pydentic validator to check for the expected data type
         try:
             validate_data = CreateUserValidator(**data)
@@ -39,23 +53,20 @@ def create_or_get_user(request):
             return APIResponse(False, 409, "User with this email already exists.")
 
         try:
-            # hash the user's password
-            generated_salt = bcrypt.gensalt()
-            hashed_password = bcrypt.hashpw(
-                validate_data.password.encode("utf-8"), generated_salt
-            )
+            # hash the user's password on the password hashing pool
+            hashed_password = hash_password(validate_data.password)
 
-            # upload the image to cloudinary and hold the secure url
-            profile_picture_secure_url = cloudinary.uploader.upload(
+            # upload the image to the media storage and hold the secure url
+            profile_picture_secure_url = get_media_storage().save(
                 validate_data.profile_picture
-            )["secure_url"]
+            )
 
             # create a user
             User.objects.create(
                 name=validate_data.name,
                 email=validate_data.email,
                 profile_picture_url=profile_picture_secure_url,
-                password=hashed_password.decode(),
+                password=hashed_password,
             )
 
             return APIResponse(True, 201, "User has been created.")
@@ -106,15 +117,16 @@ def login(request):
         return APIResponse(False, 409, "Invalid Credentials.")
 
     # check if the password is correct
-    if (
-        bcrypt.checkpw(
-            validate_data.password.encode("utf-8"), found_user.password.encode("utf-8")
-        )
-    ) == False:
+    if check_password(validate_data.password, found_user.password) == False:
         return APIResponse(False, 409, "Invalid Credentials.")
 
     # initialize the token and send reponse to the client
     try:
+        # the password is hashed again when the configured work factor has changed since it was stored
+        if password_needs_rehash(found_user.password):
+            found_user.password = hash_password(validate_data.password)
+            found_user.save(update_fields=["password", "updated_at"])
+
         token = initializeToken(found_user)
         return APIResponse(True, 200, "User has been logged in.", cookie=token)
     except Exception:
@@ -123,22 +135,16 @@ def login(request):
 
 @api_view(["POST"])
 def logout(request):
-    # pass the request object to the verify token function which will verify the cookie and return the decoded id incase of successful verification
-    decodeToken = verifyToken(request)
-
-    # incase the verification was unsuccesful will return False
-    if decodeToken == False:
-        return APIResponse(False, 401, "Unauthorized")
+    # the logged in user is resolved from the token cookie by the authentication class before the view runs
+    found_user = request.user
 
-    try:
-        # geting hold of the user
-        found_user = User.objects.get(id=decodeToken)
-    except User.DoesNotExist:
+    # incase the verification was unsuccesful the user is anonymous
+    if not found_user.is_authenticated:
         return APIResponse(False, 401, "Unauthorized")
 
     try:
-        # delete the session in database
-        Session.objects.filter(user=found_user).delete()
+        # delete the session of this token in database, the other devices of the user stay logged in
+        revokeToken(request.COOKIES.get("token"), request.auth)
 
         # return response to the client
         response = Response(
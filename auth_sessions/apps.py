@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class AuthSessionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auth_sessions'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from users.models import User
+        from .utils import token_cache
+
+        # the sessions of a deleted user go away with the cascade, its verified tokens are dropped from the token cache of this process as well
+        def invalidate_user_tokens(sender, instance, **kwargs):
+            token_cache.invalidate_user(instance.pk)
+
+        post_delete.connect(invalidate_user_tokens, sender=User, weak=False)
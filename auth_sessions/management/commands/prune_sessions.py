@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from auth_sessions.models import Session
+
+
+# deletes the expired sessions in small batches so the sessions table is never locked for long, meant to be run periodically from cron or a scheduler
+class Command(BaseCommand):
+    help = "Delete expired login sessions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        pruned = 0
+
+        while True:
+            # the expired sessions are found through the expires_at index
+            expired_ids = list(
+                Session.objects.filter(expires_at__lte=now).values_list(
+                    "id", flat=True
+                )[: options["batch_size"]]
+            )
+            if not expired_ids:
+                break
+
+            deleted, _ = Session.objects.filter(id__in=expired_ids).delete()
+            pruned += deleted
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(f"Pruned {pruned} expired sessions.")
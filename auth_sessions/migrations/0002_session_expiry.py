@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:57
+
+import auth_sessions.models
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# the tokens issued before this migration carry no session id and are no longer accepted, so their sessions are expired right away for prune_sessions to remove
+def expire_existing_sessions(apps, schema_editor):
+    Session = apps.get_model("auth_sessions", "Session")
+    Session.objects.update(expires_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth_sessions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="session",
+            name="expires_at",
+            field=models.DateTimeField(
+                db_index=True, default=auth_sessions.models.session_expiry
+            ),
+        ),
+        migrations.RunPython(expire_existing_sessions, migrations.RunPython.noop),
+    ]
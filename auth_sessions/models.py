@@ -2,6 +2,13 @@ from django.db import models
 from uuid import uuid4
 from users.models import User
 from django.utils import timezone
+from django.conf import settings
+from datetime import timedelta
+
+
+# the time a new session stays valid, the token of the session expires at the same time
+def session_expiry():
+    return timezone.now() + timedelta(seconds=settings.AUTH_SESSION_TTL)
 
 
 # Create your models here.
@@ -10,6 +17,8 @@ class Session(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # indexed so the expired sessions can be pruned in batches
+    expires_at = models.DateTimeField(default=session_expiry, db_index=True)
 
     def __str__(self):
         return f"Session for {self.user.email}"
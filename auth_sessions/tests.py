@@ -1,3 +1,247 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from users.models import User
+from .models import Session
+from .utils import (
+    TokenCache,
+    initializeToken,
+    decodeToken,
+    revokeToken,
+    tokenUserQuery,
+    token_cache,
+)
+from apis.testing import AuthenticatedTestCase, QueryPlanAssertions
 
-# Create your tests here.
+
+# captures the sqlite query plan of the lookups done on every authenticated request and fails when one of them falls back to a full scan
+@skipUnless(connection.vendor == "sqlite", "Query plans are captured for sqlite.")
+class SessionQueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="owner", email="owner@example.com", password="x")
+        cls.session = Session.objects.create(user=cls.user)
+
+    def test_token_user_lookup(self):
+        self.assertNoFullScan(
+            tokenUserQuery({"id": str(self.user.id), "jti": str(self.session.id)})[:1]
+        )
+
+    def test_expired_sessions_lookup(self):
+        self.assertNoFullScan(
+            Session.objects.filter(expires_at__lte=timezone.now()).values_list(
+                "id", flat=True
+            )[:1000]
+        )
+
+    def test_sessions_of_a_user(self):
+        self.assertNoFullScan(Session.objects.filter(user=self.user))
+
+    def test_login_lookup_by_email(self):
+        self.assertNoFullScan(User.objects.filter(email=self.user.email))
+
+
+# every token belongs to its own session and stops working when that session is deleted or expires
+class SessionTokenTests(AuthenticatedTestCase):
+    def test_logout_only_ends_its_own_session(self):
+        first_token = initializeToken(self.user)
+        second_token = initializeToken(self.user)
+
+        self.client.cookies["token"] = first_token
+        self.assertEqual(self.client.post("/api/v1/users/logout/").status_code, 200)
+
+        self.assertEqual(self.get_notes(token=first_token).status_code, 401)
+        self.assertEqual(self.get_notes(token=second_token).status_code, 200)
+        self.assertEqual(Session.objects.filter(user=self.user).count(), 1)
+
+    def test_token_needs_its_own_session(self):
+        token = initializeToken(self.user)
+        Session.objects.filter(id=decodeToken(token)["jti"]).delete()
+
+        # another session of the same user does not make the token valid
+        Session.objects.create(user=self.user)
+
+        self.assertEqual(self.get_notes(token=token).status_code, 401)
+
+    def test_expired_session_is_rejected(self):
+        token = initializeToken(self.user)
+        Session.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.get_notes(token=token).status_code, 401)
+
+    def test_prune_sessions_deletes_only_expired_sessions(self):
+        Session.objects.bulk_create(
+            Session(user=self.user, expires_at=timezone.now() - timedelta(days=1))
+            for _ in range(5)
+        )
+        active_session = Session.objects.create(user=self.user)
+
+        output = StringIO()
+        call_command("prune_sessions", batch_size=2, stdout=output)
+
+        self.assertEqual(list(Session.objects.all()), [active_session])
+        self.assertIn("Pruned 5 expired sessions.", output.getvalue())
+
+
+# the verified tokens are kept for a limited time and a limited number of entries and are dropped as soon as their session ends in this process
+class TokenCacheTests(AuthenticatedTestCase):
+    def test_entries_expire_after_the_ttl(self):
+        cache = TokenCache(max_size=10, ttl=60)
+
+        with mock.patch("auth_sessions.utils.time.monotonic", return_value=1000):
+            cache.set("token", {}, self.user)
+        with mock.patch("auth_sessions.utils.time.monotonic", return_value=1059):
+            self.assertIsNotNone(cache.get("token"))
+        with mock.patch("auth_sessions.utils.time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("token"))
+
+    def test_entries_do_not_outlive_the_token(self):
+        cache = TokenCache(max_size=10, ttl=60)
+
+        with mock.patch("auth_sessions.utils.time.monotonic", return_value=1000):
+            cache.set("token", {"exp": time.time() + 10}, self.user)
+        with mock.patch("auth_sessions.utils.time.monotonic", return_value=1011):
+            self.assertIsNone(cache.get("token"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set("first", {}, self.user)
+        cache.set("second", {}, self.user)
+
+        # reading the first token makes the second one the least recently used
+        cache.get("first")
+        cache.set("third", {}, self.user)
+
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        token = initializeToken(self.user)
+        self.get_notes(token=token)
+
+        self.assertIsNotNone(token_cache.get(token))
+        with mock.patch("auth_sessions.utils.tokenUserQuery") as token_user_query:
+            self.assertEqual(self.get_notes(token=token).status_code, 200)
+        token_user_query.assert_not_called()
+
+    def test_cached_token_fails_after_logout(self):
+        token = initializeToken(self.user)
+        self.assertEqual(self.get_notes(token=token).status_code, 200)
+
+        self.client.post("/api/v1/users/logout/")
+
+        self.assertIsNone(token_cache.get(token))
+        self.assertEqual(self.get_notes(token=token).status_code, 401)
+
+    def test_cached_token_fails_after_revocation(self):
+        token = initializeToken(self.user)
+        self.assertEqual(self.get_notes(token=token).status_code, 200)
+
+        revokeToken(token, decodeToken(token))
+
+        self.assertEqual(self.get_notes(token=token).status_code, 401)
+
+    def test_cached_tokens_fail_after_the_user_is_deleted(self):
+        other_user = User.objects.create(
+            name="other", email="other@example.com", password="x"
+        )
+        tokens = [initializeToken(self.user), initializeToken(self.user)]
+        other_token = initializeToken(other_user)
+        for token in tokens + [other_token]:
+            self.assertEqual(self.get_notes(token=token).status_code, 200)
+
+        User.objects.filter(id=self.user.id).delete()
+
+        for token in tokens:
+            self.assertIsNone(token_cache.get(token))
+            self.assertEqual(self.get_notes(token=token).status_code, 401)
+        self.assertIsNotNone(token_cache.get(other_token))
+
+
+# a view that needs a logged in user through the rest framework's own permission check
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def whoami(request):
+    return Response({"id": str(request.user.id), "jti": request.auth["jti"]})
+
+
+# the token cookie is resolved into request.user by the authentication class before the views run, a missing, invalid or expired token leaves the request anonymous
+class CookieTokenAuthenticationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+
+    def whoami(self, token=None):
+        request = self.factory.get("/whoami/")
+        if token is not None:
+            request.COOKIES["token"] = token
+
+        return whoami(request)
+
+    def assertUnauthorized(self, response):
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            {
+                key: value
+                for key, value in response.json().items()
+                if key in ("success", "statusCode", "message", "data")
+            },
+            {
+                "success": False,
+                "statusCode": 401,
+                "message": "Unauthorized",
+                "data": None,
+            },
+        )
+
+    def test_missing_cookie_is_unauthorized(self):
+        self.assertUnauthorized(self.client.get("/api/v1/notes/getnotes/"))
+
+    def test_invalid_cookie_is_unauthorized(self):
+        self.client.cookies["token"] = "not-a-token"
+        self.assertUnauthorized(self.client.get("/api/v1/notes/getnotes/"))
+
+        # a token signed with another secret
+        with mock.patch("auth_sessions.utils.ENV_SECRET_KEY", "other-secret"):
+            self.client.cookies["token"] = initializeToken(self.user)
+        self.assertUnauthorized(self.client.get("/api/v1/notes/getnotes/"))
+
+    def test_expired_cookie_is_unauthorized(self):
+        with mock.patch(
+            "auth_sessions.models.Session.objects.create",
+            return_value=Session(
+                user=self.user, expires_at=timezone.now() - timedelta(seconds=1)
+            ),
+        ):
+            self.client.cookies["token"] = initializeToken(self.user)
+
+        self.assertUnauthorized(self.client.get("/api/v1/notes/getnotes/"))
+
+    def test_authenticated_request_sets_the_user_and_the_claims(self):
+        token = initializeToken(self.user)
+
+        response = self.whoami(token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data, {"id": str(self.user.id), "jti": decodeToken(token)["jti"]}
+        )
+
+    def test_rest_framework_rejects_anonymous_requests_with_a_401(self):
+        for token in (None, "not-a-token"):
+            with self.subTest(token=token):
+                response = self.whoami(token)
+
+                # without an authenticate header the rest framework would answer with a 403
+                self.assertEqual(response.status_code, 401)
+                self.assertIn('cookie-name="token"', response["WWW-Authenticate"])
@@ -1,46 +1,202 @@
 import jwt
+import math
 import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils import timezone
 from .models import Session
+from users.models import User
+from apis.utils.metrics import timed
 
 ENV_SECRET_KEY = os.getenv("JWT_SECRET")
 
 
+# a small thread safe lru cache with a time to live that holds the decoded claims and the resolved user of already verified tokens, so a repeated auth check costs no database round trips
+class TokenCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+
+            if entry is None:
+                return None
+
+            # drop the entry if it has outlived the time to live
+            if entry["expires_at"] < time.monotonic():
+                del self._entries[token]
+                return None
+
+            # mark the entry as the most recently used one
+            self._entries.move_to_end(token)
+            return entry
+
+    def set(self, token, claims, user):
+        # an entry never outlives the expiry of the token itself
+        ttl = min(self.ttl, claims.get("exp", math.inf) - time.time())
+
+        entry = {
+            "claims": claims,
+            "user": user,
+            "expires_at": time.monotonic() + ttl,
+        }
+
+        with self._lock:
+            self._entries[token] = entry
+            self._entries.move_to_end(token)
+
+            # evict the least recently used entries once the cache is full
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    # drop every cached token of a user, the cached user object would keep the tokens of a deleted user working until they expire
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in [
+                token
+                for token, entry in self._entries.items()
+                if entry["user"].pk == user_id
+            ]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# the process wide cache, the time to live bounds how long a logout done in another worker process can go unnoticed
+token_cache = TokenCache(
+    max_size=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL
+)
+
+
 # there will be 2 function for authentication a initialize token and verification of token
 def initializeToken(user):  # take the user dictionary as the parameter
     try:
-        # encode and sign the token with id, secret and the preffered algorithm
+        # save the session in the database, its id is the jti claim of the token so a token is only valid while its own session exists
+        session = Session.objects.create(user=user)
+
+        # encode and sign the token with id, session id, expiry, secret and the preffered algorithm
         encoded_jwt = jwt.encode(
-            {"id": str(user.id)}, ENV_SECRET_KEY, algorithm="HS256"
+            {
+                "id": str(user.id),
+                "jti": str(session.id),
+                "exp": session.expires_at,
+            },
+            ENV_SECRET_KEY,
+            algorithm="HS256",
         )
 
-        # save the session in the database
-        Session.objects.create(user=user)
-
         return encoded_jwt  # return the token from the function
     except Exception:
         raise RuntimeError("An error occured in initializeToken function.")
 
 
-def verifyToken(request):  # get the request object as the parameter from the view
+# decode and verify the signature and the expiry of a token, returns the claims or None when the token is invalid or was issued without a session id
+def decodeToken(cookie_token):
+    try:
+        # decode the token with cookie, secret and algorithms
+        return jwt.decode(
+            cookie_token,
+            ENV_SECRET_KEY,
+            algorithms=["HS256"],
+            options={"require": ["exp", "jti"]},
+        )
+    except jwt.InvalidTokenError:
+        return None
+
+
+# the query that gets hold of the user of a token only if the session of the token still exists and has not expired, the session is looked up by its primary key so the cost does not grow with the sessions table
+def tokenUserQuery(decode_token):
+    return User.objects.filter(
+        id=decode_token.get("id"),
+        session__id=decode_token.get("jti"),
+        session__expires_at__gt=timezone.now(),
+    )
+
+
+# decode the cookie token and resolve its user, the result is served from the token cache when the token has been verified recently
+def resolveToken(request):
     # the cookie token from the request
     cookie_token = request.COOKIES.get("token")
 
     # if there is no token
     if cookie_token == None:
-        return False
+        return None
 
-    # decode the token with cookie, secret and algorithms
-    decode_token = jwt.decode(cookie_token, ENV_SECRET_KEY, algorithms=["HS256"])
+    # a cache hit skips the signature check and the database
+    cached_entry = token_cache.get(cookie_token)
+    if cached_entry is not None:
+        return cached_entry
 
-    # if the decode method has failed to verify
-    if decode_token == False:
-        return False
+    decode_token = decodeToken(cookie_token)
+    if decode_token is None:
+        return None
+
+    found_user = tokenUserQuery(decode_token).first()
+    if found_user is None:
+        return None
 
-    # check if the sessions exists
-    found_session = Session.objects.filter(user=decode_token.get("id"))
+    return token_cache.set(cookie_token, decode_token, found_user)
+
+
+# the async version of resolve token used by the async views, the cache is in memory so only a cache miss awaits the database
+async def aresolveToken(request):
+    cookie_token = request.COOKIES.get("token")
+
+    if cookie_token == None:
+        return None
 
-    if not found_session.exists():
+    cached_entry = token_cache.get(cookie_token)
+    if cached_entry is not None:
+        return cached_entry
+
+    decode_token = decodeToken(cookie_token)
+    if decode_token is None:
+        return None
+
+    found_user = await tokenUserQuery(decode_token).afirst()
+    if found_user is None:
+        return None
+
+    return token_cache.set(cookie_token, decode_token, found_user)
+
+
+# the async views resolve the logged in user with this, the sync views get it from the cookie token authentication class of rest framework, both go through resolve token so there is one token check
+async def averifyUser(request):
+    # the time spent on authentication is reported by the request metrics
+    with timed("auth"):
+        resolved_token = await aresolveToken(request)
+
+    if resolved_token is None:
         return False
 
-    # return the decoded id to the view it was called from
-    return decode_token.get("id")
+    return resolved_token["user"]
+
+
+# end the session of a token on logout, the session row is deleted and the cached verification of the token is dropped so it stops working right away in this process
+def revokeToken(cookie_token, decode_token):
+    Session.objects.filter(
+        id=decode_token.get("jti"), user_id=decode_token.get("id")
+    ).delete()
+    token_cache.invalidate(cookie_token)
+
+
+# the async version of revoke token
+async def arevokeToken(cookie_token, decode_token):
+    await Session.objects.filter(
+        id=decode_token.get("jti"), user_id=decode_token.get("id")
+    ).adelete()
+    token_cache.invalidate(cookie_token)
@@ -66,6 +66,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "apis.middleware.RequestMetricsMiddleware",
 ]
 
 ROOT_URLCONF = "google_keep_notes_clone_apis.urls"
@@ -92,12 +93,65 @@ WSGI_APPLICATION = "google_keep_notes_clone_apis.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# the database is picked with DB_ENGINE, sqlite for development and single server deployments or postgresql for production
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+# connections are kept open between requests for DB_CONN_MAX_AGE seconds (0 closes them after every request, like django's default) and checked before being reused
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", 600))
+DB_CONN_HEALTH_CHECKS = os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true"
+
+# the empty variables of the .env.sample fall back to the defaults
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME") or "google_keep_notes_clone",
+            "USER": os.getenv("DB_USER") or "postgres",
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST") or "localhost",
+            "PORT": os.getenv("DB_PORT") or "5432",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+            "OPTIONS": {},
+        }
     }
-}
+
+    # psycopg 3 connection pool shared by the threads of a process, it replaces the persistent connections so CONN_MAX_AGE has to be 0
+    if os.getenv("DB_POOL", "false").lower() == "true":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 20)),
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME") or BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+            "OPTIONS": {
+                # seconds a connection waits for the write lock before failing with database is locked
+                "timeout": int(os.getenv("SQLITE_TIMEOUT", 20)),
+            },
+        }
+    }
+
+    # the write ahead log lets readers run while a write is in progress, the write transactions take the lock up front so two writers never deadlock upgrading their read locks
+    if os.getenv("SQLITE_WAL", "true").lower() == "true":
+        DATABASES["default"]["OPTIONS"].update(
+            {
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA cache_size=-20000;"
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA mmap_size=134217728;"
+                ),
+            }
+        )
 
 
 # Password validation
@@ -132,6 +186,87 @@ USE_TZ = True
 
 APPEND_SLASH=False
 
+# notes listing pagination, the page size can be picked by the client with the page_size query parameter up to the max
+NOTES_PAGE_SIZE = int(os.getenv("NOTES_PAGE_SIZE", 50))
+NOTES_MAX_PAGE_SIZE = int(os.getenv("NOTES_MAX_PAGE_SIZE", 500))
+
+# cache used for the serialized notes listings, the in process memory cache by default or any django cache backend like redis
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# how long in seconds a serialized notes listing page is kept in the cache, 0 turns the cache off
+NOTES_LISTING_CACHE_TIMEOUT = int(os.getenv("NOTES_LISTING_CACHE_TIMEOUT", 300))
+
+# the most operations a single notes/bulk/ request can carry
+NOTES_BULK_MAX_OPERATIONS = int(os.getenv("NOTES_BULK_MAX_OPERATIONS", 500))
+
+# django rest framework resolves the logged in user from the token cookie once per request
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "auth_sessions.authentication.CookieTokenAuthentication",
+    ],
+    # the json renderer uses orjson when it is installed, API_JSON_RENDERER can switch back to rest_framework.renderers.JSONRenderer
+    "DEFAULT_RENDERER_CLASSES": [
+        os.getenv("API_JSON_RENDERER", "apis.utils.renderers.FastJSONRenderer"),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# the backend the uploaded media goes through, apis.utils.media_storage.LocalFileSystemStorage and InMemoryStorage can be used to run without cloudinary
+MEDIA_STORAGE_BACKEND = os.getenv(
+    "MEDIA_STORAGE_BACKEND", "apis.utils.media_storage.CloudinaryStorage"
+)
+MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_URL = "/media/"
+
+# the cloudinary folder the files of the app are stored in, prune_media only lists and deletes the files of this folder so the other files of the account are left alone
+CLOUDINARY_UPLOAD_FOLDER = (
+    os.getenv("CLOUDINARY_UPLOAD_FOLDER") or "google_keep_notes_clone"
+).strip("/")
+
+# the uploaded files are checked by their content and size while the request body is read, before django keeps them in memory or in a temporary file
+FILE_UPLOAD_HANDLERS = [
+    "apis.utils.upload_handlers.ValidatingUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# the number of note attachments uploaded to the media storage at the same time
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", 8))
+
+# the thumbnails and poster frames of the note attachments are made by a pool of worker threads after the request, 0 workers makes them right after the note is saved instead, the size is the longest side in pixels
+MEDIA_PREVIEW_WORKERS = int(os.getenv("MEDIA_PREVIEW_WORKERS", 2))
+MEDIA_PREVIEW_SIZE = int(os.getenv("MEDIA_PREVIEW_SIZE", 400))
+
+# resumable uploads of note attachments, the largest file in bytes, the largest chunk a single request can carry and how long in seconds an unfinished upload is kept
+NOTE_UPLOAD_MAX_SIZE = int(os.getenv("NOTE_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024))
+NOTE_UPLOAD_CHUNK_SIZE = int(os.getenv("NOTE_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+NOTE_UPLOAD_TTL = int(os.getenv("NOTE_UPLOAD_TTL", 60 * 60 * 24))
+
+# bcrypt work factor and the pool the hashing runs on, PASSWORD_HASH_EXECUTOR is either thread or process
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+# how long in seconds a login session and its token stay valid, 30 days by default
+AUTH_SESSION_TTL = int(os.getenv("AUTH_SESSION_TTL", 60 * 60 * 24 * 30))
+
+# adds the time of the phases of every request (db, upload, password_hash, auth, serialize, render and total) to the response in the server timing header, off by default since it shows the internals of the server to every client
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "false").lower() == "true"
+
+# exposes the request metrics in the prometheus format at /metrics without authentication, off by default and only meant to be turned on where the endpoint is not reachable from outside
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+# in process cache of verified auth tokens, the ttl is in seconds
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", 60))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -17,9 +17,15 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from apis.views.metrics_views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # prometheus metrics of the requests served by this process
+    path("metrics", metrics),
     path("api/v1/users/", include("apis.urls.user_urls")),
     path("api/v1/notes/", include("apis.urls.note_urls")),
+    # native async versions of the endpoints for asgi deployments
+    path("api/v1/async/users/", include("apis.urls.async_user_urls")),
+    path("api/v1/async/notes/", include("apis.urls.async_note_urls")),
 ]
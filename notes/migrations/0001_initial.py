@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:42
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notes',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=300)),
+                ('note', models.TextField()),
+                ('files', models.JSONField(blank=True, default=list, verbose_name=models.CharField(max_length=300))),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collaborators', models.ManyToManyField(related_name='collaborations', to='users.user')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notes', to='users.user')),
+            ],
+        ),
+    ]
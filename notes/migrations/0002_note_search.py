@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# sqlite gets an fts5 table keyed by the search document id, postgres gets a gin index over the same tsvector expression the search query uses
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+            "title, note, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+        # index the notes that already exist
+        Notes = apps.get_model("notes", "Notes")
+        NoteSearchDocument = apps.get_model("notes", "NoteSearchDocument")
+
+        for note in Notes.objects.only("id", "title", "note").iterator():
+            document = NoteSearchDocument.objects.create(note_id=note.id)
+            schema_editor.execute(
+                "INSERT INTO notes_fts (rowid, title, note) VALUES (%s, %s, %s)",
+                [document.id, note.title, note.note],
+            )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS notes_search_vector_idx ON notes_notes "
+            "USING GIN (to_tsvector('english', title || ' ' || note))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS notes_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS notes_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='notes.notes')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
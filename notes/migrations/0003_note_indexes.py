@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_search'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        # the join table already exists as the auto created many to many table, only the migration state learns about the explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='NoteCollaborator',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('notes', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='notes.notes')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+                    ],
+                    options={
+                        'db_table': 'notes_notes_collaborators',
+                        'unique_together': {('notes', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='notes',
+                    name='collaborators',
+                    field=models.ManyToManyField(related_name='collaborations', through='notes.NoteCollaborator', to='users.user'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='notes_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notecollaborator',
+            index=models.Index(fields=['user', 'notes'], name='notes_collab_user_notes_idx'),
+        ),
+    ]
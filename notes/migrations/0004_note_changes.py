@@ -0,0 +1,97 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# give every existing note its own change cursor value in the order they were last updated and start the counter after them
+def backfill_change_seq(apps, schema_editor):
+    Notes = apps.get_model("notes", "Notes")
+    NoteChangeCounter = apps.get_model("notes", "NoteChangeCounter")
+
+    change_seq = 0
+    for note_id in (
+        Notes.objects.order_by("updated_at", "id")
+        .values_list("id", flat=True)
+        .iterator()
+    ):
+        change_seq += 1
+        Notes.objects.filter(id=note_id).update(change_seq=change_seq)
+
+    NoteChangeCounter.objects.create(pk=1, value=change_seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0003_note_indexes"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NoteChangeCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="NoteTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("note_id", models.UUIDField()),
+                ("change_seq", models.BigIntegerField()),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="notes",
+            name="change_seq",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="notes",
+            index=models.Index(
+                fields=["user", "change_seq"], name="notes_user_change_seq_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notetombstone",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="note_tombstones",
+                to="users.user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notetombstone",
+            index=models.Index(
+                fields=["user", "change_seq"], name="notes_tombstone_user_seq_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_change_seq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:14
+
+import mimetypes
+from django.db import migrations, models
+
+
+# turn the urls of the files list of every note into attachment rows in the same order, the attachments already recorded for a url are kept with their previews and the ones whose url left the list are dropped, the new rows are left with pending previews for the create_media_previews command to make after the migration
+def copy_files_to_attachments(apps, schema_editor):
+    Notes = apps.get_model("notes", "Notes")
+    Attachment = apps.get_model("notes", "Attachment")
+
+    for note_id, files in Notes.objects.values_list("id", "files").iterator():
+        files = files or []
+        recorded = {
+            attachment.url: attachment
+            for attachment in Attachment.objects.filter(note_id=note_id)
+        }
+
+        Attachment.objects.filter(note_id=note_id).exclude(url__in=files).delete()
+
+        new_attachments = []
+        for position, url in enumerate(files):
+            if url in recorded:
+                Attachment.objects.filter(id=recorded.pop(url).id).update(
+                    position=position
+                )
+                continue
+
+            new_attachments.append(
+                Attachment(
+                    note_id=note_id,
+                    url=url,
+                    content_type=mimetypes.guess_type(url)[0]
+                    or "application/octet-stream",
+                    position=position,
+                )
+            )
+
+        Attachment.objects.bulk_create(new_attachments)
+
+
+# put the urls of the attachments back into the files list of their notes
+def copy_attachments_to_files(apps, schema_editor):
+    Notes = apps.get_model("notes", "Notes")
+    Attachment = apps.get_model("notes", "Attachment")
+
+    files = {}
+    for note_id, url in Attachment.objects.order_by("position").values_list(
+        "note_id", "url"
+    ):
+        files.setdefault(note_id, []).append(url)
+
+    for note_id, urls in files.items():
+        Notes.objects.filter(id=note_id).update(files=urls)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0006_attachments"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="attachment",
+            options={"ordering": ["position"]},
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="checksum",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="position",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="attachment",
+            index=models.Index(
+                fields=["note", "position"], name="notes_attachment_order_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="attachment",
+            index=models.Index(
+                fields=["checksum"], name="notes_attachment_checksum_idx"
+            ),
+        ),
+        migrations.RunPython(copy_files_to_attachments, copy_attachments_to_files),
+        migrations.RemoveField(
+            model_name="notes",
+            name="files",
+        ),
+    ]
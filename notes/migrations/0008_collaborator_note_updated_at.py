@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:44
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# copy the updated at of every note onto its collaborator rows
+def copy_note_updated_at(apps, schema_editor):
+    Notes = apps.get_model("notes", "Notes")
+    NoteCollaborator = apps.get_model("notes", "NoteCollaborator")
+
+    NoteCollaborator.objects.update(
+        note_updated_at=Subquery(
+            Notes.objects.filter(id=OuterRef("notes_id")).values("updated_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0007_attachment_files"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notecollaborator",
+            name="note_updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="notecollaborator",
+            index=models.Index(
+                fields=["user", "note_updated_at", "notes"],
+                name="notes_collab_user_updated_idx",
+            ),
+        ),
+        migrations.RunPython(copy_note_updated_at, migrations.RunPython.noop),
+    ]
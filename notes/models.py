@@ -2,6 +2,20 @@ from django.db import models
 from uuid import uuid4
 from users.models import User
 from django.utils import timezone
+from django.db.models import Q
+from django.conf import settings
+from datetime import timedelta
+
+
+# a custom queryset so the owner / collaborator visibility rule is written in one place
+class NotesQuerySet(models.QuerySet):
+    # notes the user has created or has been marked as a collaborator of, the collaborator side is a subquery on the join table so no distinct is needed
+    def visible_to(self, user_id):
+        collaborations = self.model.collaborators.through.objects.filter(
+            user_id=user_id
+        ).values("notes_id")
+
+        return self.filter(Q(user_id=user_id) | Q(id__in=collaborations))
 
 
 # Create your models here.
@@ -10,10 +24,167 @@ class Notes(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notes")
     title = models.CharField(max_length=300)
     note = models.TextField()
-    files = models.JSONField(models.CharField(max_length=300), blank=True, default=list)
-    collaborators = models.ManyToManyField(User, related_name="collaborations")
-    created_at = models.DateTimeField(default=timezone.now(), editable=False)
+    collaborators = models.ManyToManyField(
+        User, related_name="collaborations", through="NoteCollaborator"
+    )
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # the value of the change cursor at the last change of the note, 0 until the first change is recorded
+    change_seq = models.BigIntegerField(default=0)
+
+    objects = NotesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the notes listing filters by user and walks the (updated_at, id) keyset
+            models.Index(fields=["user", "updated_at", "id"], name="notes_user_updated_idx"),
+            # the delta sync walks the notes of a user by their change cursor
+            models.Index(
+                fields=["user", "change_seq"], name="notes_user_change_seq_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+# the join table between notes and their collaborators, declared explicitly so it can carry its own indexes
+class NoteCollaborator(models.Model):
+    notes = models.ForeignKey(Notes, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # a copy of the updated at of the note so the notes shared with a user are walked in the listing order on this table, kept in step by record_note_changes
+    note_updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "notes_notes_collaborators"
+        unique_together = [("notes", "user")]
+        indexes = [
+            # the visibility check looks up the notes a user collaborates on
+            models.Index(fields=["user", "notes"], name="notes_collab_user_notes_idx"),
+            # the notes listing walks the notes shared with a user by the (updated_at, id) keyset
+            models.Index(
+                fields=["user", "note_updated_at", "notes"],
+                name="notes_collab_user_updated_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} collaborates on {self.notes_id}"
+
+
+# gives every note a stable integer row id for the full text search index, the note primary key is a uuid which the sqlite fts5 index can not use
+class NoteSearchDocument(models.Model):
+    note = models.OneToOneField(
+        Notes, on_delete=models.CASCADE, related_name="search_document"
+    )
+
+    def __str__(self):
+        return f"Search document for {self.note_id}"
+
+
+# a file attached to a note together with the previews made for it, the previews are generated off the request path after the file is stored, the same stored file can be attached to many notes when its content is uploaded again
+class Attachment(models.Model):
+    PREVIEW_PENDING = "pending"
+    PREVIEW_READY = "ready"
+    PREVIEW_SKIPPED = "skipped"
+    PREVIEW_FAILED = "failed"
+    PREVIEW_STATUSES = [
+        (PREVIEW_PENDING, "Pending"),
+        (PREVIEW_READY, "Ready"),
+        (PREVIEW_SKIPPED, "Skipped"),
+        (PREVIEW_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    note = models.ForeignKey(
+        Notes, on_delete=models.CASCADE, related_name="attachments"
+    )
+    # the url of the stored file, it is also the key the media storage knows the file by
+    url = models.CharField(max_length=300)
+    content_type = models.CharField(max_length=100)
+    # the size and the sha256 of the content, unknown for the files attached before they were recorded
+    size = models.BigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, default="")
+    # the place of the file among the files of the note
+    position = models.PositiveIntegerField(default=0)
+    # a resized image for the image files and a poster frame for the video files
+    thumbnail_url = models.CharField(max_length=300, blank=True, default="")
+    poster_url = models.CharField(max_length=300, blank=True, default="")
+    preview_status = models.CharField(
+        max_length=10, choices=PREVIEW_STATUSES, default=PREVIEW_PENDING
+    )
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["position"]
+        indexes = [
+            # the files of the notes are read in their order
+            models.Index(
+                fields=["note", "position"], name="notes_attachment_order_idx"
+            ),
+            # a file is looked up by its content before it is uploaded
+            models.Index(fields=["checksum"], name="notes_attachment_checksum_idx"),
+        ]
+
+    # the url the listings show in place of the file, None when there is no preview
+    @property
+    def preview_url(self):
+        return self.thumbnail_url or self.poster_url or None
+
+    def __str__(self):
+        return f"Attachment {self.url} of {self.note_id}"
+
+
+# a single row holding the last handed out value of the change cursor, the row is locked while a change is recorded so the cursor order follows the commit order
+class NoteChangeCounter(models.Model):
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Change cursor at {self.value}"
+
+
+# remembers that a note stopped being visible to a user, either because it was deleted or because the user was removed from its collaborators, so the delta sync can tell the client to drop it
+class NoteTombstone(models.Model):
+    note_id = models.UUIDField()
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="note_tombstones"
+    )
+    change_seq = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "change_seq"], name="notes_tombstone_user_seq_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Tombstone of {self.note_id} for {self.user_id}"
+
+
+# the time a new resumable upload can take before it is abandoned
+def upload_expiry():
+    return timezone.now() + timedelta(seconds=settings.NOTE_UPLOAD_TTL)
+
+
+# a resumable upload of a note attachment, the chunks are written to the media storage as they arrive and offset is the number of bytes received so far
+class NoteUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # the handle of the partial file in the media storage
+    storage_key = models.CharField(max_length=300)
+    # the url of the stored file, set once the last chunk is written for the backends that finish the upload with it
+    url = models.CharField(max_length=300, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # indexed so the abandoned uploads can be cleaned up in batches
+    expires_at = models.DateTimeField(default=upload_expiry, db_index=True)
+
+    def __str__(self):
+        return f"Upload of {self.filename} by {self.user_id}"
@@ -1,3 +1,45 @@
+from unittest import skipUnless
+from uuid import uuid4
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from .models import Notes, NoteCollaborator
+from apis.utils.pagination import visible_notes_keyset, encode_cursor
+from apis.testing import QueryPlanAssertions
 
-# Create your tests here.
+
+# captures the sqlite query plan of the note access patterns and fails when one of them falls back to a full scan, the pages of the listing also have to come out of an index in order without a sort
+@skipUnless(connection.vendor == "sqlite", "Query plans are captured for sqlite.")
+class NotesQueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="owner", email="owner@example.com", password="x")
+        cls.collaborator = User.objects.create(
+            name="collaborator", email="collaborator@example.com", password="x"
+        )
+
+        for index in range(20):
+            note = Notes.objects.create(user=cls.user, title=f"note {index}", note="body")
+            if index % 2:
+                note.collaborators.add(cls.collaborator)
+
+    def test_first_page_of_notes(self):
+        for branch in visible_notes_keyset(self.user.id):
+            self.assertNoFullScan(branch[:51])
+            self.assertNoTempSort(branch[:51])
+
+    def test_next_page_of_notes(self):
+        cursor = encode_cursor(timezone.now(), uuid4())
+
+        for branch in visible_notes_keyset(self.collaborator.id, cursor):
+            self.assertNoFullScan(branch[:51])
+            self.assertNoTempSort(branch[:51])
+
+    def test_notes_of_a_collaborator(self):
+        self.assertNoFullScan(Notes.objects.filter(collaborators=self.collaborator.id))
+
+    def test_collaborator_membership(self):
+        self.assertNoFullScan(
+            NoteCollaborator.objects.filter(user=self.collaborator).values("notes_id")
+        )